@@ -0,0 +1,391 @@
+"""Replay recorded sensor traces through the awesome thermostats.
+
+Run it from the root of the repository:
+
+    python -m benchmarks.replay --config zones.yaml --csv history.csv
+    python -m benchmarks.replay --config zones.yaml --recorder home-assistant_v2.db
+
+`zones.yaml` holds awesome thermostat platform configurations, either as a
+list or under a `climate` key like in `configuration.yaml`, where an
+`awesome_thermostat` key may hold the shared settings. Like in the benchmark,
+the thermostats are set up through the climate platform in an in-process Home
+Assistant test instance, and the states of their target sensors, window
+sensors, motion sensors and of the outdoor sensor are streamed in time order
+into the state machine. The clock of Home Assistant is patched and its
+timers, the shared timer of the coordinator among them, are fired from one
+deadline to the next, so the replay runs in virtual time. The schedules
+follow the `time_zone` of the `homeassistant` key, or `--time-zone`. The
+heaters are fake entities following the commands immediately. The heater
+schedule is written as CSV, one line per heater change.
+
+The traces are never loaded in memory: CSV files must be sorted by time
+(several files are merged on the fly) and the recorder database is read
+through a cursor.
+"""
+import argparse
+import asyncio
+import csv
+import heapq
+import itertools
+import logging
+import sqlite3
+import sys
+import time
+from unittest.mock import patch
+
+from homeassistant import loader
+from homeassistant.components.climate.const import (
+    DOMAIN as CLIMATE_DOMAIN,
+    PRESET_ACTIVITY,
+)
+from homeassistant.const import (
+    ATTR_ENTITY_ID,
+    ATTR_TEMPERATURE,
+    CONF_TIME_ZONE,
+    EVENT_HOMEASSISTANT_START,
+    SERVICE_TURN_OFF,
+    SERVICE_TURN_ON,
+    STATE_OFF,
+    STATE_ON,
+)
+from homeassistant.core import DOMAIN as HA_DOMAIN, CoreState, callback
+from homeassistant.helpers import event
+from homeassistant.helpers.restore_state import RestoreStateData
+from homeassistant.setup import async_setup_component
+import homeassistant.util.dt as dt_util
+from homeassistant.util.yaml import load_yaml
+from pytest_homeassistant_custom_component.common import async_test_home_assistant
+
+from custom_components.awesome_thermostat import CONF_OUTDOOR_SENSOR, DOMAIN
+from custom_components.awesome_thermostat import coordinator
+from custom_components.awesome_thermostat.climate import (
+    CONF_HEATER,
+    CONF_MOTION_SENSOR,
+    CONF_SENSOR,
+    CONF_WINDOWS_SENSOR,
+    CONF_ZONES,
+    PLATFORM_SCHEMA,
+    AwesomeThermostat,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+# Services of the fake heaters, with the state they leave the heater in
+SERVICE_SET_VALUE = "set_value"
+SERVICE_SET_TEMPERATURE = "set_temperature"
+
+
+class VirtualClock:
+    """Clock of the replay, moved from one deadline to the next.
+
+    It stands in for `async_track_point_in_utc_time`, which carries the shared
+    timer of the coordinator and every timer of Home Assistant, so none of
+    them waits on the real clock.
+    """
+
+    def __init__(self, now):
+        """Initialize the clock at the utc datetime `now`."""
+        self.now = now
+        self._timers = []
+        self._sequence = itertools.count()
+
+    def utcnow(self):
+        """Return the virtual utc time."""
+        return self.now
+
+    def local_now(self, time_zone=None):
+        """Return the virtual time in `time_zone`, the local one by default."""
+        return self.now.astimezone(time_zone or dt_util.DEFAULT_TIME_ZONE)
+
+    def track_point_in_utc_time(self, hass, action, point_in_time):
+        """Arm a timer at `point_in_time` and return a cancel."""
+        timer = [dt_util.as_utc(point_in_time), next(self._sequence), action]
+        heapq.heappush(self._timers, timer)
+
+        @callback
+        def _async_cancel():
+            timer[2] = None
+
+        return _async_cancel
+
+    async def async_advance(self, hass, when):
+        """Fire the timers until `when`, then move the clock to `when`."""
+        while self._timers and self._timers[0][0] <= when:
+            deadline, _, action = heapq.heappop(self._timers)
+            if action is None:
+                continue
+            self.now = max(self.now, deadline)
+            hass.async_run_job(action, deadline)
+            await hass.async_block_till_done()
+        self.now = when
+
+
+def load_config(path):
+    """Load the shared settings, the zones platforms and the time zone."""
+    config = load_yaml(path)
+    if not isinstance(config, dict):
+        return {}, config or [], None
+    return (
+        dict(config.get(DOMAIN) or {}),
+        config.get(CLIMATE_DOMAIN, []),
+        (config.get(HA_DOMAIN) or {}).get(CONF_TIME_ZONE),
+    )
+
+
+def load_zones(platforms):
+    """Validate the platform configurations and return the zones."""
+    zones = []
+    for config in map(PLATFORM_SCHEMA, platforms):
+        zones.extend(config[CONF_ZONES] if CONF_ZONES in config else [config])
+    return zones
+
+
+def watched_entities(zones, domain_config):
+    """Return the entities whose states are replayed."""
+    entity_ids = set()
+    for zone in zones:
+        entity_ids.update(zone[CONF_SENSOR])
+        for key in (CONF_WINDOWS_SENSOR, CONF_MOTION_SENSOR):
+            if zone.get(key):
+                entity_ids.add(zone[key])
+    if domain_config.get(CONF_OUTDOOR_SENSOR):
+        entity_ids.add(domain_config[CONF_OUTDOOR_SENSOR])
+    return entity_ids
+
+
+def initial_state(entity_id):
+    """Return the state of a heater which is not heating."""
+    domain = entity_id.split(".", 1)[0]
+    if domain == CLIMATE_DOMAIN:
+        return STATE_ON
+    if domain in ("number", "input_number"):
+        return "0"
+    return STATE_OFF
+
+
+def read_csv(path, entity_ids):
+    """Stream the states of a CSV export sorted by time.
+
+    The file has the entity_id, state and last_changed columns of the history
+    export of Home Assistant. Naive times are in the local time zone.
+    """
+    with open(path, newline="", encoding="utf-8") as file:
+        for row in csv.DictReader(file):
+            if row["entity_id"] not in entity_ids:
+                continue
+            when = dt_util.parse_datetime(row["last_changed"])
+            if when is None:
+                _LOGGER.warning("Skipping a row with an invalid time: %s", row)
+                continue
+            yield (
+                dt_util.as_timestamp(dt_util.as_utc(when)),
+                row["entity_id"],
+                row["state"],
+            )
+
+
+def read_recorder(path, entity_ids):
+    """Stream the states of a recorder SQLite database in time order."""
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        tables = {
+            name
+            for (name,) in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )
+        }
+        placeholders = ",".join("?" * len(entity_ids))
+        if "states_meta" in tables:
+            query = (
+                "SELECT states_meta.entity_id, states.state, states.last_updated_ts "
+                "FROM states JOIN states_meta "
+                "ON states.metadata_id = states_meta.metadata_id "
+                f"WHERE states_meta.entity_id IN ({placeholders}) "
+                "ORDER BY states.last_updated_ts"
+            )
+        else:
+            query = (
+                "SELECT entity_id, state, last_updated FROM states "
+                f"WHERE entity_id IN ({placeholders}) ORDER BY last_updated"
+            )
+        for entity_id, state, when in connection.execute(query, list(entity_ids)):
+            if isinstance(when, str):
+                # The legacy columns hold naive utc datetimes
+                when = dt_util.parse_datetime(when)
+                if when.tzinfo is None:
+                    when = when.replace(tzinfo=dt_util.UTC)
+                when = dt_util.as_timestamp(when)
+            yield when, entity_id, state
+    finally:
+        connection.close()
+
+
+def parse_args(argv=None):
+    """Parse the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--config", required=True, help="zones configuration")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--csv", nargs="+", help="CSV files sorted by time")
+    source.add_argument("--recorder", help="recorder SQLite database")
+    parser.add_argument("--preset", help="preset of the zones without motion")
+    parser.add_argument(
+        "--outdoor-sensor", help="outdoor temperature sensor of the feed-forward"
+    )
+    parser.add_argument(
+        "--time-zone",
+        help="time zone of the schedules and of the naive times of the CSV files, "
+        "by default the time_zone of the homeassistant section of the config, "
+        "or UTC",
+    )
+    parser.add_argument("--output", help="schedule file, stdout by default")
+    return parser.parse_args(argv)
+
+
+async def async_run(args, writer):
+    """Replay the traces and return the states, zones and heater changes."""
+    domain_config, platforms, time_zone = load_config(args.config)
+    if args.outdoor_sensor:
+        domain_config[CONF_OUTDOOR_SENSOR] = args.outdoor_sensor
+    zones = load_zones(platforms)
+    if not zones:
+        return 0, 0, 0
+
+    hass = await async_test_home_assistant(asyncio.get_running_loop())
+    # Allow the integrations of the custom_components folder
+    hass.data.pop(loader.DATA_CUSTOM_COMPONENTS)
+    # Replace the time zone of the test instance before any time is parsed
+    hass.config.set_time_zone(args.time_zone or time_zone or "UTC")
+    watched = watched_entities(zones, domain_config)
+    if args.recorder:
+        events = read_recorder(args.recorder, watched)
+    else:
+        events = heapq.merge(*(read_csv(path, watched) for path in args.csv))
+    first = next(events, None)
+    if first is None:
+        await hass.async_stop(force=True)
+        return 0, len(zones), 0
+    clock = VirtualClock(dt_util.utc_from_timestamp(first[0]))
+
+    thermostats = {}
+    changes = 0
+
+    @callback
+    def async_heater_service(call):
+        """Apply a command to the fake heaters and write the changes."""
+        nonlocal changes
+        entity_ids = call.data[ATTR_ENTITY_ID]
+        if isinstance(entity_ids, str):
+            entity_ids = [entity_ids]
+        attributes = {}
+        if call.service == SERVICE_SET_TEMPERATURE:
+            state = STATE_ON
+            attributes[ATTR_TEMPERATURE] = call.data[ATTR_TEMPERATURE]
+        elif call.service == SERVICE_SET_VALUE:
+            state = str(call.data["value"])
+        else:
+            state = STATE_ON if call.service == SERVICE_TURN_ON else STATE_OFF
+        for entity_id in entity_ids:
+            old_state = hass.states.get(entity_id)
+            if (
+                old_state is not None
+                and old_state.state == state
+                and old_state.attributes == attributes
+            ):
+                continue
+            hass.states.async_set(entity_id, state, attributes)
+            changes += 1
+            thermostat = thermostats.get(entity_id)
+            writer.writerow(
+                [
+                    clock.now.isoformat(),
+                    thermostat.name if thermostat else None,
+                    entity_id,
+                    attributes.get(ATTR_TEMPERATURE, state),
+                    thermostat.current_temperature if thermostat else None,
+                    thermostat.target_temperature if thermostat else None,
+                ]
+            )
+
+    patch("homeassistant.util.dt.utcnow", clock.utcnow).start()
+    patch("homeassistant.util.dt.now", clock.local_now).start()
+    for module in (event, coordinator):
+        patch.object(
+            module, "async_track_point_in_utc_time", clock.track_point_in_utc_time
+        ).start()
+    # The states of the test instance are never restored
+    patch.object(RestoreStateData, "async_setup_dump").start()
+    count = 0
+    try:
+        for zone in zones:
+            for entity_id in zone[CONF_HEATER]:
+                hass.states.async_set(entity_id, initial_state(entity_id))
+
+        hass.state = CoreState.starting
+        assert await async_setup_component(hass, DOMAIN, {DOMAIN: domain_config})
+        assert await async_setup_component(
+            hass, CLIMATE_DOMAIN, {CLIMATE_DOMAIN: platforms}
+        )
+        await hass.async_block_till_done()
+        for domain, service in (
+            (HA_DOMAIN, SERVICE_TURN_ON),
+            (HA_DOMAIN, SERVICE_TURN_OFF),
+            ("number", SERVICE_SET_VALUE),
+            ("input_number", SERVICE_SET_VALUE),
+            (CLIMATE_DOMAIN, SERVICE_SET_TEMPERATURE),
+        ):
+            hass.services.async_register(domain, service, async_heater_service)
+        zone_thermostats = [
+            entity
+            for entity in hass.data[CLIMATE_DOMAIN].entities
+            if isinstance(entity, AwesomeThermostat)
+        ]
+        for thermostat in zone_thermostats:
+            thermostats.update(dict.fromkeys(thermostat.heater_entity_ids, thermostat))
+        hass.bus.async_fire(EVENT_HOMEASSISTANT_START)
+        hass.state = CoreState.running
+        await hass.async_block_till_done()
+
+        for thermostat in zone_thermostats:
+            # Zones with motion control are assumed to be in the activity preset
+            preset = (
+                PRESET_ACTIVITY if thermostat.support_motion_control else args.preset
+            )
+            if preset in (thermostat.preset_modes or []):
+                await thermostat.async_set_preset_mode(preset)
+        await hass.async_block_till_done()
+
+        for when, entity_id, state in itertools.chain([first], events):
+            await clock.async_advance(hass, dt_util.utc_from_timestamp(when))
+            hass.states.async_set(entity_id, state)
+            await hass.async_block_till_done()
+            count += 1
+    finally:
+        patch.stopall()
+        await hass.async_stop(force=True)
+    return count, len(zones), changes
+
+
+def main(argv=None):
+    """Replay the traces from the command line."""
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    output = open(args.output, "w", newline="") if args.output else sys.stdout
+    writer = csv.writer(output)
+    writer.writerow(["time", "zone", "heater", "state", "temperature", "target"])
+
+    begin = time.perf_counter()
+    try:
+        count, zones, changes = asyncio.run(async_run(args, writer))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - begin
+    print(
+        f"{count} states replayed for {zones} zones in {elapsed:.1f}s, "
+        f"{changes} heater changes",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""First-order thermal model of a room used by the benchmarks."""
+import math
+import random
+
+
+class RoomModel:
+    """Room whose temperature relaxes exponentially towards an equilibrium.
+
+    Without heating the equilibrium is the outdoor temperature. With heating
+    it is `heating_gain` degrees above it. `time_constant` is in seconds.
+    """
+
+    def __init__(
+        self,
+        temperature=18.0,
+        outdoor_temperature=5.0,
+        heating_gain=25.0,
+        time_constant=3 * 3600,
+        sensor_noise=0.0,
+        sensor_precision=0.1,
+        rng=None,
+    ):
+        """Initialize the room."""
+        self.temperature = temperature
+        self.outdoor_temperature = outdoor_temperature
+        self.heating_gain = heating_gain
+        self.time_constant = time_constant
+        self.sensor_noise = sensor_noise
+        self.sensor_precision = sensor_precision
+        self._rng = rng or random.Random()
+
+    def step(self, seconds, heating):
+        """Advance the room by `seconds` with the heater on or off."""
+        equilibrium = self.outdoor_temperature
+        if heating:
+            equilibrium += self.heating_gain
+        decay = math.exp(-seconds / self.time_constant)
+        self.temperature = equilibrium + (self.temperature - equilibrium) * decay
+        return self.temperature
+
+    def read(self):
+        """Return the temperature as reported by a sensor."""
+        value = self.temperature
+        if self.sensor_noise:
+            value += self._rng.gauss(0.0, self.sensor_noise)
+        return round(round(value / self.sensor_precision) * self.sensor_precision, 2)
@@ -0,0 +1,292 @@
+"""Benchmark of the awesome thermostat control path.
+
+Run it from the root of the repository:
+
+    python -m benchmarks.run --zones 100 --hours 24
+
+The thermostats are set up through the climate platform in an in-process
+Home Assistant test instance. Their heaters and temperature sensors are fake
+entities driven by a first-order room model, and the simulation runs in
+virtual time: the clock of Home Assistant is patched and the keep-alive and
+cycle timers are fired without waiting.
+"""
+import argparse
+import asyncio
+from datetime import timedelta
+import json
+import logging
+import random
+import statistics
+import time
+from unittest.mock import patch
+
+from homeassistant import loader
+from homeassistant.const import (
+    ATTR_ENTITY_ID,
+    EVENT_HOMEASSISTANT_START,
+    SERVICE_TURN_OFF,
+    SERVICE_TURN_ON,
+    STATE_OFF,
+    STATE_ON,
+)
+from homeassistant.core import DOMAIN as HA_DOMAIN, CoreState, callback
+from homeassistant.setup import async_setup_component
+import homeassistant.util.dt as dt_util
+from pytest_homeassistant_custom_component.common import (
+    async_fire_time_changed,
+    async_test_home_assistant,
+)
+
+from custom_components.awesome_thermostat import DOMAIN
+from custom_components.awesome_thermostat.climate import AwesomeThermostat
+from custom_components.awesome_thermostat.coordinator import (
+    AwesomeThermostatCoordinator,
+)
+
+from .room_model import RoomModel
+
+TARGET_TEMP = 20.0
+
+
+def parse_args(argv=None):
+    """Parse the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--zones", type=int, default=50, help="number of zones")
+    parser.add_argument(
+        "--hours", type=float, default=24, help="simulated duration in hours"
+    )
+    parser.add_argument(
+        "--step", type=float, default=60, help="sensor period in seconds"
+    )
+    parser.add_argument(
+        "--control-mode",
+        default="hysteresis",
+        choices=["hysteresis", "proportional", "pid"],
+    )
+    parser.add_argument(
+        "--keep-alive", type=float, default=0, help="keep-alive in minutes"
+    )
+    parser.add_argument(
+        "--cycle",
+        type=float,
+        default=None,
+        help="cycle duration in minutes, the default of the zones if not given",
+    )
+    parser.add_argument("--batch-mode", action="store_true")
+    parser.add_argument(
+        "--bulk", action="store_true", help="set up the zones in a single block"
+    )
+    parser.add_argument(
+        "--heater-power", type=float, default=1000, help="heater power in watts"
+    )
+    parser.add_argument(
+        "--power-budget", type=float, default=0, help="power budget in watts"
+    )
+    parser.add_argument(
+        "--sensor-noise", type=float, default=0.05, help="sensor noise in degrees"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print json results")
+    return parser.parse_args(argv)
+
+
+def build_zone_config(args, zone):
+    """Return the climate configuration of a zone."""
+    config = {
+        "platform": DOMAIN,
+        "name": f"bench_{zone}",
+        "unique_id": f"bench_{zone}",
+        "heater": f"switch.bench_heater_{zone}",
+        "target_sensor": f"sensor.bench_temperature_{zone}",
+        "initial_hvac_mode": "heat",
+        "target_temp": TARGET_TEMP,
+        "control_mode": args.control_mode,
+    }
+    if args.cycle:
+        config["cycle_duration"] = {"minutes": args.cycle}
+    if args.keep_alive:
+        config["keep_alive"] = {"minutes": args.keep_alive}
+    if args.power_budget:
+        config["heater_power"] = args.heater_power
+    return config
+
+
+async def async_run(args):
+    """Run the benchmark and return its results."""
+    rng = random.Random(args.seed)
+    hass = await async_test_home_assistant(asyncio.get_running_loop())
+    # Allow the integrations of the custom_components folder
+    hass.data.pop(loader.DATA_CUSTOM_COMPONENTS)
+
+    toggles = {}
+
+    @callback
+    def async_switch(call):
+        """Switch the fake heaters."""
+        state = STATE_ON if call.service == SERVICE_TURN_ON else STATE_OFF
+        entity_ids = call.data[ATTR_ENTITY_ID]
+        if isinstance(entity_ids, str):
+            entity_ids = [entity_ids]
+        for entity_id in entity_ids:
+            if not hass.states.is_state(entity_id, state):
+                toggles[entity_id] = toggles.get(entity_id, 0) + 1
+                hass.states.async_set(entity_id, state)
+
+    hass.services.async_register(HA_DOMAIN, SERVICE_TURN_ON, async_switch)
+    hass.services.async_register(HA_DOMAIN, SERVICE_TURN_OFF, async_switch)
+
+    decisions = 0
+    control_heating = AwesomeThermostat._async_control_heating
+
+    async def counted_control_heating(self, *args, **kwargs):
+        nonlocal decisions
+        decisions += 1
+        return await control_heating(self, *args, **kwargs)
+
+    AwesomeThermostat._async_control_heating = counted_control_heating
+
+    # The batch mode evaluates its keep-alive in the coordinator
+    batch_keep_alive = AwesomeThermostatCoordinator._async_batch_keep_alive
+
+    async def counted_batch_keep_alive(self, group):
+        nonlocal decisions
+        decisions += len(group["batch"])
+        return await batch_keep_alive(self, group)
+
+    AwesomeThermostatCoordinator._async_batch_keep_alive = counted_batch_keep_alive
+
+    rooms = []
+    last_readings = []
+    for zone in range(args.zones):
+        room = RoomModel(
+            temperature=rng.uniform(16.0, 21.0),
+            outdoor_temperature=rng.uniform(0.0, 10.0),
+            time_constant=rng.uniform(2.0, 6.0) * 3600,
+            sensor_noise=args.sensor_noise,
+            rng=rng,
+        )
+        rooms.append(room)
+        last_readings.append(room.read())
+        hass.states.async_set(f"sensor.bench_temperature_{zone}", last_readings[-1])
+        hass.states.async_set(f"switch.bench_heater_{zone}", STATE_OFF)
+
+    try:
+        # Boot: set up the zones, then start Home Assistant
+        hass.state = CoreState.starting
+        begin = time.perf_counter()
+        domain_config = {"batch_mode": args.batch_mode}
+        if args.power_budget:
+            domain_config["power_budget"] = args.power_budget
+        assert await async_setup_component(hass, DOMAIN, {DOMAIN: domain_config})
+        zones = [build_zone_config(args, zone) for zone in range(args.zones)]
+        if args.bulk:
+            zones = [{"platform": DOMAIN, "zones": zones}]
+        assert await async_setup_component(hass, "climate", {"climate": zones})
+        await hass.async_block_till_done()
+        hass.bus.async_fire(EVENT_HOMEASSISTANT_START)
+        hass.state = CoreState.running
+        await hass.async_block_till_done()
+        setup_duration = time.perf_counter() - begin
+
+        start = dt_util.utcnow()
+        clock = patch("homeassistant.util.dt.utcnow", return_value=start)
+        virtual_now = clock.start()
+        steps = int(args.hours * 3600 / args.step)
+        latencies = []
+        sensor_events = 0
+        busy = 0.0
+        comfort_error = 0.0
+        cold_samples = 0
+        peak_heaters_on = 0
+        for step in range(1, steps + 1):
+            now = start + timedelta(seconds=step * args.step)
+            virtual_now.return_value = now
+            heaters_on = 0
+            for zone, room in enumerate(rooms):
+                heating = hass.states.is_state(f"switch.bench_heater_{zone}", STATE_ON)
+                heaters_on += heating
+                room.step(args.step, heating)
+                comfort_error += abs(room.temperature - TARGET_TEMP)
+                if room.temperature < TARGET_TEMP - 0.5:
+                    cold_samples += 1
+            peak_heaters_on = max(peak_heaters_on, heaters_on)
+
+            begin = time.perf_counter()
+            events = 0
+            for zone, room in enumerate(rooms):
+                reading = room.read()
+                if reading != last_readings[zone]:
+                    last_readings[zone] = reading
+                    hass.states.async_set(f"sensor.bench_temperature_{zone}", reading)
+                    events += 1
+            await hass.async_block_till_done()
+            elapsed = time.perf_counter() - begin
+            if events:
+                latencies.append(elapsed / events)
+            sensor_events += events
+
+            begin = time.perf_counter()
+            async_fire_time_changed(hass, now)
+            await hass.async_block_till_done()
+            busy += elapsed + time.perf_counter() - begin
+    finally:
+        patch.stopall()
+        AwesomeThermostat._async_control_heating = control_heating
+        AwesomeThermostatCoordinator._async_batch_keep_alive = batch_keep_alive
+        await hass.async_stop(force=True)
+
+    samples = steps * args.zones
+    latencies.sort()
+    return {
+        "zones": args.zones,
+        "simulated_hours": args.hours,
+        "control_mode": args.control_mode,
+        "batch_mode": args.batch_mode,
+        "bulk": args.bulk,
+        "setup_seconds": setup_duration,
+        "setup_ms_per_zone": 1000 * setup_duration / args.zones,
+        "decisions": decisions,
+        "decisions_per_second": decisions / busy if busy else None,
+        "sensor_events": sensor_events,
+        "event_latency_ms": {
+            "mean": 1000 * statistics.fmean(latencies) if latencies else None,
+            "p50": 1000 * latencies[len(latencies) // 2] if latencies else None,
+            "p95": 1000 * latencies[int(len(latencies) * 0.95)] if latencies else None,
+            "max": 1000 * latencies[-1] if latencies else None,
+        },
+        "peak_power": peak_heaters_on * args.heater_power,
+        "switch_toggles": sum(toggles.values()),
+        "switch_toggles_per_zone_per_day": sum(toggles.values())
+        / args.zones
+        / (args.hours / 24),
+        "comfort_mean_abs_error": comfort_error / samples if samples else None,
+        "comfort_cold_ratio": cold_samples / samples if samples else None,
+    }
+
+
+def print_results(results):
+    """Print the results in a readable form."""
+    for key, value in results.items():
+        if isinstance(value, dict):
+            value = ", ".join(
+                f"{name}={number:.3f}" if number is not None else f"{name}=n/a"
+                for name, number in value.items()
+            )
+        elif isinstance(value, float):
+            value = f"{value:.3f}"
+        print(f"{key:32} {value}")
+
+
+def main(argv=None):
+    """Run the benchmark from the command line."""
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.ERROR)
+    results = asyncio.run(async_run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+
+
+if __name__ == "__main__":
+    main()
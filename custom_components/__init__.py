@@ -0,0 +1 @@
+"""Custom components module."""
@@ -1,4 +1,101 @@
 """The awesome_thermostat component."""
+from datetime import timedelta
+
+import voluptuous as vol
+
+from homeassistant.core import callback
+import homeassistant.helpers.config_validation as cv
+
+from .accounting import HeatingAccounting
+from .schedule import WEEKDAYS
 
 DOMAIN = "awesome_thermostat"
-PLATFORMS = ["climate"]
+PLATFORMS = ["climate", "sensor"]
+
+CONF_BATCH_MODE = "batch_mode"
+CONF_INSTRUMENTATION = "instrumentation"
+CONF_POWER_BUDGET = "power_budget"
+CONF_POWER_SLOT = "power_slot"
+CONF_OUTDOOR_SENSOR = "outdoor_sensor"
+CONF_SCHEDULES = "schedules"
+CONF_DAYS = "days"
+CONF_TIME = "time"
+CONF_PRESET = "preset"
+
+DEFAULT_POWER_SLOT = timedelta(minutes=10)
+
+DATA_CONFIG = "config"
+DATA_ACCOUNTING = "accounting"
+DATA_ENERGY_SENSORS = "energy_sensors"
+
+KIND_RUNTIME = "runtime"
+KIND_CYCLES = "cycles"
+KIND_ENERGY = "energy"
+
+SCHEDULE_SCHEMA = vol.All(
+    cv.ensure_list,
+    [
+        {
+            vol.Optional(CONF_DAYS, default=list(WEEKDAYS)): vol.All(
+                cv.ensure_list, [vol.In(WEEKDAYS)], vol.Length(min=1)
+            ),
+            vol.Required(CONF_TIME): cv.time,
+            vol.Required(CONF_PRESET): cv.string,
+        }
+    ],
+    vol.Length(min=1),
+)
+
+DOMAIN_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_BATCH_MODE, default=False): cv.boolean,
+        vol.Optional(CONF_INSTRUMENTATION, default=False): cv.boolean,
+        vol.Optional(CONF_POWER_BUDGET): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(
+            CONF_POWER_SLOT, default=DEFAULT_POWER_SLOT
+        ): cv.positive_time_period,
+        vol.Optional(CONF_SCHEDULES, default={}): {cv.string: SCHEDULE_SCHEMA},
+        vol.Optional(CONF_OUTDOOR_SENSOR): cv.entity_id,
+    }
+)
+
+CONFIG_SCHEMA = vol.Schema({vol.Optional(DOMAIN): DOMAIN_SCHEMA}, extra=vol.ALLOW_EXTRA)
+
+
+async def async_setup(hass, config):
+    """Set up the settings shared by all the awesome thermostats."""
+    hass.data.setdefault(DOMAIN, {})[DATA_CONFIG] = config.get(
+        DOMAIN, DOMAIN_SCHEMA({})
+    )
+    return True
+
+
+@callback
+def async_get_accounting(hass, key):
+    """Return the accounting of the thermostat `key`, kept across the reloads."""
+    accountings = hass.data.setdefault(DOMAIN, {}).setdefault(DATA_ACCOUNTING, {})
+    if key not in accountings:
+        accountings[key] = HeatingAccounting()
+    return accountings[key]
+
+
+async def async_setup_entry(hass, entry):
+    """Set up the thermostat of a zone and its sensors from a config entry."""
+    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
+    return True
+
+
+async def async_unload_entry(hass, entry):
+    """Unload the thermostat of a zone and its sensors."""
+    return await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+
+
+async def async_remove_entry(hass, entry):
+    """Forget the accounting of a removed zone."""
+    hass.data.get(DOMAIN, {}).get(DATA_ACCOUNTING, {}).pop(entry.entry_id, None)
+
+
+async def _async_update_listener(hass, entry):
+    """Reload the zone alone when its options change."""
+    await hass.config_entries.async_reload(entry.entry_id)
@@ -0,0 +1,99 @@
+"""Heating runtime and energy accounting of an awesome thermostat.
+
+Nothing in this module depends on Home Assistant.
+"""
+
+
+class HeatingAccounting:
+    """Accumulate the heating runtime, the cycles and the energy of a zone.
+
+    The totals are updated on each transition of the heaters, so they never
+    need the history of the heaters. The phase still open is added to the
+    runtime by `flush`, called periodically so that a long phase is spread
+    over the periods it covers. The listeners are called when the totals
+    change.
+    """
+
+    def __init__(self, heater_power=None):
+        """Initialize empty totals."""
+        self.heater_power = heater_power
+        self.runtime = 0.0
+        self.cycles = 0
+        self._on_since = None
+        self._restored_on_since = None
+        self._listeners = []
+
+    @property
+    def energy(self):
+        """Return the energy used in kWh, or None without a heater power."""
+        if not self.heater_power:
+            return None
+        return self.runtime * self.heater_power / 3600000
+
+    @property
+    def empty(self):
+        """Return True if nothing was accounted yet."""
+        return not self.cycles and not self.runtime
+
+    @property
+    def on_since(self):
+        """Return the timestamp from which the open phase is not counted yet."""
+        return self._on_since
+
+    def as_dict(self):
+        """Return the totals and the open phase, as taken by `restore`."""
+        return {
+            "runtime": self.runtime,
+            "cycles": self.cycles,
+            "on_since": self._on_since,
+        }
+
+    def restore(self, runtime, cycles, on_since=None):
+        """Restore the totals saved before a restart.
+
+        `on_since` is the start of the phase open when they were saved, which
+        goes on if the heaters are found on at startup.
+        """
+        self.runtime = runtime
+        self.cycles = cycles
+        self._restored_on_since = on_since
+        self._notify()
+
+    def set_heating(self, heating, now, resumed=False):
+        """Record a transition of the heaters at the timestamp `now`.
+
+        A heater found on at startup is `resumed`: it does not start a new
+        cycle, and its runtime is counted from the restored open phase, or
+        from `now` without one.
+        """
+        restored_on_since, self._restored_on_since = self._restored_on_since, None
+        if heating and self._on_since is None:
+            if not resumed:
+                self._on_since = now
+                self.cycles += 1
+                self._notify()
+            elif restored_on_since is not None:
+                self._on_since = min(restored_on_since, now)
+            else:
+                self._on_since = now
+        elif not heating and self._on_since is not None:
+            self.flush(now)
+            self._on_since = None
+
+    def flush(self, now):
+        """Add the open phase up to the timestamp `now` to the runtime."""
+        if self._on_since is None or now <= self._on_since:
+            return
+        self.runtime += now - self._on_since
+        self._on_since = now
+        self._notify()
+
+    def add_listener(self, listener):
+        """Call `listener` when the totals change, return a remove callback."""
+        self._listeners.append(listener)
+        return lambda: self._listeners.remove(listener)
+
+    def _notify(self):
+        """Call the listeners."""
+        for listener in tuple(self._listeners):
+            listener()
@@ -0,0 +1,189 @@
+"""Actuators driven by the awesome thermostats.
+
+An actuator turns the on ratio decided by the control into the service calls
+of its entities, and reads back from their states whether they heat.
+"""
+from homeassistant.components.climate.const import DOMAIN as CLIMATE_DOMAIN
+from homeassistant.const import (
+    ATTR_ENTITY_ID,
+    ATTR_TEMPERATURE,
+    SERVICE_TURN_OFF,
+    SERVICE_TURN_ON,
+    STATE_ON,
+)
+from homeassistant.core import DOMAIN as HA_DOMAIN
+
+HEATER_TYPE_SWITCH = "switch"
+HEATER_TYPE_VALVE = "valve"
+HEATER_TYPE_CLIMATE = "climate"
+
+# Smallest change of the opening of a valve, in percent, worth a command
+DEFAULT_VALVE_STEP = 5
+# Smallest change of the setpoint of a climate entity worth a command
+DEFAULT_SETPOINT_STEP = 0.5
+
+VALVE_CLOSED = 0
+VALVE_OPEN = 100
+
+
+def create_actuator(heater_type, entity_ids, step, off_temp):
+    """Return the actuator of a thermostat.
+
+    `step` defaults to the step of the type, `off_temp` is the setpoint of
+    the climate entities while they should not heat.
+    """
+    if heater_type == HEATER_TYPE_VALVE:
+        return ValveActuator(entity_ids, step or DEFAULT_VALVE_STEP)
+    if heater_type == HEATER_TYPE_CLIMATE:
+        return ClimateActuator(entity_ids, step or DEFAULT_SETPOINT_STEP, off_temp)
+    return SwitchActuator(entity_ids)
+
+
+def _by_domain(entity_ids):
+    """Group entity ids by domain."""
+    domains = {}
+    for entity_id in entity_ids:
+        domains.setdefault(entity_id.split(".", 1)[0], []).append(entity_id)
+    return domains
+
+
+class SwitchActuator:
+    """Switches or input booleans turned on and off.
+
+    A command is always sent, even if it repeats the last one, as keep-alive
+    relies on repeating it.
+    """
+
+    heater_type = HEATER_TYPE_SWITCH
+    # True if the actuator takes the on ratio instead of cycling
+    proportional = False
+    # True if the repeated commands are dropped, so they can be resent freely
+    filtered = False
+
+    def __init__(self, entity_ids):
+        """Initialize the actuator."""
+        self.entity_ids = entity_ids
+
+    def command(self, on_ratio, target_temp):
+        """Return the command for an on ratio."""
+        return on_ratio > 0
+
+    def redundant(self, value, sent):
+        """Return True if `value` is not worth sending after `sent`."""
+        return False
+
+    def calls(self, value, entity_ids=None):
+        """Return the (domain, service, data) calls sending `value`.
+
+        The calls go to `entity_ids`, or to all the entities of the actuator.
+        """
+        service = SERVICE_TURN_ON if value else SERVICE_TURN_OFF
+        return [(HA_DOMAIN, service, {ATTR_ENTITY_ID: entity_ids or self.entity_ids})]
+
+    def is_active(self, state):
+        """Return True if the state of an entity shows it heating."""
+        return state.state == STATE_ON
+
+
+class SteppedActuator:
+    """Base of the actuators taking a value, sent only when it moves enough.
+
+    Battery powered valves wake up their radio for each command, so a new
+    value is dropped while it is less than `step` away from the last value
+    sent, unless it reaches one of the `limits`.
+    """
+
+    proportional = False
+    filtered = True
+    limits = ()
+
+    def __init__(self, entity_ids, step):
+        """Initialize the actuator."""
+        self.entity_ids = entity_ids
+        self.step = step
+
+    def redundant(self, value, sent):
+        """Return True if `value` is not worth sending after `sent`."""
+        if sent is None or value == sent:
+            return sent is not None
+        return abs(value - sent) < self.step and value not in self.limits
+
+
+class ValveActuator(SteppedActuator):
+    """Valves taking an opening in percent, as number or input number.
+
+    The valves open in proportion to the on ratio rather than cycling.
+    """
+
+    heater_type = HEATER_TYPE_VALVE
+    proportional = True
+    limits = (VALVE_CLOSED, VALVE_OPEN)
+
+    def command(self, on_ratio, target_temp):
+        """Return the opening for an on ratio."""
+        return round(VALVE_OPEN * min(max(on_ratio, 0.0), 1.0))
+
+    def calls(self, value, entity_ids=None):
+        """Return the (domain, service, data) calls sending `value`.
+
+        The calls go to `entity_ids`, or to all the entities of the actuator.
+        """
+        return [
+            (domain, "set_value", {ATTR_ENTITY_ID: domain_entity_ids, "value": value})
+            for domain, domain_entity_ids in _by_domain(
+                entity_ids or self.entity_ids
+            ).items()
+        ]
+
+    def is_active(self, state):
+        """Return True if the valve is open."""
+        try:
+            return float(state.state) > VALVE_CLOSED
+        except ValueError:
+            return False
+
+
+class ClimateActuator(SteppedActuator):
+    """Climate entities, such as thermostatic valves, taking a setpoint.
+
+    While heating, the setpoint is the target temperature of the thermostat
+    and the climate entity regulates on its own. Otherwise the setpoint is
+    lowered to `off_temp`.
+    """
+
+    heater_type = HEATER_TYPE_CLIMATE
+
+    def __init__(self, entity_ids, step, off_temp):
+        """Initialize the actuator."""
+        super().__init__(entity_ids, step)
+        self.off_temp = off_temp
+        self.limits = (off_temp,)
+
+    def command(self, on_ratio, target_temp):
+        """Return the setpoint for an on ratio."""
+        if on_ratio > 0 and target_temp is not None:
+            return max(target_temp, self.off_temp)
+        return self.off_temp
+
+    def calls(self, value, entity_ids=None):
+        """Return the (domain, service, data) calls sending `value`.
+
+        The calls go to `entity_ids`, or to all the entities of the actuator.
+        """
+        return [
+            (
+                CLIMATE_DOMAIN,
+                "set_temperature",
+                {
+                    ATTR_ENTITY_ID: entity_ids or self.entity_ids,
+                    ATTR_TEMPERATURE: value,
+                },
+            )
+        ]
+
+    def is_active(self, state):
+        """Return True if the setpoint is above the off setpoint."""
+        try:
+            return float(state.attributes.get(ATTR_TEMPERATURE)) > self.off_temp
+        except (TypeError, ValueError):
+            return False
@@ -0,0 +1,137 @@
+"""Vectorized keep-alive evaluation for large fleets of awesome thermostats."""
+import numpy as np
+
+INITIAL_CAPACITY = 64
+
+
+class BatchEvaluator:
+    """Keep the control inputs of every thermostat in compact arrays.
+
+    Thermostats publish their inputs with `update` whenever they change, so a
+    keep-alive pass is a handful of array operations whatever the number of
+    thermostats. The decisions are the same as `control.compute_action` with
+    `keep_alive=True`.
+
+    Entities are not hashable, so slots are indexed by the identity of the
+    thermostats, which are kept alive by the evaluator while registered.
+    """
+
+    def __init__(self):
+        """Initialize the evaluator."""
+        self._slots = {}
+        self._thermostats = []
+        self._free = []
+        self._size = 0
+        self._allocate(INITIAL_CAPACITY)
+
+    def _allocate(self, capacity):
+        """Grow the arrays to `capacity` slots."""
+
+        def grow(array, fill):
+            grown = np.full(capacity, fill, dtype=array.dtype)
+            grown[: len(array)] = array
+            return grown
+
+        if self._size == 0:
+            self.cur_temp = np.full(capacity, np.nan)
+            self.target_temp = np.full(capacity, np.nan)
+            self.cold_tolerance = np.zeros(capacity)
+            self.hot_tolerance = np.zeros(capacity)
+            self.ac_mode = np.zeros(capacity, dtype=bool)
+            self.device_active = np.zeros(capacity, dtype=bool)
+            self.enabled = np.zeros(capacity, dtype=bool)
+            return
+        self.cur_temp = grow(self.cur_temp, np.nan)
+        self.target_temp = grow(self.target_temp, np.nan)
+        self.cold_tolerance = grow(self.cold_tolerance, 0.0)
+        self.hot_tolerance = grow(self.hot_tolerance, 0.0)
+        self.ac_mode = grow(self.ac_mode, False)
+        self.device_active = grow(self.device_active, False)
+        self.enabled = grow(self.enabled, False)
+
+    def add(self, thermostat):
+        """Reserve a slot for `thermostat` and return it."""
+        if self._free:
+            slot = self._free.pop()
+            self._thermostats[slot] = thermostat
+        else:
+            if self._size == len(self.cur_temp):
+                self._allocate(2 * self._size)
+            slot = self._size
+            self._size += 1
+            self._thermostats.append(thermostat)
+        self._slots[id(thermostat)] = slot
+        return slot
+
+    def remove(self, thermostat):
+        """Release the slot of `thermostat`."""
+        slot = self._slots.pop(id(thermostat))
+        self._thermostats[slot] = None
+        self.enabled[slot] = False
+        self.cur_temp[slot] = np.nan
+        self.target_temp[slot] = np.nan
+        self._free.append(slot)
+
+    def slot(self, thermostat):
+        """Return the slot of `thermostat`."""
+        return self._slots[id(thermostat)]
+
+    def slots(self, thermostats):
+        """Return the slots of `thermostats` as an integer array."""
+        return np.fromiter(
+            (self._slots[id(thermostat)] for thermostat in thermostats),
+            dtype=np.intp,
+            count=len(thermostats),
+        )
+
+    def thermostats(self):
+        """Return the registered thermostats."""
+        return [
+            thermostat for thermostat in self._thermostats if thermostat is not None
+        ]
+
+    def thermostat(self, slot):
+        """Return the thermostat owning `slot`."""
+        return self._thermostats[slot]
+
+    def update(
+        self,
+        thermostat,
+        cur_temp,
+        target_temp,
+        cold_tolerance,
+        hot_tolerance,
+        ac_mode,
+        device_active,
+        enabled,
+    ):
+        """Store the control inputs of `thermostat`."""
+        slot = self._slots[id(thermostat)]
+        self.cur_temp[slot] = np.nan if cur_temp is None else cur_temp
+        self.target_temp[slot] = np.nan if target_temp is None else target_temp
+        self.cold_tolerance[slot] = cold_tolerance
+        self.hot_tolerance[slot] = hot_tolerance
+        self.ac_mode[slot] = bool(ac_mode)
+        self.device_active[slot] = bool(device_active)
+        self.enabled[slot] = bool(enabled)
+
+    def evaluate_keep_alive(self, slots):
+        """Return the slots to turn on and the slots to turn off.
+
+        `slots` is an integer array of the slots to evaluate. Every enabled
+        slot with known temperatures gets a command, as keep-alive always
+        resends the state of the device.
+        """
+        cur_temp = self.cur_temp[slots]
+        target_temp = self.target_temp[slots]
+        ac_mode = self.ac_mode[slots]
+        valid = self.enabled[slots] & ~np.isnan(cur_temp) & ~np.isnan(target_temp)
+        too_cold = target_temp >= cur_temp + self.cold_tolerance[slots]
+        too_hot = cur_temp >= target_temp + self.hot_tolerance[slots]
+        should_stop = np.where(ac_mode, too_cold, too_hot)
+        should_start = np.where(ac_mode, too_hot, too_cold)
+        turn_on = valid & np.where(
+            self.device_active[slots], ~should_stop, should_start
+        )
+        turn_off = valid & ~turn_on
+        return slots[turn_on], slots[turn_off]
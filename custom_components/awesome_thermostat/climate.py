@@ -1,17 +1,25 @@
 """Adds support for awesome thermostat units."""
 import asyncio
+from datetime import timedelta
 import logging
 import math
+from time import perf_counter
 
 import voluptuous as vol
 
-from homeassistant.components.climate import PLATFORM_SCHEMA, ClimateEntity
+from homeassistant.components.climate import (
+    DOMAIN as CLIMATE_DOMAIN,
+    PLATFORM_SCHEMA,
+    ClimateEntity,
+)
 from homeassistant.components.climate.const import (
+    ATTR_CURRENT_TEMPERATURE,
     ATTR_PRESET_MODE,
     CURRENT_HVAC_COOL,
     CURRENT_HVAC_HEAT,
     CURRENT_HVAC_IDLE,
     CURRENT_HVAC_OFF,
+    DEFAULT_MIN_TEMP,
     HVAC_MODE_COOL,
     HVAC_MODE_HEAT,
     HVAC_MODE_OFF,
@@ -30,37 +38,78 @@ from homeassistant.const import (
     ATTR_ENTITY_ID,
     ATTR_TEMPERATURE,
     CONF_NAME,
+    CONF_PLATFORM,
+    CONF_SENSORS,
     CONF_UNIQUE_ID,
-    EVENT_HOMEASSISTANT_START,
     PRECISION_HALVES,
     PRECISION_TENTHS,
     PRECISION_WHOLE,
-    SERVICE_TURN_OFF,
-    SERVICE_TURN_ON,
     STATE_ON,
     STATE_OFF,
     STATE_UNAVAILABLE,
     STATE_UNKNOWN,
+    UnitOfTemperature,
 )
-from homeassistant.core import DOMAIN as HA_DOMAIN, CoreState, callback
-from homeassistant.exceptions import ConditionError
-from homeassistant.helpers import condition
+from homeassistant.core import callback
+from homeassistant.helpers import discovery, entity_platform
 import homeassistant.helpers.config_validation as cv
-from homeassistant.helpers.event import (
-    async_track_state_change_event,
-    async_track_time_interval,
-    async_call_later,
-)
 from homeassistant.helpers.reload import async_setup_reload_service
-from homeassistant.helpers.restore_state import RestoreEntity
+from homeassistant.helpers.restore_state import RestoredExtraData, RestoreEntity
+import homeassistant.util.dt as dt_util
+from homeassistant.util.unit_conversion import TemperatureConverter
 from voluptuous.schema_builder import Self
 
-from . import DOMAIN, PLATFORMS
+from . import (
+    DATA_ACCOUNTING,
+    DATA_ENERGY_SENSORS,
+    DOMAIN,
+    KIND_CYCLES,
+    KIND_ENERGY,
+    KIND_RUNTIME,
+    SCHEDULE_SCHEMA,
+    async_get_accounting,
+)
+from .actuator import (
+    HEATER_TYPE_CLIMATE,
+    HEATER_TYPE_SWITCH,
+    HEATER_TYPE_VALVE,
+    create_actuator,
+)
+from .control import (
+    ACTION_TURN_OFF,
+    ACTION_TURN_ON,
+    AGGREGATION_MEAN,
+    AGGREGATION_MEDIAN,
+    AGGREGATION_WEIGHTED,
+    compute_action,
+    compute_feed_forward,
+    compute_on_duration,
+    compute_on_ratio,
+    PIDController,
+    SensorAggregator,
+    SlopeEstimator,
+    ThermalModel,
+)
+from .coordinator import async_get_coordinator
+from .instrumentation import ControlStats
+from .switching import HeaterCommands
 
 _LOGGER = logging.getLogger(__name__)
 
 DEFAULT_TOLERANCE = 0.3
 DEFAULT_NAME = "Awesome Thermostat"
+DEFAULT_CYCLE_DURATION = timedelta(minutes=15)
+DEFAULT_PROPORTIONAL_GAIN = 2.0
+DEFAULT_PROPORTIONAL_BIAS = 0.5
+DEFAULT_PID_KP = 0.6
+DEFAULT_PID_KI = 0.0005
+DEFAULT_PID_KD = 0.0
+DEFAULT_SENSOR_WINDOW = 5
+DEFAULT_SAFE_DUTY_CYCLE = 0.3
+DEFAULT_FROST_PROTECTION_TEMP = 7.0
+DEFAULT_SWITCH_TIMEOUT = timedelta(seconds=10)
+DEFAULT_WINDOW_SLOPE_SAMPLES = 6
+DEFAULT_WINDOW_OPEN_TIMEOUT = timedelta(minutes=30)
 
 CONF_HEATER = "heater"
 CONF_SENSOR = "target_sensor"
@@ -79,6 +128,106 @@ CONF_HOT_TOLERANCE = "hot_tolerance"
 CONF_KEEP_ALIVE = "keep_alive"
 CONF_INITIAL_HVAC_MODE = "initial_hvac_mode"
 CONF_PRECISION = "precision"
+CONF_SENSOR_DEBOUNCE = "sensor_debounce"
+CONF_SENSOR_MIN_DELTA = "sensor_min_delta"
+CONF_CONTROL_MODE = "control_mode"
+CONF_CYCLE_DURATION = "cycle_duration"
+CONF_PROPORTIONAL_GAIN = "proportional_gain"
+CONF_PROPORTIONAL_BIAS = "proportional_bias"
+CONF_PID_KP = "pid_kp"
+CONF_PID_KI = "pid_ki"
+CONF_PID_KD = "pid_kd"
+CONF_HEATER_POWER = "heater_power"
+CONF_SENSOR_AGGREGATION = "sensor_aggregation"
+CONF_SENSOR_WEIGHTS = "sensor_weights"
+CONF_SENSOR_WINDOW = "sensor_window"
+CONF_SENSOR_OUTLIER_THRESHOLD = "sensor_outlier_threshold"
+CONF_SENSOR_TIMEOUT = "sensor_timeout"
+CONF_SAFE_MODE = "safe_mode"
+CONF_SAFE_DUTY_CYCLE = "safe_duty_cycle"
+CONF_FROST_PROTECTION_TEMP = "frost_protection_temp"
+CONF_SWITCH_TIMEOUT = "switch_timeout"
+CONF_WINDOW_SLOPE_THRESHOLD = "window_slope_threshold"
+CONF_WINDOW_SLOPE_SAMPLES = "window_slope_samples"
+CONF_WINDOW_OPEN_TIMEOUT = "window_open_timeout"
+CONF_TEMPERATURE_WRITE_INTERVAL = "temperature_write_interval"
+CONF_ACCOUNTING = "accounting"
+CONF_ZONES = "zones"
+CONF_SCHEDULE = "schedule"
+CONF_OUTDOOR_GAIN = "outdoor_gain"
+CONF_HEATER_TYPE = "heater_type"
+CONF_ACTUATOR_STEP = "actuator_step"
+
+CONTROL_MODE_HYSTERESIS = "hysteresis"
+CONTROL_MODE_PROPORTIONAL = "proportional"
+CONTROL_MODE_PID = "pid"
+CYCLE_CONTROL_MODES = (CONTROL_MODE_PROPORTIONAL, CONTROL_MODE_PID)
+
+MOTION_STATE_MOTION = "motion"
+MOTION_STATE_WAITING = "waiting"
+MOTION_STATE_NO_MOTION = "no_motion"
+
+SAFE_MODE_OFF = "off"
+SAFE_MODE_DUTY_CYCLE = "duty_cycle"
+SAFE_MODE_FROST_PROTECTION = "frost_protection"
+
+EVENT_SENSOR_STALE = "awesome_thermostat_sensor_stale"
+
+# Shortest span of the samples used to detect an open window from the slope
+WINDOW_SLOPE_MIN_SPAN = timedelta(minutes=2)
+
+ATTR_PID_INTEGRAL = "pid_integral"
+ATTR_POWER_WAITING = "power_waiting"
+ATTR_SENSOR_STALE = "sensor_stale"
+ATTR_SENSOR_LAST_UPDATE = "sensor_last_update"
+ATTR_WINDOW_OPEN_DETECTED = "window_open_detected"
+ATTR_TEMPERATURE_SLOPE = "temperature_slope"
+ATTR_MOTION_STATE = "motion_state"
+ATTR_MOTION_TIMERS_SCHEDULED = "motion_timers_scheduled"
+ATTR_MOTION_TIMERS_CANCELLED = "motion_timers_cancelled"
+ATTR_HEATER_BREAKER = "heater_breaker"
+ATTR_HEATER_FAILURES = "heater_failures"
+ATTR_HEATER_COMMANDS_SUPERSEDED = "heater_commands_superseded"
+ATTR_HEATER_COMMANDS_SKIPPED = "heater_commands_skipped"
+ATTR_THERMAL_MODEL = "thermal_model"
+ATTR_PREHEAT_START = "preheat_start"
+ATTR_TIME = "time"
+ATTR_STATE_WRITES = "state_writes"
+ATTR_STATE_WRITES_SKIPPED = "state_writes_skipped"
+ATTR_PERFORMANCE = "performance"
+ATTR_HEATER_RUNTIME = "heater_runtime"
+ATTR_HEATER_CYCLES = "heater_cycles"
+ATTR_HEATER_ENERGY = "heater_energy"
+ATTR_FEED_FORWARD = "feed_forward"
+
+# Attributes changing on their own which do not justify a state write
+DIAGNOSTIC_ATTRIBUTES = frozenset(
+    (
+        "sensor_events_received",
+        "sensor_events_dropped",
+        "sensor_events_coalesced",
+        "sensor_events_rejected",
+        ATTR_PID_INTEGRAL,
+        ATTR_SENSOR_LAST_UPDATE,
+        ATTR_TEMPERATURE_SLOPE,
+        ATTR_MOTION_TIMERS_SCHEDULED,
+        ATTR_MOTION_TIMERS_CANCELLED,
+        ATTR_HEATER_COMMANDS_SUPERSEDED,
+        ATTR_HEATER_COMMANDS_SKIPPED,
+        ATTR_THERMAL_MODEL,
+        ATTR_STATE_WRITES,
+        ATTR_STATE_WRITES_SKIPPED,
+        ATTR_PERFORMANCE,
+        ATTR_FEED_FORWARD,
+    )
+)
+
+SERVICE_REACH_TEMPERATURE = "reach_temperature"
+
+# Share of the predicted heating time added to start a pre-heating early
+PREHEAT_MARGIN = 0.1
+# A planned pre-heating is only moved if its start changes more than this
+PREHEAT_TOLERANCE = timedelta(minutes=1)
 
 
 SUPPORT_FLAGS = SUPPORT_TARGET_TEMPERATURE
@@ -95,131 +244,272 @@ CONF_PRESETS = {
     )
 }
 
-PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
-    {
-        vol.Required(CONF_HEATER): cv.entity_id,
-        vol.Required(CONF_SENSOR): cv.entity_id,
-        vol.Optional(CONF_WINDOWS_SENSOR): cv.entity_id,
-        vol.Optional(CONF_MOTION_SENSOR): cv.entity_id,
-        vol.Optional(CONF_MOTION_MODE): cv.string,
-        vol.Optional(CONF_NO_MOTION_MODE): cv.string,
-        vol.Optional(CONF_MOTION_DELAY): cv.positive_time_period,
-        vol.Optional(CONF_AC_MODE): cv.boolean,
-        vol.Optional(CONF_MAX_TEMP): vol.Coerce(float),
-        vol.Optional(CONF_MIN_DUR): cv.positive_time_period,
-        vol.Optional(CONF_MIN_TEMP): vol.Coerce(float),
-        vol.Optional(CONF_NAME, default=DEFAULT_NAME): cv.string,
-        vol.Optional(CONF_COLD_TOLERANCE, default=DEFAULT_TOLERANCE): vol.Coerce(float),
-        vol.Optional(CONF_HOT_TOLERANCE, default=DEFAULT_TOLERANCE): vol.Coerce(float),
-        vol.Optional(CONF_TARGET_TEMP): vol.Coerce(float),
-        vol.Optional(CONF_KEEP_ALIVE): cv.positive_time_period,
-        vol.Optional(CONF_INITIAL_HVAC_MODE): vol.In(
-            [HVAC_MODE_COOL, HVAC_MODE_HEAT, HVAC_MODE_OFF]
-        ),
-        vol.Optional(CONF_PRECISION): vol.In(
-            [PRECISION_TENTHS, PRECISION_HALVES, PRECISION_WHOLE]
-        ),
-        vol.Optional(CONF_UNIQUE_ID): cv.string,
+
+def _validate_sensor_aggregation(config):
+    """Check that the aggregation settings of a zone match its sensors."""
+    if (
+        config.get(CONF_SENSOR_OUTLIER_THRESHOLD) is not None
+        and config[CONF_SENSOR_WINDOW] < 3
+    ):
+        raise vol.Invalid(
+            f"{CONF_SENSOR_WINDOW} must be at least 3 to reject outliers",
+            path=[CONF_SENSOR_WINDOW],
+        )
+    weights = config.get(CONF_SENSOR_WEIGHTS)
+    if weights is not None and len(weights) != len(config[CONF_SENSOR]):
+        raise vol.Invalid(
+            f"{CONF_SENSOR_WEIGHTS} must give one weight per sensor",
+            path=[CONF_SENSOR_WEIGHTS],
+        )
+    return config
+
+
+ZONE_SCHEMA = vol.All(
+    PLATFORM_SCHEMA.extend(
+        {
+            vol.Required(CONF_HEATER): cv.entity_ids,
+            vol.Required(CONF_SENSOR): cv.entity_ids,
+            vol.Optional(CONF_WINDOWS_SENSOR): cv.entity_id,
+            vol.Optional(CONF_MOTION_SENSOR): cv.entity_id,
+            vol.Optional(CONF_MOTION_MODE): cv.string,
+            vol.Optional(CONF_NO_MOTION_MODE): cv.string,
+            vol.Optional(CONF_MOTION_DELAY): cv.positive_time_period,
+            vol.Optional(CONF_AC_MODE): cv.boolean,
+            vol.Optional(CONF_MAX_TEMP): vol.Coerce(float),
+            vol.Optional(CONF_MIN_DUR): cv.positive_time_period,
+            vol.Optional(CONF_MIN_TEMP): vol.Coerce(float),
+            vol.Optional(CONF_NAME, default=DEFAULT_NAME): cv.string,
+            vol.Optional(CONF_COLD_TOLERANCE, default=DEFAULT_TOLERANCE): vol.Coerce(
+                float
+            ),
+            vol.Optional(CONF_HOT_TOLERANCE, default=DEFAULT_TOLERANCE): vol.Coerce(
+                float
+            ),
+            vol.Optional(CONF_TARGET_TEMP): vol.Coerce(float),
+            vol.Optional(CONF_KEEP_ALIVE): cv.positive_time_period,
+            vol.Optional(CONF_INITIAL_HVAC_MODE): vol.In(
+                [HVAC_MODE_COOL, HVAC_MODE_HEAT, HVAC_MODE_OFF]
+            ),
+            vol.Optional(CONF_PRECISION): vol.In(
+                [PRECISION_TENTHS, PRECISION_HALVES, PRECISION_WHOLE]
+            ),
+            vol.Optional(CONF_SENSOR_DEBOUNCE): cv.positive_time_period,
+            vol.Optional(CONF_SENSOR_MIN_DELTA, default=0): vol.Coerce(float),
+            vol.Optional(CONF_CONTROL_MODE, default=CONTROL_MODE_HYSTERESIS): vol.In(
+                [CONTROL_MODE_HYSTERESIS, CONTROL_MODE_PROPORTIONAL, CONTROL_MODE_PID]
+            ),
+            vol.Optional(
+                CONF_CYCLE_DURATION, default=DEFAULT_CYCLE_DURATION
+            ): cv.positive_time_period,
+            vol.Optional(
+                CONF_PROPORTIONAL_GAIN, default=DEFAULT_PROPORTIONAL_GAIN
+            ): vol.Coerce(float),
+            vol.Optional(
+                CONF_PROPORTIONAL_BIAS, default=DEFAULT_PROPORTIONAL_BIAS
+            ): vol.All(vol.Coerce(float), vol.Range(min=0, max=1)),
+            vol.Optional(CONF_PID_KP, default=DEFAULT_PID_KP): vol.Coerce(float),
+            vol.Optional(CONF_PID_KI, default=DEFAULT_PID_KI): vol.Coerce(float),
+            vol.Optional(CONF_PID_KD, default=DEFAULT_PID_KD): vol.Coerce(float),
+            vol.Optional(CONF_HEATER_POWER): vol.All(
+                vol.Coerce(float), vol.Range(min=0)
+            ),
+            vol.Optional(CONF_SENSOR_AGGREGATION, default=AGGREGATION_MEAN): vol.In(
+                [AGGREGATION_MEAN, AGGREGATION_MEDIAN, AGGREGATION_WEIGHTED]
+            ),
+            vol.Optional(CONF_SENSOR_WEIGHTS): vol.All(
+                cv.ensure_list, [vol.Coerce(float)]
+            ),
+            vol.Optional(CONF_SENSOR_WINDOW, default=DEFAULT_SENSOR_WINDOW): vol.All(
+                vol.Coerce(int), vol.Range(min=1)
+            ),
+            vol.Optional(CONF_SENSOR_OUTLIER_THRESHOLD): vol.All(
+                vol.Coerce(float), vol.Range(min=0)
+            ),
+            vol.Optional(CONF_SENSOR_TIMEOUT): cv.positive_time_period,
+            vol.Optional(CONF_SAFE_MODE, default=SAFE_MODE_OFF): vol.In(
+                [SAFE_MODE_OFF, SAFE_MODE_DUTY_CYCLE, SAFE_MODE_FROST_PROTECTION]
+            ),
+            vol.Optional(
+                CONF_SAFE_DUTY_CYCLE, default=DEFAULT_SAFE_DUTY_CYCLE
+            ): vol.All(vol.Coerce(float), vol.Range(min=0, max=1)),
+            vol.Optional(
+                CONF_FROST_PROTECTION_TEMP, default=DEFAULT_FROST_PROTECTION_TEMP
+            ): vol.Coerce(float),
+            vol.Optional(
+                CONF_SWITCH_TIMEOUT, default=DEFAULT_SWITCH_TIMEOUT
+            ): cv.positive_time_period,
+            vol.Optional(CONF_WINDOW_SLOPE_THRESHOLD): vol.All(
+                vol.Coerce(float), vol.Range(min=0)
+            ),
+            vol.Optional(
+                CONF_WINDOW_SLOPE_SAMPLES, default=DEFAULT_WINDOW_SLOPE_SAMPLES
+            ): vol.All(vol.Coerce(int), vol.Range(min=2)),
+            vol.Optional(
+                CONF_WINDOW_OPEN_TIMEOUT, default=DEFAULT_WINDOW_OPEN_TIMEOUT
+            ): cv.positive_time_period,
+            vol.Optional(CONF_TEMPERATURE_WRITE_INTERVAL): cv.positive_time_period,
+            vol.Optional(CONF_ACCOUNTING, default=False): cv.boolean,
+            vol.Optional(CONF_SCHEDULE): vol.Any(cv.string, SCHEDULE_SCHEMA),
+            vol.Optional(CONF_OUTDOOR_GAIN, default=0): vol.All(
+                vol.Coerce(float), vol.Range(min=0)
+            ),
+            vol.Optional(CONF_HEATER_TYPE, default=HEATER_TYPE_SWITCH): vol.In(
+                [HEATER_TYPE_SWITCH, HEATER_TYPE_VALVE, HEATER_TYPE_CLIMATE]
+            ),
+            vol.Optional(CONF_ACTUATOR_STEP): vol.All(
+                vol.Coerce(float), vol.Range(min=0)
+            ),
+            vol.Optional(CONF_UNIQUE_ID): cv.string,
+        }
+    ).extend({vol.Optional(v): vol.Coerce(float) for (k, v) in CONF_PRESETS.items()}),
+    _validate_sensor_aggregation,
+)
+
+
+def _validate_zones(config):
+    """Validate a zone, or a list of zones sharing the settings of the block.
+
+    The settings of each zone of `zones` override the shared settings.
+    """
+    if CONF_ZONES not in config:
+        return ZONE_SCHEMA(config)
+    shared = {key: value for key, value in config.items() if key != CONF_ZONES}
+    zones = vol.Schema([dict])(config[CONF_ZONES])
+    return {
+        CONF_PLATFORM: config[CONF_PLATFORM],
+        CONF_ZONES: [ZONE_SCHEMA({**shared, **zone}) for zone in zones],
     }
-).extend({vol.Optional(v): vol.Coerce(float) for (k, v) in CONF_PRESETS.items()})
+
+
+PLATFORM_SCHEMA = vol.All(dict, _validate_zones)
 
 
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     """Set up the awesome thermostat platform."""
 
-    await async_setup_reload_service(hass, DOMAIN, PLATFORMS)
-
-    name = config.get(CONF_NAME)
-    heater_entity_id = config.get(CONF_HEATER)
-    temperature_entity_id = config.get(CONF_SENSOR)
-    windows_entity_id = config.get(CONF_WINDOWS_SENSOR)
-    min_temp = config.get(CONF_MIN_TEMP)
-    max_temp = config.get(CONF_MAX_TEMP)
-    target_temp = config.get(CONF_TARGET_TEMP)
-    ac_mode = config.get(CONF_AC_MODE)
-    min_cycle_duration = config.get(CONF_MIN_DUR)
-    cold_tolerance = config.get(CONF_COLD_TOLERANCE)
-    hot_tolerance = config.get(CONF_HOT_TOLERANCE)
-    keep_alive = config.get(CONF_KEEP_ALIVE)
-    initial_hvac_mode = config.get(CONF_INITIAL_HVAC_MODE)
-    presets = {}
-    for (key, value) in CONF_PRESETS.items():
-        if value in config:
-            presets[key] = config.get(value)
-    motion_entity_id = config.get(CONF_MOTION_SENSOR)
-    motion_mode = config.get(CONF_MOTION_MODE)
-    no_motion_mode = config.get(CONF_NO_MOTION_MODE)
-    motion_delay = config.get(CONF_MOTION_DELAY)
-    precision = config.get(CONF_PRECISION)
-    unit = hass.config.units.temperature_unit
-    unique_id = config.get(CONF_UNIQUE_ID)
-
-    async_add_entities(
-        [
-            AwesomeThermostat(
-                name,
-                heater_entity_id,
-                temperature_entity_id,
-                windows_entity_id,
-                motion_entity_id,
-                motion_mode,
-                no_motion_mode,
-                motion_delay,
-                min_temp,
-                max_temp,
-                target_temp,
-                ac_mode,
-                min_cycle_duration,
-                cold_tolerance,
-                hot_tolerance,
-                keep_alive,
-                initial_hvac_mode,
-                presets,
-                precision,
-                unit,
-                unique_id,
-            )
-        ]
+    await async_setup_reload_service(hass, DOMAIN, [CLIMATE_DOMAIN])
+    _async_register_services()
+
+    zones = config[CONF_ZONES] if CONF_ZONES in config else [config]
+    async_add_entities([_async_create_thermostat(hass, zone) for zone in zones])
+
+
+async def async_setup_entry(hass, entry, async_add_entities):
+    """Set up the awesome thermostat of a config entry."""
+    _async_register_services()
+    config = ZONE_SCHEMA(
+        {
+            CONF_PLATFORM: DOMAIN,
+            CONF_UNIQUE_ID: entry.entry_id,
+            **entry.data,
+            **entry.options,
+        }
+    )
+    async_add_entities([_async_create_thermostat(hass, config, discover_sensors=False)])
+
+
+@callback
+def _async_register_services():
+    """Register the entity services on the current platform."""
+    platform = entity_platform.async_get_current_platform()
+    platform.async_register_entity_service(
+        SERVICE_REACH_TEMPERATURE,
+        vol.All(
+            cv.make_entity_service_schema(
+                {
+                    vol.Required(ATTR_TIME): cv.datetime,
+                    vol.Exclusive(ATTR_TEMPERATURE, "target"): vol.Coerce(float),
+                    vol.Exclusive(ATTR_PRESET_MODE, "target"): cv.string,
+                }
+            ),
+            cv.has_at_least_one_key(ATTR_TEMPERATURE, ATTR_PRESET_MODE),
+        ),
+        "async_reach_temperature",
     )
 
 
+@callback
+def _async_create_thermostat(hass, config, discover_sensors=True):
+    """Create the thermostat of a validated zone config.
+
+    The companion sensors of a YAML zone are loaded by discovery, those of a
+    config entry by the sensor platform forwarded for the entry.
+    """
+    accounting = None
+    if config.get(CONF_ACCOUNTING):
+        accounting = _async_get_accounting(
+            hass,
+            config.get(CONF_NAME),
+            config.get(CONF_UNIQUE_ID),
+            config.get(CONF_HEATER_POWER),
+            discover_sensors,
+        )
+    return AwesomeThermostat(config, hass.config.units.temperature_unit, accounting)
+
+
+@callback
+def _async_get_accounting(hass, name, unique_id, heater_power, discover_sensors):
+    """Return the accounting of a thermostat, kept across the reloads.
+
+    The companion sensors of a discovered thermostat are loaded along with
+    its first accounting, and the energy sensor along with its first heater
+    power.
+    """
+    key = unique_id or name
+    accountings = hass.data.setdefault(DOMAIN, {}).setdefault(DATA_ACCOUNTING, {})
+    kinds = [] if key in accountings else [KIND_RUNTIME, KIND_CYCLES]
+    accounting = async_get_accounting(hass, key)
+    accounting.heater_power = heater_power
+    if not discover_sensors:
+        return accounting
+    energy_sensors = hass.data[DOMAIN].setdefault(DATA_ENERGY_SENSORS, set())
+    if heater_power and key not in energy_sensors:
+        energy_sensors.add(key)
+        kinds.append(KIND_ENERGY)
+    if kinds:
+        hass.async_create_task(
+            discovery.async_load_platform(
+                hass,
+                "sensor",
+                DOMAIN,
+                {CONF_NAME: name, CONF_UNIQUE_ID: unique_id, CONF_SENSORS: kinds},
+                {},
+            )
+        )
+    return accounting
+
+
 class AwesomeThermostat(ClimateEntity, RestoreEntity):
     """Representation of a Awesome Thermostat device."""
 
-    def __init__(
-        self,
-        name,
-        heater_entity_id,
-        temperature_entity_id,
-        windows_entity_id,
-        motion_entity_id,
-        motion_mode,
-        no_motion_mode,
-        motion_delay,
-        min_temp,
-        max_temp,
-        target_temp,
-        ac_mode,
-        min_cycle_duration,
-        cold_tolerance,
-        hot_tolerance,
-        keep_alive,
-        initial_hvac_mode,
-        presets,
-        precision,
-        unit,
-        unique_id,
-    ):
-        """Initialize the thermostat."""
-        self._name = name
-        self.heater_entity_id = heater_entity_id
-        self.temperature_entity_id = temperature_entity_id
-        self.windows_entity_id = windows_entity_id
-        self.motion_entity_id = motion_entity_id
+    def __init__(self, config, unit, accounting):
+        """Initialize the thermostat from the validated config of its zone.
+
+        The temperatures are in `unit`, and the heating runtime and energy are
+        counted in `accounting` if given.
+        """
+        presets = {
+            key: config[value] for key, value in CONF_PRESETS.items() if value in config
+        }
+        motion_mode = config.get(CONF_MOTION_MODE)
+        no_motion_mode = config.get(CONF_NO_MOTION_MODE)
+        control_mode = config.get(CONF_CONTROL_MODE)
+        target_temp = config.get(CONF_TARGET_TEMP)
+        min_temp = config.get(CONF_MIN_TEMP)
+        self._name = config.get(CONF_NAME)
+        self.heater_entity_ids = config.get(CONF_HEATER)
+        self.temperature_entity_ids = config.get(CONF_SENSOR)
+        self.windows_entity_id = config.get(CONF_WINDOWS_SENSOR)
+        self.motion_entity_id = config.get(CONF_MOTION_SENSOR)
         self.motion_mode = motion_mode
         self.no_motion_mode = no_motion_mode
-        self.motion_delay = motion_delay
+        self.motion_delay = config.get(CONF_MOTION_DELAY)
         self.support_motion_control = False
+        self._motion_state = None
+        self._motion_off_since = None
+        self._cancel_no_motion = None
+        self._motion_timers_scheduled = 0
+        self._motion_timers_cancelled = 0
         if (
             self.motion_entity_id
             and self.motion_mode
@@ -230,15 +520,15 @@ class AwesomeThermostat(ClimateEntity, RestoreEntity):
         ):
             self.support_motion_control = True
             presets[PRESET_ACTIVITY] = presets[no_motion_mode]
-        self.ac_mode = ac_mode
-        self.min_cycle_duration = min_cycle_duration
-        self._cold_tolerance = cold_tolerance
-        self._hot_tolerance = hot_tolerance
-        self._keep_alive = keep_alive
-        self._hvac_mode = initial_hvac_mode
+        self.ac_mode = config.get(CONF_AC_MODE)
+        self.min_cycle_duration = config.get(CONF_MIN_DUR)
+        self._cold_tolerance = config.get(CONF_COLD_TOLERANCE)
+        self._hot_tolerance = config.get(CONF_HOT_TOLERANCE)
+        self._keep_alive = config.get(CONF_KEEP_ALIVE)
+        self._hvac_mode = config.get(CONF_INITIAL_HVAC_MODE)
         self._saved_hvac_mode = self._hvac_mode
         self._saved_target_temp = target_temp or next(iter(presets.values()), None)
-        self._temp_precision = precision
+        self._temp_precision = config.get(CONF_PRECISION)
         if self.ac_mode:
             self._hvac_list = [HVAC_MODE_COOL, HVAC_MODE_OFF]
         else:
@@ -246,12 +536,17 @@ class AwesomeThermostat(ClimateEntity, RestoreEntity):
         self._active = False
         self._cur_temp = None
         self._temp_lock = asyncio.Lock()
+        self._heater_states = {}
+        self._heater_active = None
+        self._heater_last_switch = None
+        self._coordinator = None
+        self._batch = None
         self._min_temp = min_temp
-        self._max_temp = max_temp
+        self._max_temp = config.get(CONF_MAX_TEMP)
         self._attr_preset_mode = PRESET_NONE
         self._target_temp = target_temp
         self._unit = unit
-        self._unique_id = unique_id
+        self._unique_id = config.get(CONF_UNIQUE_ID)
         self._support_flags = SUPPORT_FLAGS
         if len(presets):
             self._support_flags = SUPPORT_FLAGS | SUPPORT_PRESET_MODE
@@ -259,67 +554,162 @@ class AwesomeThermostat(ClimateEntity, RestoreEntity):
         else:
             self._attr_preset_modes = [PRESET_NONE]
         self._presets = presets
+        self._sensor_debounce = config.get(CONF_SENSOR_DEBOUNCE)
+        self._sensor_min_delta = config.get(CONF_SENSOR_MIN_DELTA)
+        self._cancel_temp_flush = None
+        self._sensor_events_received = 0
+        self._sensor_events_dropped = 0
+        self._sensor_events_coalesced = 0
+        self._control_mode = control_mode
+        self._cycle_duration = config.get(CONF_CYCLE_DURATION)
+        self._proportional_gain = config.get(CONF_PROPORTIONAL_GAIN)
+        self._proportional_bias = config.get(CONF_PROPORTIONAL_BIAS)
+        self._on_ratio = None
+        self._cycle_on = None
+        self._cancel_cycle_end = None
+        self._pid = None
+        if control_mode == CONTROL_MODE_PID:
+            self._pid = PIDController(
+                config.get(CONF_PID_KP),
+                config.get(CONF_PID_KI),
+                config.get(CONF_PID_KD),
+            )
+        self._thermal_model = ThermalModel()
+        self._preheat = None
+        self._preheat_start = None
+        self._cancel_preheat = None
+        self.heater_power = config.get(CONF_HEATER_POWER)
+        self._power = None
+        self._sensors = SensorAggregator(
+            config.get(CONF_SENSOR_AGGREGATION),
+            config.get(CONF_SENSOR_WINDOW),
+            config.get(CONF_SENSOR_OUTLIER_THRESHOLD),
+        )
+        self._sensors.weights = dict(
+            zip(self.temperature_entity_ids, config.get(CONF_SENSOR_WEIGHTS) or [])
+        )
+        self._sensor_events_rejected = 0
+        self._sensor_timeout = config.get(CONF_SENSOR_TIMEOUT)
+        self._sensor_last_update = None
+        self._sensor_stale = False
+        self._safe_mode = config.get(CONF_SAFE_MODE)
+        self._safe_duty_cycle = config.get(CONF_SAFE_DUTY_CYCLE)
+        self._frost_protection_temp = config.get(CONF_FROST_PROTECTION_TEMP)
+        self._safe_temp = None
+        self._safe_temp_time = None
+        self._remove_safe_cycle = None
+        self._switch_timeout = config.get(CONF_SWITCH_TIMEOUT)
+        self._commands = None
+        self._window_slope_threshold = config.get(CONF_WINDOW_SLOPE_THRESHOLD)
+        self._window_open_timeout = config.get(CONF_WINDOW_OPEN_TIMEOUT)
+        self._window_slope = None
+        if self._window_slope_threshold and not self.windows_entity_id:
+            self._window_slope = SlopeEstimator(config.get(CONF_WINDOW_SLOPE_SAMPLES))
+        self._window_open_detected = False
+        self._cancel_window_timeout = None
+        self._temperature_write_interval = config.get(CONF_TEMPERATURE_WRITE_INTERVAL)
+        self._last_written = None
+        self._last_write_time = None
+        self._cancel_deferred_write = None
+        self._state_writes = 0
+        self._state_writes_skipped = 0
+        self._stats = None
+        self._accounting = accounting
+        self._schedule = config.get(CONF_SCHEDULE)
+        self._outdoor_gain = config.get(CONF_OUTDOOR_GAIN)
+        off_temp = min_temp
+        if off_temp is None:
+            off_temp = TemperatureConverter.convert(
+                DEFAULT_MIN_TEMP, UnitOfTemperature.CELSIUS, unit
+            )
+        self._actuator = create_actuator(
+            config.get(CONF_HEATER_TYPE),
+            self.heater_entity_ids,
+            config.get(CONF_ACTUATOR_STEP),
+            off_temp,
+        )
 
     async def async_added_to_hass(self):
         """Run when entity about to be added."""
         await super().async_added_to_hass()
 
         # Add listener
+        self._coordinator = coordinator = async_get_coordinator(self.hass)
+        if coordinator.instrumentation:
+            self._stats = ControlStats()
+        self._commands = HeaterCommands(
+            self.hass,
+            coordinator,
+            self._actuator,
+            self._switch_timeout,
+            self._async_write_state,
+            self._stats,
+        )
+        self.async_on_remove(self._commands.async_cancel)
         self.async_on_remove(
-            async_track_state_change_event(
-                self.hass, [self.temperature_entity_id], self._async_temperature_changed
+            coordinator.async_track_entities(
+                self.temperature_entity_ids, self._async_temperature_changed
             )
         )
         if self.windows_entity_id:
             self.async_on_remove(
-                async_track_state_change_event(
-                    self.hass, [self.windows_entity_id], self._async_windows_changed
+                coordinator.async_track_entities(
+                    [self.windows_entity_id], self._async_windows_changed
                 )
             )
         if self.support_motion_control:
             self.async_on_remove(
-                async_track_state_change_event(
-                    self.hass, [self.motion_entity_id], self._async_motion_changed
+                coordinator.async_track_entities(
+                    [self.motion_entity_id], self._async_motion_changed
                 )
             )
+            self.async_on_remove(self._async_cancel_no_motion)
         self.async_on_remove(
-            async_track_state_change_event(
-                self.hass, [self.heater_entity_id], self._async_switch_changed
+            coordinator.async_track_entities(
+                self.heater_entity_ids, self._async_switch_changed
             )
         )
 
+        # The power budget and the batch mode switch the heaters on their own
+        switches = self._actuator.heater_type == HEATER_TYPE_SWITCH
+        if coordinator.power is not None and self.heater_power and switches:
+            self._power = coordinator.power
+            self.async_on_remove(self._power.async_add(self))
+
+        proportional = self._control_mode in CYCLE_CONTROL_MODES
         if self._keep_alive:
+            batch = not proportional and self._power is None and switches
             self.async_on_remove(
-                async_track_time_interval(
-                    self.hass, self._async_control_heating, self._keep_alive
-                )
+                coordinator.async_track_keep_alive(self, self._keep_alive, batch=batch)
             )
+            if batch:
+                self._batch = coordinator.batch
 
-        @callback
-        def _async_startup(*_):
-            """Init on startup."""
-            temperature_state = self.hass.states.get(self.temperature_entity_id)
-            if temperature_state and temperature_state.state not in (
-                STATE_UNAVAILABLE,
-                STATE_UNKNOWN,
-            ):
-                self._async_update_temp(temperature_state)
-                self.async_write_ha_state()
-            switch_state = self.hass.states.get(self.heater_entity_id)
-            if switch_state and switch_state.state not in (
-                STATE_UNAVAILABLE,
-                STATE_UNKNOWN,
-            ):
-                self.hass.create_task(self._check_switch_initial_state())
-
-        if self.hass.state == CoreState.running:
-            _async_startup()
-        else:
-            self.hass.bus.async_listen_once(EVENT_HOMEASSISTANT_START, _async_startup)
+        if proportional:
+            self.async_on_remove(
+                coordinator.async_track_interval(
+                    self._cycle_duration, self._async_start_cycle
+                )
+            )
+            self.async_on_remove(self._async_cancel_cycle_end)
+
+        self.async_on_remove(self._async_cancel_temp_flush)
+        self.async_on_remove(self._async_cancel_deferred_write)
+        self.async_on_remove(self._async_cancel_window_timeout)
+        if self._sensor_timeout:
+            self._sensor_last_update = dt_util.utcnow()
+            self.async_on_remove(coordinator.async_track_sensor_timeout(self))
+            self.async_on_remove(self._async_remove_safe_cycle)
+        self.async_on_remove(self._async_cancel_preheat)
+        self.async_on_remove(coordinator.async_track_startup(self))
+        if self._accounting is not None:
+            self.async_on_remove(coordinator.async_track_accounting(self._accounting))
 
         # Check If we have an old state
         old_state = await self.async_get_last_state()
         if old_state is not None:
+            extra_data = await self.async_get_last_extra_data()
+            extra_data = {} if extra_data is None else extra_data.as_dict()
             # If we have no initial temperature, restore
             if self._target_temp is None:
                 # If we have a previously saved temperature
@@ -338,6 +728,18 @@ class AwesomeThermostat(ClimateEntity, RestoreEntity):
                 self._attr_preset_mode = old_state.attributes.get(ATTR_PRESET_MODE)
             if not self._hvac_mode and old_state.state:
                 self._hvac_mode = old_state.state
+            pid_integral = extra_data.get(
+                ATTR_PID_INTEGRAL, old_state.attributes.get(ATTR_PID_INTEGRAL)
+            )
+            if self._pid is not None and pid_integral is not None:
+                self._pid.integral = float(pid_integral)
+            thermal_model = extra_data.get(
+                ATTR_THERMAL_MODEL, old_state.attributes.get(ATTR_THERMAL_MODEL)
+            )
+            if thermal_model:
+                self._thermal_model = ThermalModel(**thermal_model)
+            if self._accounting is not None and self._accounting.empty:
+                self._async_restore_accounting(old_state, extra_data)
 
         else:
             # No previous state, try and restore defaults
@@ -353,6 +755,72 @@ class AwesomeThermostat(ClimateEntity, RestoreEntity):
         # Set default state to off
         if not self._hvac_mode:
             self._hvac_mode = HVAC_MODE_OFF
+        self._async_update_batch()
+
+        if self._schedule is not None:
+            schedule = coordinator.async_get_schedule(self._schedule)
+            if schedule is None:
+                _LOGGER.error(
+                    "Unknown schedule %s for %s", self._schedule, self.entity_id
+                )
+            else:
+                self.async_on_remove(coordinator.async_track_schedule(schedule, self))
+                preset_mode = schedule.preset_at(dt_util.now())
+                if preset_mode is not None:
+                    await self._async_apply_schedule(preset_mode)
+
+    @callback
+    def _async_restore_accounting(self, old_state, extra_data):
+        """Restore the accounting, with its open phase, saved at the last stop.
+
+        The states saved without extra data only hold the totals, in their
+        attributes.
+        """
+        accounting = extra_data.get(CONF_ACCOUNTING)
+        if accounting is None and "runtime" in extra_data:
+            # Saved when the extra data only held the accounting
+            accounting = extra_data
+        if accounting is not None:
+            self._accounting.restore(**accounting)
+        elif old_state.attributes.get(ATTR_HEATER_RUNTIME) is not None:
+            self._accounting.restore(
+                float(old_state.attributes[ATTR_HEATER_RUNTIME]) * 3600,
+                int(old_state.attributes.get(ATTR_HEATER_CYCLES, 0)),
+            )
+
+    @property
+    def extra_restore_state_data(self):
+        """Return the accounting and the learned state to restore after a restart.
+
+        They are taken when the state is saved, so they are up to date even
+        though their changes alone do not write the state.
+        """
+        extra_data = {}
+        if self._accounting is not None:
+            extra_data[CONF_ACCOUNTING] = self._accounting.as_dict()
+        if self._pid is not None:
+            extra_data[ATTR_PID_INTEGRAL] = self._pid.integral
+        extra_data[ATTR_THERMAL_MODEL] = self._thermal_model.as_dict()
+        return RestoredExtraData(extra_data)
+
+    @callback
+    def _async_startup(self):
+        """Init on startup.
+
+        Called by the startup pass of the coordinator, which then checks the
+        initial state of the heaters of all the thermostats.
+        """
+        self._async_load_heater_states()
+        for temperature_entity_id in self.temperature_entity_ids:
+            temperature_state = self.hass.states.get(temperature_entity_id)
+            if temperature_state and temperature_state.state not in (
+                STATE_UNAVAILABLE,
+                STATE_UNKNOWN,
+            ):
+                self._async_update_sensor(temperature_state)
+        if self._async_update_temp():
+            self._async_update_batch()
+            self._async_write_state()
 
     @property
     def should_poll(self):
@@ -406,7 +874,7 @@ class AwesomeThermostat(ClimateEntity, RestoreEntity):
         """
         if self._hvac_mode == HVAC_MODE_OFF:
             return CURRENT_HVAC_OFF
-        if not self._is_device_active:
+        if not self._heater_active:
             return CURRENT_HVAC_IDLE
         if self.ac_mode:
             return CURRENT_HVAC_COOL
@@ -432,23 +900,27 @@ class AwesomeThermostat(ClimateEntity, RestoreEntity):
             await self._async_control_heating(force=True)
         elif hvac_mode == HVAC_MODE_OFF:
             self._hvac_mode = HVAC_MODE_OFF
+            self._async_update_batch()
+            self._async_cancel_cycle_end()
+            self._cycle_on = None
             if self._is_device_active:
                 await self._async_heater_turn_off()
         else:
             _LOGGER.error("Unrecognized hvac mode: %s", hvac_mode)
             return
         # Ensure we update the current operation after changing the mode
-        self.async_write_ha_state()
+        self._async_write_state()
 
     async def async_set_temperature(self, **kwargs):
         """Set new target temperature."""
         temperature = kwargs.get(ATTR_TEMPERATURE)
         if temperature is None:
             return
+        self._async_cancel_preheat()
         self._target_temp = temperature
         self._attr_preset_mode = PRESET_NONE
         await self._async_control_heating(force=True)
-        self.async_write_ha_state()
+        self._async_write_state()
 
     @property
     def min_temp(self):
@@ -470,16 +942,81 @@ class AwesomeThermostat(ClimateEntity, RestoreEntity):
 
     async def _async_temperature_changed(self, event):
         """Handle temperature changes."""
+        if self._stats is not None:
+            self._stats.count("temperature")
         new_state = event.data.get("new_state")
         if new_state is None or new_state.state in (STATE_UNAVAILABLE, STATE_UNKNOWN):
+            # Aggregate the other sensors only until it is back
+            self._sensors.discard(event.data["entity_id"])
             return
 
-        self._async_update_temp(new_state)
-        await self._async_control_heating()
-        self.async_write_ha_state()
+        self._sensor_events_received += 1
+        self._sensor_last_update = new_state.last_updated
+        old_state = event.data.get("old_state")
+        if old_state is not None and old_state.state == new_state.state:
+            # Only the attributes of the sensor changed
+            self._sensor_events_dropped += 1
+            return
+
+        if not self._async_update_sensor(new_state):
+            self._sensor_events_rejected += 1
+            return
+
+        if self._window_slope is not None:
+            await self._async_detect_window(new_state.last_updated)
+
+        if self._sensor_stale:
+            # The accepted reading ends the safe mode and is evaluated at once
+            self._async_cancel_temp_flush()
+            self._async_leave_safe_mode()
+            await self._async_apply_temperature(force=True)
+            return
+
+        if not self._sensor_debounce:
+            await self._async_apply_temperature()
+            return
+
+        # Coalesce the burst: the temperature is evaluated once per window
+        if self._cancel_temp_flush is not None:
+            self._sensor_events_coalesced += 1
+        else:
+            self._cancel_temp_flush = self._coordinator.async_schedule(
+                dt_util.utcnow() + self._sensor_debounce,
+                self._async_flush_temperature,
+            )
+
+    async def _async_flush_temperature(self, _):
+        """Apply the temperature at the end of the coalescing window."""
+        self._cancel_temp_flush = None
+        await self._async_apply_temperature()
+
+    @callback
+    def _async_cancel_temp_flush(self):
+        """Cancel the evaluation waiting for the end of the coalescing window."""
+        if self._cancel_temp_flush is not None:
+            self._cancel_temp_flush()
+            self._cancel_temp_flush = None
+
+    async def _async_apply_temperature(self, force=False):
+        """Update the temperature and run a control cycle if it moved enough.
+
+        A forced update runs a new control cycle whatever the change.
+        """
+        if not self._async_update_temp(0 if force else self._sensor_min_delta):
+            self._sensor_events_dropped += 1
+            return
+        self._thermal_model.add_sample(self._cur_temp, dt_util.utcnow().timestamp())
+        if self._pid is not None:
+            self._async_update_pid()
+        await self._async_control_heating(force=force)
+        if self._preheat is not None:
+            await self._async_check_preheat()
+        self._async_write_state()
 
     async def _async_windows_changed(self, event):
         """Handle window changes."""
+        if self._stats is not None:
+            self._stats.count("window")
         new_state = event.data.get("new_state")
         old_state = event.data.get("old_state")
         if new_state is None or old_state is None or new_state.state == old_state.state:
@@ -487,169 +1024,821 @@ class AwesomeThermostat(ClimateEntity, RestoreEntity):
         if not self._saved_hvac_mode:
             self._saved_hvac_mode = self._hvac_mode
         if new_state.state == STATE_OFF:
-            await self.async_set_hvac_mode(self._saved_hvac_mode)
+            await self._async_window_closed()
         elif new_state.state == STATE_ON:
-            self._saved_hvac_mode = self._hvac_mode
-            await self.async_set_hvac_mode(HVAC_MODE_OFF)
+            await self._async_window_opened()
         else:
             return
 
+    async def _async_window_opened(self):
+        """Turn the thermostat off, saving its hvac mode."""
+        self._saved_hvac_mode = self._hvac_mode
+        await self.async_set_hvac_mode(HVAC_MODE_OFF)
+
+    async def _async_window_closed(self):
+        """Restore the hvac mode saved when the window was opened."""
+        await self.async_set_hvac_mode(self._saved_hvac_mode)
+
+    async def _async_detect_window(self, when):
+        """Detect an open window from the slope of the temperature.
+
+        The window is considered open when the temperature falls faster than
+        the threshold, and closed again when it stops falling or after the
+        open window timeout.
+        """
+        self._window_slope.add(when.timestamp(), self._sensors.value)
+        slope = self._window_slope.slope
+        if (
+            slope is None
+            or self._window_slope.span < WINDOW_SLOPE_MIN_SPAN.total_seconds()
+        ):
+            return
+        slope *= 3600
+        if not self._window_open_detected:
+            if slope <= -self._window_slope_threshold and self._hvac_mode not in (
+                None,
+                HVAC_MODE_OFF,
+            ):
+                _LOGGER.info(
+                    "Open window detected by %s, the temperature falls by %.1f/h",
+                    self.entity_id,
+                    -slope,
+                )
+                self._window_open_detected = True
+                self._cancel_window_timeout = self._coordinator.async_schedule(
+                    dt_util.utcnow() + self._window_open_timeout,
+                    self._async_window_timeout,
+                )
+                await self._async_window_opened()
+        elif slope >= 0:
+            await self._async_close_detected_window()
+
+    async def _async_window_timeout(self, _):
+        """Consider the detected open window closed after the timeout."""
+        self._cancel_window_timeout = None
+        if self._window_open_detected:
+            await self._async_close_detected_window()
+
+    async def _async_close_detected_window(self):
+        """Resume after a window detected from the slope is closed."""
+        _LOGGER.info("Window closed for %s", self.entity_id)
+        self._async_cancel_window_timeout()
+        self._window_open_detected = False
+        # Do not detect the same drop again
+        self._window_slope.reset()
+        await self._async_window_closed()
+
+    @callback
+    def _async_cancel_window_timeout(self):
+        """Cancel the timeout of a detected open window."""
+        if self._cancel_window_timeout is not None:
+            self._cancel_window_timeout()
+            self._cancel_window_timeout = None
+
     async def _async_motion_changed(self, event):
-        """Handle motion changes."""
+        """Handle motion changes.
+
+        The motion is tracked as a state machine: motion, waiting for the
+        motion delay after the last motion, and no motion. Waiting uses a
+        single deadline on the shared timer, moved by each end of motion, and
+        the delay is measured from the time of the events.
+        """
+        if self._stats is not None:
+            self._stats.count("motion")
         if self._attr_preset_mode != PRESET_ACTIVITY:
             return
         new_state = event.data.get("new_state")
         if new_state is None or new_state.state not in (STATE_OFF, STATE_ON):
             return
 
-        if self.motion_delay:
-            if new_state.state == STATE_ON:
+        if new_state.state == STATE_ON:
+            self._async_cancel_no_motion()
+            self._motion_state = MOTION_STATE_MOTION
+            self._motion_off_since = None
+            if self._target_temp != self._presets[self.motion_mode]:
                 self._target_temp = self._presets[self.motion_mode]
                 await self._async_control_heating()
-                self.async_write_ha_state()
-            else:
+            self._async_write_state()
+        elif self._motion_state != MOTION_STATE_NO_MOTION:
+            if self._motion_off_since == new_state.last_changed:
+                # Only the attributes of the motion sensor changed
+                return
+            self._async_cancel_no_motion()
+            self._motion_state = MOTION_STATE_WAITING
+            self._motion_off_since = new_state.last_changed
+            self._motion_timers_scheduled += 1
+            self._cancel_no_motion = self._coordinator.async_schedule(
+                self._motion_off_since + self.motion_delay, self._async_no_motion
+            )
+            self._async_write_state()
 
-                async def try_no_motion_condition(_):
-                    if self._attr_preset_mode != PRESET_ACTIVITY:
-                        return
-                    try:
-                        long_enough = condition.state(
-                            self.hass,
-                            self.motion_entity_id,
-                            STATE_OFF,
-                            self.motion_delay,
-                        )
-                    except ConditionError:
-                        long_enough = False
-                    if long_enough:
-                        self._target_temp = self._presets[self.no_motion_mode]
-                        await self._async_control_heating()
-                        self.async_write_ha_state()
-
-                async_call_later(self.hass, self.motion_delay, try_no_motion_condition)
+    async def _async_no_motion(self, now):
+        """Apply the no motion preset once the motion delay is elapsed."""
+        self._cancel_no_motion = None
+        if (
+            self._attr_preset_mode != PRESET_ACTIVITY
+            or self._motion_state != MOTION_STATE_WAITING
+            or now - self._motion_off_since < self.motion_delay
+        ):
+            return
+        self._motion_state = MOTION_STATE_NO_MOTION
+        self._target_temp = self._presets[self.no_motion_mode]
+        await self._async_control_heating()
+        self._async_write_state()
+
+    @callback
+    def _async_cancel_no_motion(self):
+        """Cancel the deadline waiting for the end of the motion delay."""
+        if self._cancel_no_motion is not None:
+            self._cancel_no_motion()
+            self._cancel_no_motion = None
+            self._motion_timers_cancelled += 1
 
     async def _check_switch_initial_state(self):
         """Prevent the device from keep running if HVAC_MODE_OFF."""
         if self._hvac_mode == HVAC_MODE_OFF and self._is_device_active:
             _LOGGER.warning(
                 "The climate mode is OFF, but the switch device is ON. Turning off device %s",
-                self.heater_entity_id,
+                self.heater_entity_ids,
             )
             await self._async_heater_turn_off()
 
     @callback
     def _async_switch_changed(self, event):
         """Handle heater switch state changes."""
+        if self._stats is not None:
+            self._stats.count("switch")
         new_state = event.data.get("new_state")
         old_state = event.data.get("old_state")
         if new_state is None:
+            self._heater_states.pop(event.data["entity_id"], None)
+            self._async_update_heater_active(dt_util.utcnow())
             return
+        self._heater_states[new_state.entity_id] = self._actuator.is_active(new_state)
+        # The setpoint of a climate entity is an attribute, which does not
+        # move `last_changed`
+        self._async_update_heater_active(new_state.last_updated)
         if old_state is None:
             self.hass.create_task(self._check_switch_initial_state())
-        self.async_write_ha_state()
+        self._async_update_batch()
+        self._async_write_state()
 
     @callback
-    def _async_update_temp(self, state):
-        """Update thermostat with latest state from sensor."""
+    def _async_load_heater_states(self):
+        """Read the state of the heaters from the state machine.
+
+        This is only done at startup, the states are then tracked from the
+        state change events of the heaters.
+        """
+        states = [
+            state
+            for state in map(self.hass.states.get, self.heater_entity_ids)
+            if state is not None
+        ]
+        for state in states:
+            self._heater_states[state.entity_id] = self._actuator.is_active(state)
+        self._async_update_heater_active(None)
+        # The most recent change to the current state is the last transition
+        self._heater_last_switch = max(
+            (
+                state.last_changed
+                for state in states
+                if self._heater_states[state.entity_id] == self._heater_active
+            ),
+            default=None,
+        )
+
+    @callback
+    def _async_update_heater_active(self, when):
+        """Aggregate the state of the heaters and record the transitions."""
+        if not self._heater_states:
+            active = None
+        else:
+            active = any(self._heater_states.values())
+        if active != self._heater_active:
+            self._heater_active = active
+            self._heater_last_switch = when
+            if active and self._stats is not None:
+                self._stats.switch_cycles += 1
+            now = (when or dt_util.utcnow()).timestamp()
+            self._thermal_model.set_heating(active, now)
+            if self._accounting is not None:
+                # The heaters found on at startup do not start a cycle
+                self._accounting.set_heating(active, now, resumed=when is None)
+
+    @callback
+    def _async_update_sensor(self, state):
+        """Add the latest state of a sensor to the aggregated temperature.
+
+        Return False if the state is illegal or rejected as an outlier.
+        """
         try:
-            cur_temp = float(state.state)
-            if math.isnan(cur_temp) or math.isinf(cur_temp):
+            temperature = float(state.state)
+            if math.isnan(temperature) or math.isinf(temperature):
                 raise ValueError(f"Sensor has illegal state {state.state}")
-            self._cur_temp = cur_temp
         except ValueError as ex:
             _LOGGER.error("Unable to update from sensor: %s", ex)
+            return False
+        if not self._sensors.update(state.entity_id, temperature):
+            _LOGGER.debug(
+                "Rejecting the outlier %s of sensor %s", temperature, state.entity_id
+            )
+            return False
+        return True
+
+    @callback
+    def _async_update_temp(self, min_delta=0):
+        """Update thermostat with the aggregated temperature of the sensors.
+
+        Return False if there is no temperature or if it moved less than
+        `min_delta` from the current temperature.
+        """
+        cur_temp = self._sensors.value
+        if cur_temp is None:
+            return False
+        if self._cur_temp is not None and abs(cur_temp - self._cur_temp) < min_delta:
+            return False
+        self._cur_temp = cur_temp
+        return True
+
+    @callback
+    def _async_update_batch(self):
+        """Publish the control inputs to the batch evaluator."""
+        if self._batch is None:
+            return
+        cold_tolerance, hot_tolerance = self._tolerances()
+        self._batch.update(
+            self,
+            self._cur_temp,
+            self._target_temp,
+            cold_tolerance,
+            hot_tolerance,
+            self.ac_mode,
+            self._is_device_active,
+            self._hvac_mode != HVAC_MODE_OFF and not self._sensor_stale,
+        )
 
     async def _async_control_heating(self, time=None, force=False):
         """Check if we need to turn heating on or off."""
+        if time is None:
+            self._async_update_batch()
+        if self._stats is None:
+            async with self._temp_lock:
+                await self._async_evaluate(time, force)
+            return
+
+        if time is not None:
+            self._stats.count("keep_alive")
+        requested = perf_counter()
         async with self._temp_lock:
-            if not self._active and None not in (
+            acquired = perf_counter()
+            self._stats.lock_wait.record(acquired - requested)
+            await self._async_evaluate(time, force)
+            self._stats.decision.record(perf_counter() - acquired)
+
+    async def _async_evaluate(self, time, force):
+        """Decide the action on the heater. The lock must be held."""
+        if not self._active and None not in (
+            self._cur_temp,
+            self._target_temp,
+        ):
+            self._active = True
+            _LOGGER.info(
+                "Obtained current and target temperature. "
+                "Awesome thermostat active. %s, %s",
                 self._cur_temp,
                 self._target_temp,
-            ):
-                self._active = True
+            )
+
+        if self._sensor_stale and self._hvac_mode != HVAC_MODE_OFF:
+            await self._async_control_safe(time)
+            return
+
+        if not self._active or self._hvac_mode == HVAC_MODE_OFF:
+            return
+
+        if self._control_mode in CYCLE_CONTROL_MODES:
+            await self._async_control_proportional(time, force)
+            return
+
+        # If the `force` argument is True, we
+        # ignore `min_cycle_duration`.
+        # If the `time` argument is not none, we were invoked for
+        # keep-alive purposes, and `min_cycle_duration` is irrelevant.
+        device_active = self._is_device_active
+        cold_tolerance, hot_tolerance = self._tolerances()
+        action = compute_action(
+            self._cur_temp,
+            self._target_temp,
+            cold_tolerance,
+            hot_tolerance,
+            self.ac_mode,
+            device_active,
+            keep_alive=time is not None,
+            force=force,
+            since_last_switch=self._heater_time_since_last_switch(),
+            min_cycle_duration=self.min_cycle_duration,
+        )
+
+        if action == ACTION_TURN_ON:
+            if device_active:
+                _LOGGER.info(
+                    "Keep-alive - Turning on heater heater %s",
+                    self.heater_entity_ids,
+                )
+            else:
+                _LOGGER.info("Turning on heater %s", self.heater_entity_ids)
+            await self._async_heater_turn_on()
+        elif action == ACTION_TURN_OFF:
+            if device_active:
+                _LOGGER.info("Turning off heater %s", self.heater_entity_ids)
+            else:
+                _LOGGER.info(
+                    "Keep-alive - Turning off heater %s", self.heater_entity_ids
+                )
+            await self._async_heater_turn_off()
+        elif device_active and self._actuator.filtered:
+            # Follow the target temperature, the command is dropped unless
+            # the setpoint moves
+            await self._async_heater_turn_on()
+
+    async def _async_control_proportional(self, time, force):
+        """Control the heater in proportional mode. The lock must be held.
+
+        The heater is only switched at the start and at the end of the
+        on phase of each cycle. A forced evaluation starts a new cycle right
+        away and a keep-alive evaluation resends the state of the cycle.
+        """
+        if force or self._cycle_on is None:
+            await self._async_run_cycle(dt_util.utcnow())
+        elif time is not None:
+            if self._cycle_on:
+                _LOGGER.info(
+                    "Keep-alive - Turning on heater %s", self.heater_entity_ids
+                )
+                await self._async_heater_turn_on(self._on_ratio)
+            else:
                 _LOGGER.info(
-                    "Obtained current and target temperature. "
-                    "Awesome thermostat active. %s, %s",
-                    self._cur_temp,
-                    self._target_temp,
+                    "Keep-alive - Turning off heater %s", self.heater_entity_ids
                 )
+                await self._async_heater_turn_off()
 
-            if not self._active or self._hvac_mode == HVAC_MODE_OFF:
+    async def _async_start_cycle(self, now):
+        """Start a new cycle of the proportional mode."""
+        if self._stats is not None:
+            self._stats.count("cycle")
+        async with self._temp_lock:
+            if (
+                not self._active
+                or self._hvac_mode == HVAC_MODE_OFF
+                or self._sensor_stale
+            ):
                 return
+            await self._async_run_cycle(now)
+        self._async_write_state()
 
-            # If the `force` argument is True, we
-            # ignore `min_cycle_duration`.
-            # If the `time` argument is not none, we were invoked for
-            # keep-alive purposes, and `min_cycle_duration` is irrelevant.
-            if not force and time is None and self.min_cycle_duration:
-                if self._is_device_active:
-                    current_state = STATE_ON
-                else:
-                    current_state = HVAC_MODE_OFF
-                try:
-                    long_enough = condition.state(
-                        self.hass,
-                        self.heater_entity_id,
-                        current_state,
-                        self.min_cycle_duration,
-                    )
-                except ConditionError:
-                    long_enough = False
+    async def _async_run_cycle(self, now, on_ratio=None):
+        """Plan the cycle starting at `now`. The lock must be held.
 
-                if not long_enough:
-                    return
+        The on ratio of the cycle is computed by the control mode unless
+        `on_ratio` is given.
+        """
+        self._async_cancel_cycle_end()
+        if on_ratio is not None:
+            self._on_ratio = on_ratio
+        elif self._pid is not None:
+            self._on_ratio = self._async_update_pid()
+        else:
+            self._on_ratio = compute_on_ratio(
+                self._cur_temp,
+                self._target_temp,
+                self._proportional_gain,
+                self.ac_mode,
+                # Without the outdoor temperature to anticipate the losses,
+                # the heater runs a fixed share of the cycle at the target
+                self._feed_forward() if self._outdoor_gain else self._proportional_bias,
+            )
+        if self._actuator.proportional:
+            # Valves open in proportion to the on ratio instead of cycling
+            on_duration = self._cycle_duration if self._on_ratio > 0 else None
+        else:
+            on_duration = compute_on_duration(
+                self._on_ratio, self._cycle_duration, self.min_cycle_duration
+            )
+        self._cycle_on = bool(on_duration)
+        if self._cycle_on and on_duration < self._cycle_duration:
+            self._cancel_cycle_end = self._coordinator.async_schedule(
+                now + on_duration, self._async_end_cycle
+            )
+        _LOGGER.debug(
+            "New cycle for heater %s, on ratio %.2f",
+            self.heater_entity_ids,
+            self._on_ratio,
+        )
+        if self._cycle_on and (self._actuator.filtered or not self._is_device_active):
+            _LOGGER.info("Turning on heater %s", self.heater_entity_ids)
+            await self._async_heater_turn_on(self._on_ratio)
+        elif not self._cycle_on and self._is_device_active:
+            _LOGGER.info("Turning off heater %s", self.heater_entity_ids)
+            await self._async_heater_turn_off()
 
-            too_cold = self._target_temp >= self._cur_temp + self._cold_tolerance
-            too_hot = self._cur_temp >= self._target_temp + self._hot_tolerance
-            if self._is_device_active:
-                if (self.ac_mode and too_cold) or (not self.ac_mode and too_hot):
-                    _LOGGER.info("Turning off heater %s", self.heater_entity_id)
-                    await self._async_heater_turn_off()
-                elif time is not None:
-                    # The time argument is passed only in keep-alive case
-                    _LOGGER.info(
-                        "Keep-alive - Turning on heater heater %s",
-                        self.heater_entity_id,
-                    )
-                    await self._async_heater_turn_on()
-            else:
-                if (self.ac_mode and too_hot) or (not self.ac_mode and too_cold):
-                    _LOGGER.info("Turning on heater %s", self.heater_entity_id)
-                    await self._async_heater_turn_on()
-                elif time is not None:
-                    # The time argument is passed only in keep-alive case
-                    _LOGGER.info(
-                        "Keep-alive - Turning off heater %s", self.heater_entity_id
-                    )
-                    await self._async_heater_turn_off()
+    async def _async_end_cycle(self, _):
+        """End the on phase of the current cycle."""
+        self._cancel_cycle_end = None
+        async with self._temp_lock:
+            self._cycle_on = False
+            if self._hvac_mode != HVAC_MODE_OFF and self._is_device_active:
+                _LOGGER.info("Turning off heater %s", self.heater_entity_ids)
+                await self._async_heater_turn_off()
+
+    @callback
+    def _async_check_sensor(self, now):
+        """Enter the safe mode if the sensors did not report for too long.
+
+        Called by the shared sensor check of the coordinator. A sensor
+        reporting the same state again fires no state change, only the
+        `last_reported` of its state moves, so it is read here.
+        """
+        reported = self._async_reported_states()
+        if reported:
+            self._sensor_last_update = max(state.last_reported for state in reported)
+            if self._sensor_stale and any(
+                [self._async_update_sensor(state) for state in reported]
+            ):
+                # The reading reported again ends the safe mode
+                self._async_cancel_temp_flush()
+                self._async_leave_safe_mode()
+                self.hass.async_create_task(self._async_apply_temperature(force=True))
+            return
+        if self._sensor_stale:
+            if self._safe_temp is not None:
+                self.hass.async_create_task(self._async_update_safe_temp(now))
+        elif now - self._sensor_last_update > self._sensor_timeout:
+            self._sensor_stale = True
+            self.hass.async_create_task(self._async_enter_safe_mode())
+
+    @callback
+    def _async_reported_states(self):
+        """Return the states of the sensors reported again without a change.
+
+        Home Assistant versions without `last_reported` only tell about the
+        changes, and about the reports of the sensors with `force_update`.
+        """
+        return [
+            state
+            for state in map(self.hass.states.get, self.temperature_entity_ids)
+            if state is not None
+            and state.state not in (STATE_UNAVAILABLE, STATE_UNKNOWN)
+            and getattr(state, "last_reported", None) is not None
+            and state.last_reported > self._sensor_last_update
+        ]
+
+    def _fire_sensor_stale(self):
+        """Fire an event signaling the sensors became stale or came back."""
+        self.hass.bus.async_fire(
+            EVENT_SENSOR_STALE,
+            {
+                ATTR_ENTITY_ID: self.entity_id,
+                ATTR_SENSOR_STALE: self._sensor_stale,
+                ATTR_SENSOR_LAST_UPDATE: self._sensor_last_update.isoformat(),
+            },
+        )
+
+    async def _async_enter_safe_mode(self):
+        """Stop trusting the temperature and apply the safe mode."""
+        if not self._sensor_stale:
+            # A reading came back before the task started
+            return
+        _LOGGER.warning(
+            "No temperature received from %s since %s, applying the %s safe mode",
+            self.temperature_entity_ids,
+            self._sensor_last_update,
+            self._safe_mode,
+        )
+        self._fire_sensor_stale()
+        self._async_cancel_cycle_end()
+        self._cycle_on = None
+        if (
+            self._safe_mode == SAFE_MODE_FROST_PROTECTION
+            and not self.ac_mode
+            and self._thermal_model.ready
+            and self._cur_temp is not None
+        ):
+            # Estimate the temperature with the thermal model of the zone
+            self._safe_temp = self._cur_temp
+            self._safe_temp_time = self._sensor_last_update
+        elif self._safe_mode == SAFE_MODE_DUTY_CYCLE or (
+            # A cooler has nothing to protect from frost, it is kept off
+            self._safe_mode == SAFE_MODE_FROST_PROTECTION
+            and not self.ac_mode
+        ):
+            self._remove_safe_cycle = self._coordinator.async_track_interval(
+                self._cycle_duration, self._async_start_safe_cycle
+            )
+        await self._async_control_heating(force=True)
+        self._async_write_state()
+
+    @callback
+    def _async_leave_safe_mode(self):
+        """Resume the normal control when a sensor reading is accepted again.
+
+        The caller then evaluates the new reading.
+        """
+        _LOGGER.info(
+            "Temperature received again from %s, leaving the safe mode",
+            self.temperature_entity_ids,
+        )
+        self._sensor_stale = False
+        self._fire_sensor_stale()
+        self._async_remove_safe_cycle()
+        self._async_cancel_cycle_end()
+        self._cycle_on = None
+        self._safe_temp = None
+
+    @callback
+    def _async_remove_safe_cycle(self):
+        """Stop the cycles of the duty cycle safe mode."""
+        if self._remove_safe_cycle is not None:
+            self._remove_safe_cycle()
+            self._remove_safe_cycle = None
+
+    async def _async_start_safe_cycle(self, now):
+        """Start a new cycle of the duty cycle safe mode."""
+        async with self._temp_lock:
+            if not self._sensor_stale or self._hvac_mode == HVAC_MODE_OFF:
+                return
+            await self._async_run_cycle(now, self._safe_duty_cycle)
+        self._async_write_state()
+
+    async def _async_update_safe_temp(self, now):
+        """Update the estimated temperature and protect the zone from frost."""
+        self._safe_temp = self._thermal_model.predict(
+            self._safe_temp,
+            (now - self._safe_temp_time).total_seconds(),
+            1.0 if self._heater_active else 0.0,
+        )
+        self._safe_temp_time = now
+        await self._async_control_heating()
+
+    async def _async_control_safe(self, time):
+        """Control the heater while the sensors are stale. The lock must be held.
+
+        In frost protection, the estimated temperature is kept above the frost
+        protection temperature. With a duty cycle, the cycles are started by
+        their own timer and keep-alive resends the state of the cycle.
+        Otherwise the heater is kept off.
+        """
+        device_active = self._is_device_active
+        if self._safe_temp is not None:
+            action = compute_action(
+                self._safe_temp,
+                self._frost_protection_temp,
+                self._cold_tolerance,
+                self._hot_tolerance,
+                False,
+                device_active,
+                keep_alive=time is not None,
+                since_last_switch=self._heater_time_since_last_switch(),
+                min_cycle_duration=self.min_cycle_duration,
+            )
+        elif self._remove_safe_cycle is not None:
+            if self._cycle_on is None:
+                await self._async_run_cycle(dt_util.utcnow(), self._safe_duty_cycle)
+                return
+            if time is None:
+                return
+            action = ACTION_TURN_ON if self._cycle_on else ACTION_TURN_OFF
+        elif device_active or time is not None:
+            action = ACTION_TURN_OFF
+        else:
+            return
+
+        if action == ACTION_TURN_ON:
+            _LOGGER.info("Safe mode - Turning on heater %s", self.heater_entity_ids)
+            await self._async_heater_turn_on(
+                1.0 if self._safe_temp is not None else self._on_ratio
+            )
+        elif action == ACTION_TURN_OFF:
+            _LOGGER.info("Safe mode - Turning off heater %s", self.heater_entity_ids)
+            await self._async_heater_turn_off()
+
+    @callback
+    def _async_update_pid(self):
+        """Feed the PID regulator with the current sample."""
+        return self._pid.update(
+            self._cur_temp,
+            self._target_temp,
+            dt_util.utcnow().timestamp(),
+            self.ac_mode,
+            self._feed_forward(),
+        )
+
+    def _feed_forward(self):
+        """Return the on ratio compensating the losses to the outside."""
+        if not self._outdoor_gain:
+            return 0.0
+        return compute_feed_forward(
+            self._target_temp,
+            self._coordinator.outdoor_temp,
+            self._outdoor_gain,
+            self.ac_mode,
+        )
+
+    def _tolerances(self):
+        """Return the cold and hot tolerances of the hysteresis.
+
+        The feed-forward brings the turn-on threshold closer to the target,
+        so the heater starts earlier when the room loses heat faster.
+        """
+        feed_forward = self._feed_forward()
+        if self.ac_mode:
+            return self._cold_tolerance, self._hot_tolerance * (1 - feed_forward)
+        return self._cold_tolerance * (1 - feed_forward), self._hot_tolerance
+
+    @callback
+    def _async_cancel_cycle_end(self):
+        """Cancel the end of the on phase of the current cycle."""
+        if self._cancel_cycle_end is not None:
+            self._cancel_cycle_end()
+            self._cancel_cycle_end = None
+
+    def _heater_time_since_last_switch(self):
+        """Return how long the heaters have been in their current state."""
+        if self._heater_last_switch is None:
+            return None
+        return dt_util.utcnow() - self._heater_last_switch
 
     @property
     def _is_device_active(self):
-        """If the toggleable device is currently active."""
-        if not self.hass.states.get(self.heater_entity_id):
-            return None
+        """If one of the toggleable devices is currently active.
 
-        return self.hass.states.is_state(self.heater_entity_id, STATE_ON)
+        Heaters waiting for power are considered active, so they are turned
+        off, giving up their request, as if they were running.
+        """
+        if self._power is not None and self._power.is_waiting(self):
+            return True
+        return self._heater_active
+
+    @property
+    def extra_state_attributes(self):
+        """Return the counters and the control state of the thermostat."""
+        attributes = {
+            "sensor_events_received": self._sensor_events_received,
+            "sensor_events_dropped": self._sensor_events_dropped,
+            "sensor_events_coalesced": self._sensor_events_coalesced,
+            "sensor_events_rejected": self._sensor_events_rejected,
+            ATTR_STATE_WRITES: self._state_writes,
+            ATTR_STATE_WRITES_SKIPPED: self._state_writes_skipped,
+        }
+        if self._control_mode in CYCLE_CONTROL_MODES:
+            attributes["on_ratio"] = self._on_ratio
+        if self._pid is not None:
+            attributes[ATTR_PID_INTEGRAL] = self._pid.integral
+        if self._power is not None:
+            attributes[ATTR_POWER_WAITING] = self._power.is_waiting(self)
+        if self._sensor_timeout:
+            attributes[ATTR_SENSOR_STALE] = self._sensor_stale
+            attributes[ATTR_SENSOR_LAST_UPDATE] = self._sensor_last_update.isoformat()
+        if self._commands is not None:
+            attributes[ATTR_HEATER_BREAKER] = self._commands.breaker
+            attributes[ATTR_HEATER_FAILURES] = self._commands.failures
+            attributes[ATTR_HEATER_COMMANDS_SUPERSEDED] = self._commands.superseded
+            if self._actuator.heater_type != HEATER_TYPE_SWITCH:
+                attributes[ATTR_HEATER_COMMANDS_SKIPPED] = self._commands.skipped
+        if self._window_slope is not None:
+            attributes[ATTR_WINDOW_OPEN_DETECTED] = self._window_open_detected
+            slope = self._window_slope.slope
+            attributes[ATTR_TEMPERATURE_SLOPE] = (
+                None if slope is None else round(slope * 3600, 2)
+            )
+        if self.support_motion_control:
+            attributes[ATTR_MOTION_STATE] = self._motion_state
+            attributes[ATTR_MOTION_TIMERS_SCHEDULED] = self._motion_timers_scheduled
+            attributes[ATTR_MOTION_TIMERS_CANCELLED] = self._motion_timers_cancelled
+        attributes[ATTR_THERMAL_MODEL] = {
+            "coefficients": self._thermal_model.coefficients,
+            "samples": self._thermal_model.samples,
+        }
+        if self._preheat_start is not None:
+            attributes[ATTR_PREHEAT_START] = self._preheat_start.isoformat()
+        if self._accounting is not None:
+            attributes[ATTR_HEATER_RUNTIME] = round(self._accounting.runtime / 3600, 4)
+            attributes[ATTR_HEATER_CYCLES] = self._accounting.cycles
+            if self._accounting.energy is not None:
+                attributes[ATTR_HEATER_ENERGY] = round(self._accounting.energy, 4)
+        if self._outdoor_gain:
+            attributes[ATTR_FEED_FORWARD] = round(self._feed_forward(), 3)
+        if self._stats is not None:
+            attributes[ATTR_PERFORMANCE] = self._stats.as_dict()
+        return attributes
+
+    @callback
+    def _async_write_state(self):
+        """Write the state if a visible part of it changed.
+
+        The diagnostic attributes are only published along with a visible
+        change. With a temperature write interval, the changes of the current
+        temperature alone are written at most once per interval, the last one
+        being written at the end of the interval.
+        """
+        attributes = dict(self.state_attributes or {})
+        attributes.update(self.extra_state_attributes)
+        written = (
+            self.state,
+            {
+                key: value
+                for key, value in attributes.items()
+                if key not in DIAGNOSTIC_ATTRIBUTES
+            },
+        )
+        if written == self._last_written:
+            self._state_writes_skipped += 1
+            return
+        now = dt_util.utcnow()
+        if (
+            self._temperature_write_interval
+            and self._last_written is not None
+            and written[0] == self._last_written[0]
+            and {**written[1], ATTR_CURRENT_TEMPERATURE: None}
+            == {**self._last_written[1], ATTR_CURRENT_TEMPERATURE: None}
+        ):
+            next_write = self._last_write_time + self._temperature_write_interval
+            if now < next_write:
+                self._state_writes_skipped += 1
+                if self._cancel_deferred_write is None:
+                    self._cancel_deferred_write = self._coordinator.async_schedule(
+                        next_write, self._async_deferred_write
+                    )
+                return
+        self._async_cancel_deferred_write()
+        self._last_written = written
+        self._last_write_time = now
+        self._state_writes += 1
+        self.async_write_ha_state()
+
+    @callback
+    def _async_deferred_write(self, _):
+        """Write the temperature held back by the write interval."""
+        self._cancel_deferred_write = None
+        self._async_write_state()
+
+    @callback
+    def _async_cancel_deferred_write(self):
+        """Cancel the write of the temperature held back."""
+        if self._cancel_deferred_write is not None:
+            self._cancel_deferred_write()
+            self._cancel_deferred_write = None
 
     @property
     def supported_features(self):
         """Return the list of supported features."""
         return self._support_flags
 
-    async def _async_heater_turn_on(self):
-        """Turn heater toggleable device on."""
-        data = {ATTR_ENTITY_ID: self.heater_entity_id}
-        await self.hass.services.async_call(
-            HA_DOMAIN, SERVICE_TURN_ON, data, context=self._context
+    async def _async_heater_turn_on(self, on_ratio=1.0):
+        """Turn heater toggleable devices on with a single call.
+
+        The call is queued and does not wait for the heaters. Valves open by
+        `on_ratio`. With a power budget, the heaters are only turned on once
+        power is granted to them.
+        """
+        if self._power is not None and not self._power.async_request(self):
+            return
+        self._commands.async_set(
+            self._actuator.command(on_ratio, self._target_temp), self._context
+        )
+
+    @callback
+    def _async_power_changed(self, granted):
+        """Turn the heaters on or off as the power budget decided."""
+        self._commands.async_set(
+            self._actuator.command(1.0 if granted else 0.0, self._target_temp),
+            self._context,
         )
+        self._async_write_state()
 
     async def _async_heater_turn_off(self):
-        """Turn heater toggleable device off."""
-        data = {ATTR_ENTITY_ID: self.heater_entity_id}
-        await self.hass.services.async_call(
-            HA_DOMAIN, SERVICE_TURN_OFF, data, context=self._context
+        """Turn heater toggleable devices off with a single call.
+
+        The call is queued and does not wait for the heaters.
+        """
+        if self._power is not None:
+            self._power.async_release(self)
+        self._commands.async_set(
+            self._actuator.command(0.0, self._target_temp), self._context
         )
 
+    async def _async_apply_schedule(self, preset_mode):
+        """Switch to the preset of the current slot of the schedule."""
+        if preset_mode not in (self._attr_preset_modes or []):
+            _LOGGER.warning(
+                "The preset %s of the schedule of %s is not configured",
+                preset_mode,
+                self.entity_id,
+            )
+            return
+        _LOGGER.debug("Scheduled preset %s for %s", preset_mode, self.entity_id)
+        await self.async_set_preset_mode(preset_mode)
+
     async def async_set_preset_mode(self, preset_mode: str):
         """Set new preset mode."""
         if preset_mode not in (self._attr_preset_modes or []):
@@ -659,12 +1848,16 @@ class AwesomeThermostat(ClimateEntity, RestoreEntity):
         if preset_mode == self._attr_preset_mode:
             # I don't think we need to call async_write_ha_state if we didn't change the state
             return
+        self._async_cancel_preheat()
+        self._async_cancel_no_motion()
+        self._motion_state = None
         if preset_mode == PRESET_NONE:
             self._attr_preset_mode = PRESET_NONE
             self._target_temp = self._saved_target_temp
             await self._async_control_heating(force=True)
         elif preset_mode == PRESET_ACTIVITY:
             self._attr_preset_mode = PRESET_ACTIVITY
+            self._motion_state = MOTION_STATE_NO_MOTION
             self._target_temp = self._presets[self.no_motion_mode]
             await self._async_control_heating(force=True)
         else:
@@ -674,4 +1867,76 @@ class AwesomeThermostat(ClimateEntity, RestoreEntity):
             self._target_temp = self._presets[preset_mode]
             await self._async_control_heating(force=True)
 
-        self.async_write_ha_state()
\ No newline at end of file
+        self._async_write_state()
+
+    async def async_reach_temperature(self, time, temperature=None, preset_mode=None):
+        """Reach a temperature or the temperature of a preset at `time`.
+
+        The target is applied at the latest moment allowing to reach it in
+        time according to the thermal model of the zone, or right away when
+        the model does not know yet.
+        """
+        if preset_mode is not None and preset_mode not in self._attr_preset_modes:
+            raise ValueError(
+                f"Got unsupported preset_mode {preset_mode}. Must be one of {self._attr_preset_modes}"
+            )
+        self._async_cancel_preheat()
+        self._preheat = (dt_util.as_utc(time), temperature, preset_mode)
+        await self._async_check_preheat()
+        self._async_write_state()
+
+    async def _async_preheat_due(self, _):
+        """Check the pending pre-heating at its planned start."""
+        self._cancel_preheat = None
+        self._preheat_start = None
+        if self._preheat is not None:
+            await self._async_check_preheat()
+            self._async_write_state()
+
+    async def _async_check_preheat(self):
+        """Apply the pending target if it is time to heat, or plan it."""
+        time, temperature, preset_mode = self._preheat
+        if preset_mode == PRESET_NONE:
+            temperature = self._saved_target_temp
+        elif preset_mode == PRESET_ACTIVITY:
+            temperature = self._presets[self.no_motion_mode]
+        elif preset_mode is not None:
+            temperature = self._presets[preset_mode]
+        duration = None
+        if self._cur_temp is not None and temperature is not None:
+            duration = self._thermal_model.time_to_reach(
+                self._cur_temp, temperature, self.ac_mode
+            )
+        now = dt_util.utcnow()
+        if duration is not None:
+            start = time - timedelta(seconds=duration * (1 + PREHEAT_MARGIN))
+            if start > now:
+                if (
+                    self._preheat_start is None
+                    or abs(start - self._preheat_start) > PREHEAT_TOLERANCE
+                ):
+                    _LOGGER.debug(
+                        "Pre-heating of %s planned at %s", self.entity_id, start
+                    )
+                    if self._cancel_preheat is not None:
+                        self._cancel_preheat()
+                    self._preheat_start = start
+                    self._cancel_preheat = self._coordinator.async_schedule(
+                        start, self._async_preheat_due
+                    )
+                return
+        _LOGGER.info("Starting the pre-heating of %s", self.entity_id)
+        self._async_cancel_preheat()
+        if preset_mode is not None:
+            await self.async_set_preset_mode(preset_mode)
+        else:
+            await self.async_set_temperature(**{ATTR_TEMPERATURE: temperature})
+
+    @callback
+    def _async_cancel_preheat(self):
+        """Cancel the pending pre-heating."""
+        if self._cancel_preheat is not None:
+            self._cancel_preheat()
+            self._cancel_preheat = None
+        self._preheat = None
+        self._preheat_start = None
@@ -0,0 +1,186 @@
+"""Config flow of the awesome thermostat, one entry per zone."""
+import voluptuous as vol
+
+from homeassistant import config_entries
+from homeassistant.const import CONF_NAME, CONF_PLATFORM
+from homeassistant.core import callback
+from homeassistant.helpers import selector
+
+from . import DOMAIN
+from .actuator import HEATER_TYPE_CLIMATE, HEATER_TYPE_SWITCH, HEATER_TYPE_VALVE
+from .climate import (
+    CONF_ACCOUNTING,
+    CONF_ACTUATOR_STEP,
+    CONF_COLD_TOLERANCE,
+    CONF_CONTROL_MODE,
+    CONF_CYCLE_DURATION,
+    CONF_HEATER,
+    CONF_HEATER_POWER,
+    CONF_HEATER_TYPE,
+    CONF_HOT_TOLERANCE,
+    CONF_KEEP_ALIVE,
+    CONF_MAX_TEMP,
+    CONF_MIN_DUR,
+    CONF_MIN_TEMP,
+    CONF_OUTDOOR_GAIN,
+    CONF_PRESETS,
+    CONF_PROPORTIONAL_BIAS,
+    CONF_PROPORTIONAL_GAIN,
+    CONF_SENSOR,
+    CONF_TARGET_TEMP,
+    CONF_WINDOWS_SENSOR,
+    CONTROL_MODE_HYSTERESIS,
+    CONTROL_MODE_PID,
+    CONTROL_MODE_PROPORTIONAL,
+    DEFAULT_TOLERANCE,
+    ZONE_SCHEMA,
+)
+
+TEMPERATURE_SELECTOR = selector.selector(
+    {"number": {"min": -30, "max": 60, "step": 0.1, "mode": "box"}}
+)
+TOLERANCE_SELECTOR = selector.selector(
+    {"number": {"min": 0, "max": 5, "step": 0.1, "mode": "box"}}
+)
+DURATION_SELECTOR = selector.selector({"duration": {}})
+
+USER_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_NAME): selector.selector({"text": {}}),
+        vol.Required(CONF_HEATER): selector.selector(
+            {
+                "entity": {
+                    "domain": [
+                        "switch",
+                        "input_boolean",
+                        "number",
+                        "input_number",
+                        "climate",
+                    ],
+                    "multiple": True,
+                }
+            }
+        ),
+        vol.Required(CONF_HEATER_TYPE, default=HEATER_TYPE_SWITCH): selector.selector(
+            {
+                "select": {
+                    "options": [
+                        HEATER_TYPE_SWITCH,
+                        HEATER_TYPE_VALVE,
+                        HEATER_TYPE_CLIMATE,
+                    ]
+                }
+            }
+        ),
+        vol.Required(CONF_SENSOR): selector.selector(
+            {"entity": {"domain": ["sensor", "input_number"], "multiple": True}}
+        ),
+    }
+)
+
+# Settings which can be changed without recreating the zone, with their selector
+OPTIONS = {
+    CONF_TARGET_TEMP: TEMPERATURE_SELECTOR,
+    CONF_MIN_TEMP: TEMPERATURE_SELECTOR,
+    CONF_MAX_TEMP: TEMPERATURE_SELECTOR,
+    CONF_COLD_TOLERANCE: TOLERANCE_SELECTOR,
+    CONF_HOT_TOLERANCE: TOLERANCE_SELECTOR,
+    **{key: TEMPERATURE_SELECTOR for key in CONF_PRESETS.values()},
+    CONF_CONTROL_MODE: selector.selector(
+        {
+            "select": {
+                "options": [
+                    CONTROL_MODE_HYSTERESIS,
+                    CONTROL_MODE_PROPORTIONAL,
+                    CONTROL_MODE_PID,
+                ]
+            }
+        }
+    ),
+    CONF_PROPORTIONAL_GAIN: selector.selector(
+        {"number": {"min": 0, "max": 10, "step": 0.05, "mode": "box"}}
+    ),
+    CONF_PROPORTIONAL_BIAS: selector.selector(
+        {"number": {"min": 0, "max": 1, "step": 0.05, "mode": "box"}}
+    ),
+    CONF_CYCLE_DURATION: DURATION_SELECTOR,
+    CONF_MIN_DUR: DURATION_SELECTOR,
+    CONF_KEEP_ALIVE: DURATION_SELECTOR,
+    CONF_WINDOWS_SENSOR: selector.selector(
+        {"entity": {"domain": ["binary_sensor", "input_boolean"]}}
+    ),
+    CONF_OUTDOOR_GAIN: selector.selector(
+        {"number": {"min": 0, "max": 1, "step": 0.001, "mode": "box"}}
+    ),
+    CONF_HEATER_POWER: selector.selector(
+        {"number": {"min": 0, "max": 100000, "step": 10, "mode": "box"}}
+    ),
+    CONF_ACCOUNTING: selector.selector({"boolean": {}}),
+    CONF_ACTUATOR_STEP: selector.selector(
+        {"number": {"min": 0, "max": 50, "step": 0.1, "mode": "box"}}
+    ),
+}
+
+DEFAULT_OPTIONS = {
+    CONF_COLD_TOLERANCE: DEFAULT_TOLERANCE,
+    CONF_HOT_TOLERANCE: DEFAULT_TOLERANCE,
+    CONF_CONTROL_MODE: CONTROL_MODE_HYSTERESIS,
+}
+
+
+def options_schema(options):
+    """Return the schema of the options, suggesting their current values."""
+    return vol.Schema(
+        {
+            vol.Optional(
+                key, description={"suggested_value": options.get(key)}
+            ): option_selector
+            for key, option_selector in OPTIONS.items()
+        }
+    )
+
+
+class AwesomeThermostatConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
+    """Create the entry of a zone."""
+
+    VERSION = 1
+
+    async def async_step_user(self, user_input=None):
+        """Ask for the name, the heaters and the sensors of the zone."""
+        if user_input is None:
+            return self.async_show_form(step_id="user", data_schema=USER_SCHEMA)
+        return self.async_create_entry(
+            title=user_input[CONF_NAME], data=user_input, options=DEFAULT_OPTIONS
+        )
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        """Return the options flow of an entry."""
+        return AwesomeThermostatOptionsFlow(config_entry)
+
+
+class AwesomeThermostatOptionsFlow(config_entries.OptionsFlow):
+    """Change the settings of a zone, which then reloads on its own."""
+
+    def __init__(self, config_entry):
+        """Initialize the options flow."""
+        self.config_entry = config_entry
+
+    async def async_step_init(self, user_input=None):
+        """Edit the settings of the zone."""
+        errors = {}
+        if user_input is not None:
+            try:
+                ZONE_SCHEMA(
+                    {CONF_PLATFORM: DOMAIN, **self.config_entry.data, **user_input}
+                )
+            except vol.Invalid:
+                errors["base"] = "invalid_options"
+            else:
+                return self.async_create_entry(title="", data=user_input)
+        return self.async_show_form(
+            step_id="init",
+            data_schema=options_schema(user_input or self.config_entry.options),
+            errors=errors,
+        )
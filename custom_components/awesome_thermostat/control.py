@@ -0,0 +1,491 @@
+"""Control core of the awesome thermostat.
+
+This module is deliberately free of any Home Assistant import so the
+decision logic can be benchmarked, fuzzed or replayed without a running
+instance. The climate entity only gathers its inputs and applies the
+returned action. Durations may be timedeltas or numbers of seconds as long
+as all the durations given to a function have the same type.
+"""
+from collections import deque
+import math
+import statistics
+
+ACTION_NONE = "none"
+ACTION_TURN_ON = "turn_on"
+ACTION_TURN_OFF = "turn_off"
+
+AGGREGATION_MEAN = "mean"
+AGGREGATION_MEDIAN = "median"
+AGGREGATION_WEIGHTED = "weighted"
+
+# Bounds of the loss of a zone per hour, for time constants between an hour
+# and about six weeks
+MIN_LOSS = 0.001
+MAX_LOSS = 1.0
+# Bound of the heat rate of a zone, in degrees per hour
+MAX_HEAT_RATE = 20.0
+# Largest variance of the heat rate for which the model is trusted
+MAX_HEAT_RATE_VARIANCE = 1.0
+
+
+def compute_action(
+    cur_temp,
+    target_temp,
+    cold_tolerance,
+    hot_tolerance,
+    ac_mode,
+    device_active,
+    keep_alive=False,
+    force=False,
+    since_last_switch=None,
+    min_cycle_duration=None,
+):
+    """Return the action to apply to the heater for the given inputs.
+
+    When the time since the last switch is unknown the minimal cycle is
+    considered not elapsed. Keep-alive evaluations and forced evaluations
+    ignore the minimal cycle duration, and keep-alive evaluations always
+    resend the current state of the device.
+    """
+    if cur_temp is None or target_temp is None:
+        return ACTION_NONE
+
+    if not force and not keep_alive and min_cycle_duration:
+        if since_last_switch is None or since_last_switch <= min_cycle_duration:
+            return ACTION_NONE
+
+    too_cold = target_temp >= cur_temp + cold_tolerance
+    too_hot = cur_temp >= target_temp + hot_tolerance
+    if device_active:
+        if (ac_mode and too_cold) or (not ac_mode and too_hot):
+            return ACTION_TURN_OFF
+        if keep_alive:
+            return ACTION_TURN_ON
+    else:
+        if (ac_mode and too_hot) or (not ac_mode and too_cold):
+            return ACTION_TURN_ON
+        if keep_alive:
+            return ACTION_TURN_OFF
+    return ACTION_NONE
+
+
+def compute_feed_forward(target_temp, outdoor_temp, gain, ac_mode):
+    """Return the on ratio compensating the exchanges with the outside.
+
+    The losses of a room are proportional to the difference between its
+    target and the outdoor temperature, `gain` being the on ratio per degree
+    of difference. The ratio is clamped between 0 and 1, and is 0 when the
+    outdoor temperature is unknown.
+    """
+    if not gain or target_temp is None or outdoor_temp is None:
+        return 0.0
+    difference = outdoor_temp - target_temp if ac_mode else target_temp - outdoor_temp
+    return min(max(gain * difference, 0.0), 1.0)
+
+
+def compute_on_ratio(cur_temp, target_temp, gain, ac_mode, feed_forward=0.0):
+    """Return the share of a cycle during which the heater must be on.
+
+    The ratio is proportional to the distance to the target, `gain` being
+    the ratio per degree, plus the `feed_forward` ratio, and is clamped
+    between 0 and 1.
+    """
+    if cur_temp is None or target_temp is None:
+        return 0.0
+    error = cur_temp - target_temp if ac_mode else target_temp - cur_temp
+    return min(max(gain * error + feed_forward, 0.0), 1.0)
+
+
+def compute_on_duration(on_ratio, cycle_duration, min_cycle_duration=None):
+    """Return how long the heater must be on during a cycle.
+
+    With a `min_cycle_duration`, the on and off phases shorter than it are
+    dropped so the heater never switches more often than allowed.
+    """
+    on_duration = cycle_duration * on_ratio
+    if min_cycle_duration:
+        if on_duration < min_cycle_duration:
+            return cycle_duration * 0
+        if cycle_duration - on_duration < min_cycle_duration:
+            return cycle_duration
+    return on_duration
+
+
+class PIDController:
+    """PID regulator returning the on ratio of the heater.
+
+    The regulator is updated incrementally with each sample and keeps no
+    history: only the integral term and the previous measure are stored.
+    The derivative is computed on the measure so a change of the target does
+    not cause a kick, and the integral stops growing while the output is
+    saturated (anti-windup). Times are in seconds.
+    """
+
+    def __init__(self, kp, ki, kd, integral=0.0):
+        """Initialize the regulator."""
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.integral = integral
+        self.output = 0.0
+        self._last_temp = None
+        self._last_time = None
+
+    def update(self, cur_temp, target_temp, now, ac_mode=False, feed_forward=0.0):
+        """Add a sample taken at `now` and return the new on ratio.
+
+        The `feed_forward` ratio is added to the output, so the integral
+        only has to correct what it does not anticipate.
+        """
+        if cur_temp is None or target_temp is None:
+            return self.output
+        direction = -1.0 if ac_mode else 1.0
+        error = direction * (target_temp - cur_temp)
+        elapsed = 0.0 if self._last_time is None else now - self._last_time
+        derivative = 0.0
+        integral = self.integral
+        if elapsed > 0:
+            derivative = -direction * (cur_temp - self._last_temp) / elapsed
+            integral += error * elapsed
+        output = (
+            self.kp * error + self.ki * integral + self.kd * derivative + feed_forward
+        )
+        # Anti-windup: do not integrate further into the saturation
+        if not ((output > 1.0 and error > 0) or (output < 0.0 and error < 0)):
+            self.integral = integral
+        if self.ki:
+            self.integral = min(max(self.integral, 0.0), 1.0 / self.ki)
+        self.output = min(
+            max(
+                self.kp * error
+                + self.ki * self.integral
+                + self.kd * derivative
+                + feed_forward,
+                0.0,
+            ),
+            1.0,
+        )
+        self._last_temp = cur_temp
+        self._last_time = now
+        return self.output
+
+
+class ThermalModel:
+    """Thermal model of a zone learned online from its own history.
+
+    The temperature slope of the zone, in degrees per hour, is modelled as
+    `heat_rate * heating + loss * temperature + drift` where `heating` is the
+    share of the time the heater was on. `heat_rate` is negative for a cooler
+    and `loss` is negative for a zone losing heat to the outside. The
+    coefficients are fitted by recursive least squares with a forgetting
+    factor, so the memory is bounded whatever the length of the history and
+    the model follows the seasons.
+
+    Samples are the mean slopes between two temperatures at least
+    `min_interval` seconds apart, which filters the resolution of the
+    sensors. Times are in seconds.
+
+    The predictions clamp the coefficients to physical bounds, and the model
+    is only ready once the heat rate is well determined, which needs the
+    heater to have run during part of the history.
+    """
+
+    def __init__(
+        self,
+        coefficients=None,
+        samples=0,
+        covariance=None,
+        forgetting=0.998,
+        min_interval=300.0,
+        max_interval=4 * 3600.0,
+        min_samples=12,
+    ):
+        """Initialize the model, optionally from learned coefficients."""
+        self.coefficients = list(coefficients or (0.0, 0.0, 0.0))
+        self.samples = samples
+        self.forgetting = forgetting
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.min_samples = min_samples
+        if covariance is None:
+            # Restored coefficients are trusted less than a long history
+            scale = 1.0 if samples else 1000.0
+            covariance = [[scale * (i == j) for j in range(3)] for i in range(3)]
+        self._covariance = [list(row) for row in covariance]
+        self._heating = False
+        self._last_temp = None
+        self._last_time = None
+        self._last_heating_change = None
+        self._on_time = 0.0
+
+    @property
+    def ready(self):
+        """Return True if the model has seen enough samples to predict."""
+        return (
+            self.samples >= self.min_samples
+            and self._covariance[0][0] <= MAX_HEAT_RATE_VARIANCE
+        )
+
+    def as_dict(self):
+        """Return the learned state, as taken by the constructor."""
+        return {
+            "coefficients": self.coefficients,
+            "samples": self.samples,
+            "covariance": self._covariance,
+        }
+
+    def set_heating(self, heating, now):
+        """Record a transition of the heater at `now`."""
+        heating = bool(heating)
+        if heating == self._heating:
+            return
+        self._accumulate(now)
+        self._heating = heating
+
+    def _accumulate(self, now):
+        """Add the time the heater was on since the last change."""
+        if self._last_heating_change is not None and self._heating:
+            self._on_time += now - self._last_heating_change
+        self._last_heating_change = now
+
+    def add_sample(self, temperature, now):
+        """Add a temperature measured at `now` and update the model."""
+        if self._last_time is not None:
+            elapsed = now - self._last_time
+            if elapsed < self.min_interval:
+                return
+            if elapsed <= self.max_interval:
+                self._accumulate(now)
+                heating = min(self._on_time / elapsed, 1.0)
+                slope = 3600.0 * (temperature - self._last_temp) / elapsed
+                self._fit(
+                    (heating, (temperature + self._last_temp) / 2, 1.0),
+                    slope,
+                )
+        self._last_temp = temperature
+        self._last_time = now
+        self._last_heating_change = now
+        self._on_time = 0.0
+
+    def _fit(self, regressors, slope):
+        """Update the coefficients with one sample, by recursive least squares."""
+        covariance = self._covariance
+        gain = [sum(row[j] * regressors[j] for j in range(3)) for row in covariance]
+        denominator = self.forgetting + sum(regressors[i] * gain[i] for i in range(3))
+        gain = [value / denominator for value in gain]
+        error = slope - sum(
+            coefficient * regressor
+            for coefficient, regressor in zip(self.coefficients, regressors)
+        )
+        self.coefficients = [
+            coefficient + value * error
+            for coefficient, value in zip(self.coefficients, gain)
+        ]
+        # Do not forget while the covariance is already large: without
+        # excitation, forgetting would make it grow without bound.
+        forgetting = self.forgetting
+        if sum(covariance[i][i] for i in range(3)) > 1e6:
+            forgetting = 1.0
+        projected = [
+            sum(regressors[k] * covariance[k][j] for k in range(3)) for j in range(3)
+        ]
+        self._covariance = [
+            [(covariance[i][j] - gain[i] * projected[j]) / forgetting for j in range(3)]
+            for i in range(3)
+        ]
+        self.samples += 1
+
+    def time_to_reach(self, cur_temp, target_temp, ac_mode=False):
+        """Return the seconds needed to reach the target with the heater on.
+
+        Return 0 if the target is already reached and None if the model is
+        not ready or predicts the target can not be reached.
+        """
+        if (target_temp - cur_temp) * (-1 if ac_mode else 1) <= 0:
+            return 0.0
+        if not self.ready:
+            return None
+        heat_rate, loss, drift = self._bounded_coefficients(cur_temp)
+        # Exponential approach to the equilibrium temperature
+        equilibrium = -(heat_rate + drift) / loss
+        ratio = (target_temp - equilibrium) / (cur_temp - equilibrium)
+        if not 0 < ratio < 1:
+            return None
+        return 3600.0 * math.log(ratio) / loss
+
+    def predict(self, cur_temp, duration, heating):
+        """Return the temperature expected `duration` seconds from now.
+
+        `heating` is the share of the time the heater is on.
+        """
+        heat_rate, loss, drift = self._bounded_coefficients(cur_temp)
+        equilibrium = -(heat_rate * heating + drift) / loss
+        return equilibrium + (cur_temp - equilibrium) * math.exp(
+            loss * duration / 3600.0
+        )
+
+    def _bounded_coefficients(self, cur_temp):
+        """Return the coefficients clamped to physical bounds.
+
+        A clamped loss is made up by the drift, so the slope predicted at
+        `cur_temp`, close to the temperatures the model was fitted on, is
+        kept.
+        """
+        heat_rate, loss, drift = self.coefficients
+        heat_rate = min(max(heat_rate, -MAX_HEAT_RATE), MAX_HEAT_RATE)
+        bounded_loss = min(max(loss, -MAX_LOSS), -MIN_LOSS)
+        return heat_rate, bounded_loss, drift + (loss - bounded_loss) * cur_temp
+
+
+def allocate_power(requests, budget):
+    """Return the keys of the requests granted within the power `budget`.
+
+    `requests` is an iterable of `(key, power, priority)`. The requests are
+    granted by decreasing priority, skipping the ones which do not fit in
+    what remains of the budget.
+    """
+    granted = []
+    for key, power, _ in sorted(requests, key=lambda request: -request[2]):
+        if power <= budget:
+            granted.append(key)
+            budget -= power
+    return granted
+
+
+class SensorAggregator:
+    """Robust temperature of a zone measured by several sensors.
+
+    The last `window` readings of each sensor are kept in a ring buffer. With
+    an `outlier_threshold`, a reading farther than it from the median of the
+    buffer of its sensor is rejected as a glitch; it is still buffered so a
+    real step of the temperature is accepted once confirmed by the following
+    readings. With three sensors or more, the sensors farther than the
+    threshold from the median of all the sensors are also left out of the
+    aggregate.
+    """
+
+    def __init__(self, method=AGGREGATION_MEAN, window=5, outlier_threshold=None):
+        """Initialize the aggregator."""
+        self.method = method
+        self.window = window
+        self.outlier_threshold = outlier_threshold
+        self.weights = {}
+        self._readings = {}
+        self._values = {}
+
+    def update(self, sensor, value):
+        """Add a reading of `sensor`. Return False if it is rejected."""
+        readings = self._readings.get(sensor)
+        if readings is None:
+            readings = self._readings[sensor] = deque(maxlen=self.window)
+        accepted = (
+            self.outlier_threshold is None
+            or len(readings) < 3
+            or abs(value - statistics.median(readings)) <= self.outlier_threshold
+        )
+        readings.append(value)
+        if accepted:
+            self._values[sensor] = value
+        return accepted
+
+    def discard(self, sensor):
+        """Forget `sensor` until its next reading, it is unavailable."""
+        self._readings.pop(sensor, None)
+        self._values.pop(sensor, None)
+
+    @property
+    def value(self):
+        """Return the aggregated temperature, or None without reading."""
+        values = self._values
+        if not values:
+            return None
+        if self.outlier_threshold is not None and len(values) >= 3:
+            median = statistics.median(values.values())
+            kept = {
+                sensor: value
+                for sensor, value in values.items()
+                if abs(value - median) <= self.outlier_threshold
+            }
+            if not kept:
+                # The readings are split in two groups both too far from the
+                # median: keep the ones closest to it.
+                closest = min(abs(value - median) for value in values.values())
+                kept = {
+                    sensor: value
+                    for sensor, value in values.items()
+                    if abs(value - median) == closest
+                }
+            values = kept
+        if self.method == AGGREGATION_MEDIAN:
+            return statistics.median(values.values())
+        if self.method == AGGREGATION_WEIGHTED:
+            weights = {sensor: self.weights.get(sensor, 1.0) for sensor in values}
+            total = sum(weights.values())
+            if total > 0:
+                return (
+                    sum(value * weights[sensor] for sensor, value in values.items())
+                    / total
+                )
+        return sum(values.values()) / len(values)
+
+
+class SlopeEstimator:
+    """Least squares slope of the last `size` samples of a signal.
+
+    The means and co-moments of the window are updated when a sample enters
+    and when the oldest one leaves, so each sample costs O(1) whatever the
+    size of the window.
+    """
+
+    def __init__(self, size):
+        """Initialize the estimator."""
+        self._samples = deque(maxlen=size)
+        self.reset()
+
+    def reset(self):
+        """Forget all the samples."""
+        self._samples.clear()
+        self._origin = None
+        self._mean_time = 0.0
+        self._mean_value = 0.0
+        self._time_variance = 0.0
+        self._covariance = 0.0
+
+    def add(self, time, value):
+        """Add the sample `value` measured at `time`."""
+        if self._origin is None:
+            self._origin = time
+        time -= self._origin
+        if len(self._samples) == self._samples.maxlen:
+            self._remove(*self._samples[0])
+        self._samples.append((time, value))
+        count = len(self._samples)
+        delta = time - self._mean_time
+        self._mean_time += delta / count
+        self._mean_value += (value - self._mean_value) / count
+        self._time_variance += delta * (time - self._mean_time)
+        self._covariance += delta * (value - self._mean_value)
+
+    def _remove(self, time, value):
+        """Remove the contribution of a sample leaving the window."""
+        count = len(self._samples) - 1
+        mean_value = self._mean_value
+        mean_time = self._mean_time
+        self._mean_time = (mean_time * (count + 1) - time) / count
+        self._mean_value = (mean_value * (count + 1) - value) / count
+        self._time_variance -= (time - self._mean_time) * (time - mean_time)
+        self._covariance -= (time - self._mean_time) * (value - mean_value)
+
+    @property
+    def span(self):
+        """Return the time between the oldest and the newest samples."""
+        if not self._samples:
+            return 0
+        return self._samples[-1][0] - self._samples[0][0]
+
+    @property
+    def slope(self):
+        """Return the slope of the window, or None with less than 2 samples."""
+        if len(self._samples) < 2 or self._time_variance <= 0:
+            return None
+        return self._covariance / self._time_variance
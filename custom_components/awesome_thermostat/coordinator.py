@@ -0,0 +1,520 @@
+"""Coordinator shared by all the awesome thermostats of an instance."""
+import asyncio
+from datetime import timedelta
+from functools import partial
+import heapq
+import itertools
+import logging
+import math
+
+from homeassistant.const import EVENT_HOMEASSISTANT_START, EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import CoreState, HassJob, callback
+from homeassistant.helpers.event import (
+    async_track_point_in_utc_time,
+    async_track_state_change_event,
+)
+import homeassistant.util.dt as dt_util
+
+from . import (
+    CONF_BATCH_MODE,
+    CONF_DAYS,
+    CONF_INSTRUMENTATION,
+    CONF_OUTDOOR_SENSOR,
+    CONF_POWER_BUDGET,
+    CONF_POWER_SLOT,
+    CONF_PRESET,
+    CONF_SCHEDULES,
+    CONF_TIME,
+    DATA_CONFIG,
+    DOMAIN,
+    DOMAIN_SCHEMA,
+)
+from .power import PowerScheduler
+from .schedule import WeeklySchedule
+
+_LOGGER = logging.getLogger(__name__)
+
+DATA_COORDINATOR = "coordinator"
+
+# Period of the check of the sensors of all the thermostats
+SENSOR_CHECK_INTERVAL = timedelta(minutes=1)
+# Period of the flush of the open heating phases into the accountings
+ACCOUNTING_FLUSH_INTERVAL = timedelta(minutes=1)
+
+
+@callback
+def async_get_coordinator(hass):
+    """Return the coordinator of the platform, creating it if needed."""
+    data = hass.data.setdefault(DOMAIN, {})
+    coordinator = data.get(DATA_COORDINATOR)
+    if coordinator is None:
+        coordinator = data[DATA_COORDINATOR] = AwesomeThermostatCoordinator(hass)
+    return coordinator
+
+
+def build_schedule(slots):
+    """Return the timeline of validated schedule slots."""
+    return WeeklySchedule(
+        (slot[CONF_DAYS], slot[CONF_TIME], slot[CONF_PRESET]) for slot in slots
+    )
+
+
+class AwesomeThermostatCoordinator:
+    """Own the timers and state subscriptions of every awesome thermostat.
+
+    All the watched entities (heaters, sensors, windows, motions) share one
+    state change subscription and events are dispatched to the interested
+    thermostats. All the deadlines share one timer armed on the earliest
+    one, and thermostats with the same keep-alive interval are evaluated in
+    a single pass. In batch mode this pass is vectorized and the resulting
+    commands go through the queue of each thermostat. With a power budget,
+    the heaters with a rated power are switched on by the power scheduler.
+    With the instrumentation, each thermostat measures its control path.
+    The thermostats following the same weekly schedule share the deadline of
+    its next transition, and the outdoor temperature comes from a single
+    subscription. The open heating phases of all the accountings are flushed
+    in one pass every minute and at stop.
+    """
+
+    def __init__(self, hass):
+        """Initialize the coordinator."""
+        self.hass = hass
+        config = hass.data[DOMAIN].get(DATA_CONFIG) or DOMAIN_SCHEMA({})
+        self.batch = None
+        if config[CONF_BATCH_MODE]:
+            # numpy is only needed by the batch mode.
+            from .batch import BatchEvaluator  # pylint: disable=import-outside-toplevel
+
+            self.batch = BatchEvaluator()
+        self.instrumentation = config[CONF_INSTRUMENTATION]
+        self.power = None
+        if config.get(CONF_POWER_BUDGET) is not None:
+            self.power = PowerScheduler(
+                hass, self, config[CONF_POWER_BUDGET], config[CONF_POWER_SLOT]
+            )
+        self._state_jobs = {}
+        self._unsub_state = None
+        self._resubscribe_scheduled = False
+        self._deadlines = []
+        self._sequence = itertools.count()
+        self._unsub_timer = None
+        self._timer_deadline = None
+        self._interval_groups = {}
+        self._keep_alive_groups = {}
+        self._sensor_watch = []
+        self._remove_sensor_check = None
+        self._accountings = []
+        self._remove_accounting_flush = None
+        self._flush_at_stop = False
+        self._starting = []
+        self._startup_scheduled = False
+        self.schedules = {
+            name: build_schedule(slots)
+            for name, slots in config[CONF_SCHEDULES].items()
+        }
+        self._schedule_groups = {}
+        self.outdoor_temp = None
+        outdoor_entity_id = config.get(CONF_OUTDOOR_SENSOR)
+        if outdoor_entity_id is not None:
+            self._async_update_outdoor(hass.states.get(outdoor_entity_id))
+            self.async_track_entities([outdoor_entity_id], self._async_outdoor_changed)
+
+    @callback
+    def async_track_entities(self, entity_ids, action):
+        """Dispatch the state changes of `entity_ids` to `action`.
+
+        Return a callback removing the listener.
+        """
+        job = HassJob(action)
+        entity_ids = list(entity_ids)
+        for entity_id in entity_ids:
+            self._state_jobs.setdefault(entity_id, []).append(job)
+        self._async_schedule_resubscribe()
+
+        @callback
+        def _async_remove():
+            for entity_id in entity_ids:
+                jobs = self._state_jobs.get(entity_id)
+                if jobs is None:
+                    continue
+                jobs.remove(job)
+                if not jobs:
+                    del self._state_jobs[entity_id]
+            self._async_schedule_resubscribe()
+
+        return _async_remove
+
+    @callback
+    def _async_schedule_resubscribe(self):
+        """Rebuild the state subscription once the current changes are done."""
+        if self._resubscribe_scheduled:
+            return
+        self._resubscribe_scheduled = True
+        self.hass.loop.call_soon(self._async_resubscribe)
+
+    @callback
+    def _async_resubscribe(self):
+        """Subscribe to the state changes of every watched entity."""
+        self._resubscribe_scheduled = False
+        if self._unsub_state is not None:
+            self._unsub_state()
+            self._unsub_state = None
+        if self._state_jobs:
+            self._unsub_state = async_track_state_change_event(
+                self.hass, list(self._state_jobs), self._async_state_changed
+            )
+
+    @callback
+    def _async_state_changed(self, event):
+        """Dispatch a state change to the interested thermostats."""
+        for job in tuple(self._state_jobs.get(event.data["entity_id"], ())):
+            self.hass.async_run_hass_job(job, event)
+
+    @callback
+    def async_schedule(self, when, action):
+        """Call `action(now)` at the utc datetime `when`.
+
+        `action` must be a coroutine function or a callback. Return a
+        callback cancelling the call.
+        """
+        entry = [when, next(self._sequence), HassJob(action)]
+        heapq.heappush(self._deadlines, entry)
+        self._async_arm_timer()
+
+        @callback
+        def _async_cancel():
+            entry[2] = None
+
+        return _async_cancel
+
+    @callback
+    def _async_arm_timer(self):
+        """Arm the shared timer on the earliest pending deadline."""
+        while self._deadlines and self._deadlines[0][2] is None:
+            heapq.heappop(self._deadlines)
+        deadline = self._deadlines[0][0] if self._deadlines else None
+        if deadline == self._timer_deadline:
+            return
+        if self._unsub_timer is not None:
+            self._unsub_timer()
+            self._unsub_timer = None
+        self._timer_deadline = deadline
+        if deadline is not None:
+            self._unsub_timer = async_track_point_in_utc_time(
+                self.hass, self._async_timer_fired, deadline
+            )
+
+    @callback
+    def _async_timer_fired(self, now):
+        """Run every deadline which is due."""
+        self._unsub_timer = None
+        self._timer_deadline = None
+        now = max(now, dt_util.utcnow())
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, _, job = heapq.heappop(self._deadlines)
+            if job is not None:
+                self.hass.async_run_hass_job(job, now)
+        self._async_arm_timer()
+
+    @callback
+    def async_track_interval(self, interval, action):
+        """Call `action(now)` every `interval`.
+
+        The actions sharing the same interval are aligned and run in the same
+        pass. `action` must be a coroutine function or a callback. Return a
+        callback removing the action.
+        """
+        group = self._interval_groups.get(interval)
+        if group is None:
+            group = self._interval_groups[interval] = {
+                "jobs": [],
+                "cancel": self.async_schedule(
+                    dt_util.utcnow() + interval,
+                    partial(self._async_interval_elapsed, interval),
+                ),
+            }
+        job = HassJob(action)
+        group["jobs"].append(job)
+
+        @callback
+        def _async_remove():
+            group["jobs"].remove(job)
+            if not group["jobs"]:
+                group["cancel"]()
+                del self._interval_groups[interval]
+
+        return _async_remove
+
+    @callback
+    def _async_interval_elapsed(self, interval, now):
+        """Run all the actions of an interval group."""
+        group = self._interval_groups.get(interval)
+        if group is None:
+            return
+        group["cancel"] = self.async_schedule(
+            now + interval, partial(self._async_interval_elapsed, interval)
+        )
+        for job in tuple(group["jobs"]):
+            self.hass.async_run_hass_job(job, now)
+
+    @callback
+    def async_track_keep_alive(self, thermostat, interval, batch=False):
+        """Evaluate `thermostat` every `interval` for keep-alive purposes.
+
+        With `batch`, the thermostat is evaluated by the batch evaluator when
+        the batch mode is enabled. Return a callback removing the thermostat
+        from its group.
+        """
+        batch = batch and self.batch is not None
+        group = self._keep_alive_groups.get(interval)
+        if group is None:
+            group = self._keep_alive_groups[interval] = {
+                "thermostats": [],
+                "batch": [],
+                "slots": None,
+            }
+            group["remove"] = self.async_track_interval(
+                interval, partial(self._async_keep_alive, group)
+            )
+        members = group["batch"] if batch else group["thermostats"]
+        members.append(thermostat)
+        if batch:
+            self.batch.add(thermostat)
+            group["slots"] = None
+
+        @callback
+        def _async_remove():
+            members.remove(thermostat)
+            if batch:
+                self.batch.remove(thermostat)
+                group["slots"] = None
+            if not group["thermostats"] and not group["batch"]:
+                group["remove"]()
+                del self._keep_alive_groups[interval]
+
+        return _async_remove
+
+    async def _async_keep_alive(self, group, now):
+        """Evaluate in one pass all the thermostats of a keep-alive group.
+
+        The batched thermostats in safe mode are left out of the batch, they
+        resend the command of their safe mode on their own.
+        """
+        await asyncio.gather(
+            self._async_batch_keep_alive(group),
+            *(
+                thermostat._async_control_heating(time=now)
+                for thermostat in tuple(group["thermostats"])
+            ),
+            *(
+                thermostat._async_control_heating(time=now)
+                for thermostat in tuple(group["batch"])
+                if thermostat._sensor_stale
+            ),
+        )
+
+    async def _async_batch_keep_alive(self, group):
+        """Evaluate the batched thermostats of a keep-alive group.
+
+        The commands go through the queue of each thermostat, like the other
+        commands, to share its retries and breaker.
+        """
+        if not group["batch"]:
+            return
+        if group["slots"] is None:
+            group["slots"] = self.batch.slots(group["batch"])
+        turn_on, turn_off = self.batch.evaluate_keep_alive(group["slots"])
+        if len(turn_on):
+            _LOGGER.info("Keep-alive - Turning on %d thermostats", len(turn_on))
+        if len(turn_off):
+            _LOGGER.info("Keep-alive - Turning off %d thermostats", len(turn_off))
+        await asyncio.gather(
+            *(self.batch.thermostat(slot)._async_heater_turn_on() for slot in turn_on),
+            *(
+                self.batch.thermostat(slot)._async_heater_turn_off()
+                for slot in turn_off
+            ),
+        )
+
+    @callback
+    def async_track_sensor_timeout(self, thermostat):
+        """Check the sensors of `thermostat` with the shared sensor check.
+
+        Return a callback removing the thermostat from the check.
+        """
+        self._sensor_watch.append(thermostat)
+        if self._remove_sensor_check is None:
+            self._remove_sensor_check = self.async_track_interval(
+                SENSOR_CHECK_INTERVAL, self._async_check_sensors
+            )
+
+        @callback
+        def _async_remove():
+            self._sensor_watch.remove(thermostat)
+            if not self._sensor_watch:
+                self._remove_sensor_check()
+                self._remove_sensor_check = None
+
+        return _async_remove
+
+    @callback
+    def async_track_accounting(self, accounting):
+        """Flush the open heating phase of `accounting` every minute and at stop.
+
+        Return a callback removing the accounting from the flush.
+        """
+        self._accountings.append(accounting)
+        if self._remove_accounting_flush is None:
+            self._remove_accounting_flush = self.async_track_interval(
+                ACCOUNTING_FLUSH_INTERVAL, self._async_flush_accountings
+            )
+        if not self._flush_at_stop:
+            self._flush_at_stop = True
+            self.hass.bus.async_listen_once(
+                EVENT_HOMEASSISTANT_STOP, self._async_flush_at_stop
+            )
+
+        @callback
+        def _async_remove():
+            accounting.flush(dt_util.utcnow().timestamp())
+            self._accountings.remove(accounting)
+            if not self._accountings:
+                self._remove_accounting_flush()
+                self._remove_accounting_flush = None
+
+        return _async_remove
+
+    @callback
+    def _async_flush_accountings(self, now):
+        """Add the open heating phases to the runtime of the accountings."""
+        for accounting in tuple(self._accountings):
+            accounting.flush(now.timestamp())
+
+    @callback
+    def _async_flush_at_stop(self, _):
+        """Flush the open heating phases when Home Assistant stops."""
+        self._async_flush_accountings(dt_util.utcnow())
+
+    @callback
+    def _async_outdoor_changed(self, event):
+        """Keep the outdoor temperature read by all the thermostats."""
+        self._async_update_outdoor(event.data.get("new_state"))
+
+    @callback
+    def _async_update_outdoor(self, state):
+        """Read the outdoor temperature from the state of its sensor."""
+        try:
+            temperature = float(state.state)
+        except (AttributeError, ValueError):
+            temperature = math.nan
+        outdoor_temp = temperature if math.isfinite(temperature) else None
+        if outdoor_temp == self.outdoor_temp:
+            return
+        self.outdoor_temp = outdoor_temp
+        if self.batch is not None:
+            # The feed-forward moves the tolerances held by the batch slots
+            for thermostat in self.batch.thermostats():
+                thermostat._async_update_batch()
+
+    @callback
+    def async_get_schedule(self, schedule):
+        """Return the shared schedule named `schedule`, or the one of its slots.
+
+        Return None for an unknown name.
+        """
+        if isinstance(schedule, str):
+            return self.schedules.get(schedule)
+        return build_schedule(schedule)
+
+    @callback
+    def async_track_schedule(self, schedule, thermostat):
+        """Apply the transitions of `schedule` to `thermostat`.
+
+        Only the next transition of each schedule is armed, on the shared
+        timer. Return a callback removing the thermostat from the schedule.
+        """
+        group = self._schedule_groups.get(schedule)
+        if group is None:
+            group = self._schedule_groups[schedule] = {
+                "thermostats": [],
+                "cancel": None,
+            }
+            self._async_arm_schedule(schedule, group, dt_util.now())
+        group["thermostats"].append(thermostat)
+
+        @callback
+        def _async_remove():
+            group["thermostats"].remove(thermostat)
+            if not group["thermostats"]:
+                if group["cancel"] is not None:
+                    group["cancel"]()
+                del self._schedule_groups[schedule]
+
+        return _async_remove
+
+    @callback
+    def _async_arm_schedule(self, schedule, group, now):
+        """Arm the first transition of `schedule` after the local `now`."""
+        transition = schedule.next_transition(now)
+        if transition is None:
+            return
+        when, preset = transition
+        group["cancel"] = self.async_schedule(
+            dt_util.as_utc(when),
+            partial(self._async_schedule_transition, schedule, group, when, preset),
+        )
+
+    async def _async_schedule_transition(self, schedule, group, when, preset, _):
+        """Switch the thermostats of a schedule to the preset of a transition."""
+        self._async_arm_schedule(schedule, group, when)
+        await asyncio.gather(
+            *(
+                thermostat._async_apply_schedule(preset)
+                for thermostat in tuple(group["thermostats"])
+            )
+        )
+
+    @callback
+    def async_track_startup(self, thermostat):
+        """Start `thermostat` in the next startup pass.
+
+        The pass runs once Home Assistant is started, or right away if it
+        already is, for all the thermostats added in the meantime. Return a
+        callback removing the thermostat from the pass.
+        """
+        self._starting.append(thermostat)
+        if not self._startup_scheduled:
+            self._startup_scheduled = True
+            if self.hass.state == CoreState.running:
+                self.hass.async_create_task(self._async_startup())
+            else:
+                self.hass.bus.async_listen_once(
+                    EVENT_HOMEASSISTANT_START, self._async_startup
+                )
+
+        @callback
+        def _async_remove():
+            if thermostat in self._starting:
+                self._starting.remove(thermostat)
+
+        return _async_remove
+
+    async def _async_startup(self, _=None):
+        """Load the states of all the thermostats waiting for the startup.
+
+        The heaters found on while their thermostat is off are then turned off
+        in the same pass.
+        """
+        thermostats, self._starting = self._starting, []
+        self._startup_scheduled = False
+        for thermostat in thermostats:
+            thermostat._async_startup()
+        await asyncio.gather(
+            *(thermostat._check_switch_initial_state() for thermostat in thermostats)
+        )
+
+    @callback
+    def _async_check_sensors(self, now):
+        """Check in one pass whether the sensors of the thermostats are stale."""
+        for thermostat in tuple(self._sensor_watch):
+            thermostat._async_check_sensor(now)
@@ -0,0 +1,114 @@
+"""Performance instrumentation of the control path of an awesome thermostat.
+
+Nothing in this module depends on Home Assistant. The statistics are only
+allocated when the instrumentation is enabled, so the control path only pays
+for a check of `None` when it is not.
+"""
+import bisect
+import time
+
+# Upper bounds of the latency buckets in seconds, the last bucket is open
+LATENCY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+
+
+class LatencyHistogram:
+    """Count latencies in fixed logarithmic buckets.
+
+    Recording is O(1) in memory and O(log buckets) in time. The quantiles
+    are estimated by the upper bound of the bucket in which they fall.
+    """
+
+    def __init__(self):
+        """Initialize an empty histogram."""
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, duration):
+        """Add a duration in seconds."""
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, duration)] += 1
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    def quantile(self, quantile):
+        """Return the upper bound of the bucket holding `quantile`, or None."""
+        if not self.count:
+            return None
+        rank = quantile * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                if index == len(LATENCY_BUCKETS):
+                    return self.max
+                return min(LATENCY_BUCKETS[index], self.max)
+        return self.max
+
+    def as_dict(self):
+        """Return a summary in milliseconds."""
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_ms": round(1000 * self.total / self.count, 3),
+            "p50_ms": round(1000 * self.quantile(0.5), 3),
+            "p95_ms": round(1000 * self.quantile(0.95), 3),
+            "max_ms": round(1000 * self.max, 3),
+        }
+
+
+class ControlStats:
+    """Latencies and counters of the control path of one thermostat.
+
+    - `lock_wait`: time spent waiting for the control lock,
+    - `decision`: time spent deciding once the lock is held,
+    - `switch_call`: duration of the service calls to the heaters,
+    - `events`: number of calls of each handler,
+    - `switch_cycles`: number of times the heaters were switched on.
+    """
+
+    def __init__(self):
+        """Initialize the statistics."""
+        self.lock_wait = LatencyHistogram()
+        self.decision = LatencyHistogram()
+        self.switch_call = LatencyHistogram()
+        self.events = {}
+        self.switch_cycles = 0
+        self._start = time.monotonic()
+
+    def count(self, handler):
+        """Count a call of `handler`."""
+        self.events[handler] = self.events.get(handler, 0) + 1
+
+    def as_dict(self):
+        """Return a summary of the statistics."""
+        minutes = (time.monotonic() - self._start) / 60
+        return {
+            "lock_wait": self.lock_wait.as_dict(),
+            "decision": self.decision.as_dict(),
+            "switch_call": self.switch_call.as_dict(),
+            "decisions_per_minute": (
+                round(self.decision.count / minutes, 3) if minutes else None
+            ),
+            "events": dict(self.events),
+            "switch_cycles": self.switch_cycles,
+        }
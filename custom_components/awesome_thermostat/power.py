@@ -0,0 +1,191 @@
+"""Power budget shared by the heaters of all the awesome thermostats."""
+import logging
+
+from homeassistant.components.climate.const import (
+    PRESET_ACTIVITY,
+    PRESET_AWAY,
+    PRESET_BOOST,
+    PRESET_COMFORT,
+    PRESET_ECO,
+    PRESET_HOME,
+    PRESET_NONE,
+    PRESET_SLEEP,
+)
+from homeassistant.core import callback
+
+from .control import allocate_power
+
+_LOGGER = logging.getLogger(__name__)
+
+# Priority added to the temperature deficit of a zone, in degrees
+PRESET_PRIORITIES = {
+    PRESET_BOOST: 2.0,
+    PRESET_COMFORT: 1.0,
+    PRESET_HOME: 1.0,
+    PRESET_ACTIVITY: 0.5,
+    PRESET_NONE: 0.5,
+    PRESET_SLEEP: 0.0,
+    PRESET_ECO: 0.0,
+    PRESET_AWAY: -1.0,
+}
+# Priority gained by a zone for each slot spent waiting for power
+WAITING_PRIORITY = 0.5
+
+
+class PowerScheduler:
+    """Keep the power drawn by the heaters within a global budget.
+
+    A thermostat with a rated heater power asks for power instead of turning
+    its heaters on, and gives it back when turning them off. Every request is
+    served in one allocation pass over all the waiting zones, coalesced with
+    the other requests of the same loop iteration, within the power left by
+    the running zones. At the start of each slot, the budget is reallocated
+    over all the zones asking for power, by priority: the temperature
+    deficit, the preset and the time spent waiting. Zones losing their power
+    are shed, which rotates the zones when the budget is too small for all.
+    The heaters are switched by the command queue of their thermostat.
+    """
+
+    def __init__(self, hass, coordinator, budget, slot):
+        """Initialize the scheduler."""
+        self.hass = hass
+        self.budget = budget
+        self._coordinator = coordinator
+        self._slot = slot
+        self._thermostats = {}
+        self._demands = set()
+        self._running = set()
+        self._waiting_slots = {}
+        self._remove_interval = None
+        self._allocation_scheduled = False
+
+    @callback
+    def async_add(self, thermostat):
+        """Manage the heaters of `thermostat`. Return a callback removing it."""
+        key = id(thermostat)
+        if thermostat.heater_power > self.budget:
+            _LOGGER.warning(
+                "The power of %s is larger than the power budget, it will never heat",
+                thermostat.heater_entity_ids,
+            )
+        self._thermostats[key] = thermostat
+        if self._remove_interval is None:
+            self._remove_interval = self._coordinator.async_track_interval(
+                self._slot, self._async_start_slot
+            )
+
+        @callback
+        def _async_remove():
+            del self._thermostats[key]
+            self._waiting_slots.pop(key, None)
+            self._demands.discard(key)
+            if key in self._running:
+                self._running.discard(key)
+                self._async_schedule_allocation()
+            if not self._thermostats:
+                self._remove_interval()
+                self._remove_interval = None
+
+        return _async_remove
+
+    @callback
+    def async_request(self, thermostat):
+        """Ask power for the heaters of `thermostat`.
+
+        Return True if the heaters may be turned on now. Otherwise they are
+        turned on by the scheduler once power is granted.
+        """
+        key = id(thermostat)
+        if key in self._running:
+            return True
+        if key not in self._demands:
+            self._demands.add(key)
+            self._waiting_slots.setdefault(key, 0)
+            self._async_schedule_allocation()
+        return False
+
+    @callback
+    def async_release(self, thermostat):
+        """Give back the power of `thermostat`, its heaters being turned off."""
+        key = id(thermostat)
+        self._demands.discard(key)
+        self._waiting_slots.pop(key, None)
+        if key in self._running:
+            self._running.discard(key)
+            self._async_schedule_allocation()
+
+    def is_waiting(self, thermostat):
+        """Return True if `thermostat` is waiting for power."""
+        key = id(thermostat)
+        return key in self._demands and key not in self._running
+
+    @property
+    def power(self):
+        """Return the power granted to the running heaters."""
+        return sum(self._thermostats[key].heater_power for key in self._running)
+
+    @callback
+    def _async_schedule_allocation(self):
+        """Allocate the free power once the current requests are all known."""
+        if self._allocation_scheduled:
+            return
+        self._allocation_scheduled = True
+        self.hass.loop.call_soon(self._async_allocate_free_power)
+
+    @callback
+    def _async_allocate_free_power(self):
+        """Grant the power left by the running zones to the waiting ones."""
+        self._allocation_scheduled = False
+        waiting = self._demands - self._running
+        if waiting:
+            self._async_allocate(waiting, self.budget - self.power)
+
+    @callback
+    def _async_start_slot(self, _):
+        """Reallocate the whole budget at the start of a slot."""
+        for key in self._demands - self._running:
+            self._waiting_slots[key] += 1
+        self._async_allocate(self._demands, self.budget)
+
+    def _priority(self, key):
+        """Return the priority of a zone asking for power."""
+        thermostat = self._thermostats[key]
+        deficit = 0.0
+        if None not in (thermostat.current_temperature, thermostat.target_temperature):
+            deficit = thermostat.target_temperature - thermostat.current_temperature
+            if thermostat.ac_mode:
+                deficit = -deficit
+        return (
+            deficit
+            + PRESET_PRIORITIES.get(thermostat.preset_mode, 0.0)
+            + WAITING_PRIORITY * self._waiting_slots.get(key, 0)
+        )
+
+    @callback
+    def _async_allocate(self, candidates, budget):
+        """Allocate `budget` to the `candidates` and switch their heaters."""
+        granted = set(
+            allocate_power(
+                [
+                    (key, self._thermostats[key].heater_power, self._priority(key))
+                    for key in candidates
+                ],
+                budget,
+            )
+        )
+        start = granted - self._running
+        stop = (candidates & self._running) - granted
+        self._running = (self._running - stop) | granted
+        for key in start:
+            self._waiting_slots[key] = 0
+        if start or stop:
+            _LOGGER.debug(
+                "Power budget: %d zones started, %d shed, %.0f W used",
+                len(start),
+                len(stop),
+                self.power,
+            )
+        for key in start:
+            self._thermostats[key]._async_power_changed(True)
+        for key in stop:
+            self._thermostats[key]._async_power_changed(False)
@@ -0,0 +1,65 @@
+"""Weekly schedules of the presets of the awesome thermostats.
+
+Nothing in this module depends on Home Assistant.
+"""
+import bisect
+from datetime import datetime, time, timedelta
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+MINUTES_PER_WEEK = 7 * 24 * 60
+
+
+class WeeklySchedule:
+    """Presets switched at given times of the week.
+
+    The slots are precomputed into a timeline of the transitions sorted by
+    minute of the week, so finding the current preset or the next transition
+    is a binary search. A preset stays until the next transition, wrapping
+    around the end of the week.
+    """
+
+    def __init__(self, slots):
+        """Build the timeline from (weekdays, time, preset) slots.
+
+        Of several slots starting at the same minute, the last one wins.
+        """
+        transitions = {}
+        for days, start, preset in slots:
+            for day in days:
+                minute = WEEKDAYS.index(day) * 1440 + start.hour * 60 + start.minute
+                transitions[minute] = preset
+        self._minutes = sorted(transitions)
+        self._presets = [transitions[minute] for minute in self._minutes]
+
+    @staticmethod
+    def _minute_of_week(now):
+        """Return the minute of the week of the local datetime `now`."""
+        return now.weekday() * 1440 + now.hour * 60 + now.minute
+
+    def preset_at(self, now):
+        """Return the preset in force at the local datetime `now`."""
+        if not self._minutes:
+            return None
+        index = bisect.bisect_right(self._minutes, self._minute_of_week(now))
+        # Before the first transition of the week, the last one is in force
+        return self._presets[index - 1]
+
+    def next_transition(self, now):
+        """Return the local datetime and the preset of the next transition.
+
+        The transition is strictly after `now`, or None without slots.
+        """
+        if not self._minutes:
+            return None
+        index = bisect.bisect_right(self._minutes, self._minute_of_week(now))
+        weeks = 0
+        if index == len(self._minutes):
+            index = 0
+            weeks = 1
+        monday = now.date() - timedelta(days=now.weekday())
+        # Local wall time, so the transitions follow the daylight saving time
+        when = datetime.combine(monday, time(), now.tzinfo) + timedelta(
+            weeks=weeks, minutes=self._minutes[index]
+        )
+        return when, self._presets[index]
@@ -0,0 +1,120 @@
+"""Heating runtime and energy sensors of the awesome thermostats."""
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorStateClass,
+)
+from homeassistant.const import (
+    CONF_NAME,
+    CONF_SENSORS,
+    CONF_UNIQUE_ID,
+    UnitOfEnergy,
+    UnitOfTime,
+)
+
+from . import (
+    DATA_ACCOUNTING,
+    DOMAIN,
+    KIND_CYCLES,
+    KIND_ENERGY,
+    KIND_RUNTIME,
+    async_get_accounting,
+)
+from .climate import CONF_ACCOUNTING, CONF_HEATER_POWER
+
+
+async def async_setup_entry(hass, entry, async_add_entities):
+    """Set up the companion sensors of the thermostat of a config entry."""
+    config = {**entry.data, **entry.options}
+    if not config.get(CONF_ACCOUNTING):
+        return
+    kinds = [KIND_RUNTIME, KIND_CYCLES]
+    if config.get(CONF_HEATER_POWER):
+        kinds.append(KIND_ENERGY)
+    accounting = async_get_accounting(hass, entry.entry_id)
+    async_add_entities(
+        SENSOR_CLASSES[kind](config[CONF_NAME], entry.entry_id, accounting)
+        for kind in kinds
+    )
+
+
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
+    """Set up the companion sensors of a YAML awesome thermostat.
+
+    The kinds of sensors to add are in the `sensors` of the discovery info,
+    so that the energy sensor can be added once a heater power is set.
+    """
+    if discovery_info is None:
+        return
+
+    name = discovery_info[CONF_NAME]
+    unique_id = discovery_info[CONF_UNIQUE_ID]
+    accounting = hass.data[DOMAIN][DATA_ACCOUNTING][unique_id or name]
+    async_add_entities(
+        SENSOR_CLASSES[kind](name, unique_id, accounting)
+        for kind in discovery_info[CONF_SENSORS]
+    )
+
+
+class HeatingAccountingSensor(SensorEntity):
+    """Base of the sensors reading the accounting of a thermostat."""
+
+    _attr_should_poll = False
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+    kind = None
+
+    def __init__(self, name, unique_id, accounting):
+        """Initialize the sensor."""
+        self._attr_name = f"{name} heating {self.kind}"
+        if unique_id is not None:
+            self._attr_unique_id = f"{unique_id}_heating_{self.kind}"
+        self._accounting = accounting
+
+    async def async_added_to_hass(self):
+        """Follow the changes of the accounting."""
+        self.async_on_remove(self._accounting.add_listener(self.async_write_ha_state))
+
+
+class HeatingRuntimeSensor(HeatingAccountingSensor):
+    """Cumulated time during which the heaters were on."""
+
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_native_unit_of_measurement = UnitOfTime.HOURS
+    kind = KIND_RUNTIME
+
+    @property
+    def native_value(self):
+        """Return the runtime in hours."""
+        return round(self._accounting.runtime / 3600, 4)
+
+
+class HeatingCyclesSensor(HeatingAccountingSensor):
+    """Number of times the heaters were switched on."""
+
+    _attr_icon = "mdi:counter"
+    kind = KIND_CYCLES
+
+    @property
+    def native_value(self):
+        """Return the number of cycles."""
+        return self._accounting.cycles
+
+
+class HeatingEnergySensor(HeatingAccountingSensor):
+    """Energy estimated from the rated power of the heaters."""
+
+    _attr_device_class = SensorDeviceClass.ENERGY
+    _attr_native_unit_of_measurement = UnitOfEnergy.KILO_WATT_HOUR
+    kind = KIND_ENERGY
+
+    @property
+    def native_value(self):
+        """Return the energy in kWh."""
+        energy = self._accounting.energy
+        return None if energy is None else round(energy, 4)
+
+
+SENSOR_CLASSES = {
+    sensor_class.kind: sensor_class
+    for sensor_class in (HeatingRuntimeSensor, HeatingCyclesSensor, HeatingEnergySensor)
+}
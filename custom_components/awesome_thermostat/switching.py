@@ -0,0 +1,260 @@
+"""Commands sent to the heaters of an awesome thermostat."""
+import asyncio
+from datetime import timedelta
+import logging
+from time import perf_counter
+
+from homeassistant.core import callback
+from homeassistant.exceptions import HomeAssistantError
+import homeassistant.util.dt as dt_util
+
+_LOGGER = logging.getLogger(__name__)
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+# Consecutive failures opening the breaker
+BREAKER_THRESHOLD = 3
+RETRY_BACKOFF = timedelta(seconds=5)
+MAX_RETRY_BACKOFF = timedelta(minutes=5)
+
+
+class HeaterCommands:
+    """Send the commands of a thermostat to each of its heaters.
+
+    Each heater entity has its own queue, so a dead heater does not delay
+    the others nor open their breaker. The breaker reported is the worst one
+    of the heaters, and the failures are those of the heater failing the
+    most.
+    """
+
+    def __init__(
+        self, hass, coordinator, actuator, timeout, update_callback, stats=None
+    ):
+        """Initialize one queue per heater entity of `actuator`."""
+        self._queues = [
+            HeaterCommandQueue(
+                hass,
+                coordinator,
+                actuator,
+                timeout,
+                update_callback,
+                stats,
+                entity_id,
+            )
+            for entity_id in actuator.entity_ids
+        ]
+
+    @property
+    def breaker(self):
+        """Return the worst state of the breakers of the heaters."""
+        breakers = {queue.breaker for queue in self._queues}
+        for breaker in (BREAKER_OPEN, BREAKER_HALF_OPEN):
+            if breaker in breakers:
+                return breaker
+        return BREAKER_CLOSED
+
+    @property
+    def failures(self):
+        """Return the most failures in a row of a heater."""
+        return max((queue.failures for queue in self._queues), default=0)
+
+    @property
+    def superseded(self):
+        """Return the number of commands superseded, over all the heaters."""
+        return sum(queue.superseded for queue in self._queues)
+
+    @property
+    def skipped(self):
+        """Return the number of commands skipped, over all the heaters."""
+        return sum(queue.skipped for queue in self._queues)
+
+    @callback
+    def async_set(self, value, context=None):
+        """Ask to send a command to all the heaters."""
+        for queue in self._queues:
+            queue.async_set(value, context)
+
+    @callback
+    def async_cancel(self):
+        """Drop the pending commands and the scheduled retries."""
+        for queue in self._queues:
+            queue.async_cancel()
+
+
+class HeaterCommandQueue:
+    """Send the commands of a thermostat to a heater without blocking.
+
+    The commands are turned into service calls to `entity_id` by the
+    actuator of the thermostat. Only the latest desired value matters: a command given while
+    another is in flight or waiting for a retry supersedes the pending one,
+    and the actuator may drop a value too close to the last one sent. Each call
+    is bounded by `timeout`, and failed calls are retried with an exponential
+    backoff on the shared timer of the coordinator. After a few consecutive
+    failures the breaker opens: the commands are then only tried once per
+    backoff (half open) until one succeeds.
+    """
+
+    def __init__(
+        self,
+        hass,
+        coordinator,
+        actuator,
+        timeout,
+        update_callback,
+        stats=None,
+        entity_id=None,
+    ):
+        """Initialize the queue of `entity_id`, or of all the heaters.
+
+        `update_callback` is called when the failures or the breaker change.
+        The duration of the calls is recorded in `stats` if given.
+        """
+        self.hass = hass
+        self._coordinator = coordinator
+        self._actuator = actuator
+        self._entity_ids = [entity_id] if entity_id else actuator.entity_ids
+        self._timeout = timeout.total_seconds()
+        self._update_callback = update_callback
+        self._stats = stats
+        self.failures = 0
+        self.superseded = 0
+        self.skipped = 0
+        self._sent = None
+        self._desired = None
+        self._context = None
+        self._pending = False
+        self._in_flight = None
+        self._sender = None
+        self._cancel_retry = None
+
+    @property
+    def breaker(self):
+        """Return the state of the breaker."""
+        if self.failures < BREAKER_THRESHOLD:
+            return BREAKER_CLOSED
+        if self._in_flight is not None:
+            return BREAKER_HALF_OPEN
+        return BREAKER_OPEN
+
+    @callback
+    def async_set(self, value, context=None):
+        """Ask to send a command to the heaters, without waiting for the call."""
+        if self._pending:
+            if value != self._desired:
+                self.superseded += 1
+        elif self._in_flight is not None:
+            if self._in_flight == value:
+                # The command in flight already does it
+                return
+        elif self._actuator.redundant(value, self._sent):
+            self.skipped += 1
+            return
+        self._desired = value
+        self._context = context
+        self._pending = True
+        if self._cancel_retry is None:
+            self._async_start()
+
+    @callback
+    def async_cancel(self):
+        """Drop the pending command and the scheduled retry."""
+        self._pending = False
+        if self._cancel_retry is not None:
+            self._cancel_retry()
+            self._cancel_retry = None
+
+    @callback
+    def _async_start(self):
+        """Start the sender unless it is already running."""
+        if self._sender is None:
+            self._sender = self.hass.async_create_task(self._async_send())
+
+    async def _async_send(self):
+        """Send the pending commands until none is left or a call fails."""
+        try:
+            while self._pending:
+                if not await self._async_send_one():
+                    return
+        finally:
+            self._sender = None
+
+    async def _async_send_one(self):
+        """Send the pending command, return False if the call failed."""
+        value = self._in_flight = self._desired
+        self._pending = False
+        begin = perf_counter()
+        error = None
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(
+                    *(
+                        self.hass.services.async_call(
+                            domain,
+                            service,
+                            data,
+                            blocking=True,
+                            context=self._context,
+                        )
+                        for domain, service, data in self._actuator.calls(
+                            value, self._entity_ids
+                        )
+                    )
+                ),
+                self._timeout,
+            )
+        except (asyncio.TimeoutError, HomeAssistantError) as ex:
+            error = ex
+        except Exception as ex:  # pylint: disable=broad-except
+            # Any error must leave the queue able to send the next command
+            _LOGGER.exception("Unexpected error setting heater %s", self._entity_ids)
+            error = ex
+        finally:
+            self._async_record_call(begin)
+            self._in_flight = None
+        if error is not None:
+            self._async_failed(value, error)
+            return False
+        self._sent = value
+        if self.failures:
+            if self.failures >= BREAKER_THRESHOLD:
+                _LOGGER.warning("Heater %s responds again", self._entity_ids)
+            self.failures = 0
+            self._update_callback()
+        return True
+
+    @callback
+    def _async_record_call(self, begin):
+        """Record the duration of a call started at `begin`."""
+        if self._stats is not None:
+            self._stats.switch_call.record(perf_counter() - begin)
+
+    @callback
+    def _async_failed(self, value, ex):
+        """Schedule the retry of a failed command."""
+        self.failures += 1
+        backoff = min(
+            RETRY_BACKOFF * 2 ** min(self.failures - 1, 10), MAX_RETRY_BACKOFF
+        )
+        log = _LOGGER.warning if self.failures == BREAKER_THRESHOLD else _LOGGER.info
+        log(
+            "Failure %d to set heater %s to %s (%s), retrying in %s",
+            self.failures,
+            self._entity_ids,
+            value,
+            str(ex) or type(ex).__name__,
+            backoff,
+        )
+        # Retry the failed command, or the one which replaced it
+        self._pending = True
+        self._cancel_retry = self._coordinator.async_schedule(
+            dt_util.utcnow() + backoff, self._async_retry
+        )
+        self._update_callback()
+
+    @callback
+    def _async_retry(self, _):
+        """Send the latest command after a backoff."""
+        self._cancel_retry = None
+        self._async_start()
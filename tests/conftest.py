@@ -0,0 +1,36 @@
+"""Fixtures of the awesome thermostat tests."""
+from homeassistant.const import (
+    ATTR_ENTITY_ID,
+    SERVICE_TURN_OFF,
+    SERVICE_TURN_ON,
+    STATE_OFF,
+    STATE_ON,
+)
+from homeassistant.core import DOMAIN as HA_DOMAIN, callback
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def auto_enable_custom_integrations(enable_custom_integrations):
+    """Load the integration from the custom_components folder."""
+    yield
+
+
+@pytest.fixture
+def heater_calls(hass):
+    """Switch the heaters as asked and return the calls, in order."""
+    calls = []
+
+    @callback
+    def async_switch(call):
+        entity_ids = call.data[ATTR_ENTITY_ID]
+        if isinstance(entity_ids, str):
+            entity_ids = [entity_ids]
+        state = STATE_ON if call.service == SERVICE_TURN_ON else STATE_OFF
+        for entity_id in entity_ids:
+            calls.append((entity_id, state))
+            hass.states.async_set(entity_id, state)
+
+    hass.services.async_register(HA_DOMAIN, SERVICE_TURN_ON, async_switch)
+    hass.services.async_register(HA_DOMAIN, SERVICE_TURN_OFF, async_switch)
+    return calls
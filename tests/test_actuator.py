@@ -0,0 +1,227 @@
+"""Tests of the valves and climate entities driven by the awesome thermostat."""
+from datetime import timedelta
+
+from homeassistant.components.climate import (
+    DOMAIN as CLIMATE_DOMAIN,
+    SERVICE_SET_HVAC_MODE,
+    SERVICE_SET_TEMPERATURE,
+)
+from homeassistant.const import ATTR_ENTITY_ID, ATTR_TEMPERATURE
+from homeassistant.core import callback
+from homeassistant.setup import async_setup_component
+import homeassistant.util.dt as dt_util
+import pytest
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.awesome_thermostat import DOMAIN
+from custom_components.awesome_thermostat.actuator import (
+    ClimateActuator,
+    ValveActuator,
+)
+
+SENSOR = "sensor.study_temperature"
+THERMOSTAT = "climate.study"
+
+
+def test_valve_command():
+    """The opening follows the on ratio, within 0 and 100%."""
+    valve = ValveActuator(["number.study_valve"], 5)
+
+    assert [valve.command(ratio, 20) for ratio in (-0.2, 0, 0.484, 1, 1.3)] == [
+        0,
+        0,
+        48,
+        100,
+        100,
+    ]
+
+
+@pytest.mark.parametrize(
+    "value, sent, redundant",
+    [
+        (48, None, False),
+        (48, 48, True),
+        (51, 48, True),
+        (53, 48, False),
+        (44, 48, True),
+        # The limits are always reached
+        (0, 3, False),
+        (100, 97, False),
+    ],
+)
+def test_valve_step(value, sent, redundant):
+    """An opening less than a step away from the last one is dropped."""
+    valve = ValveActuator(["number.study_valve"], 5)
+
+    assert valve.redundant(value, sent) is redundant
+
+
+def test_valve_calls():
+    """The valves of each domain get one call."""
+    valve = ValveActuator(["number.valve_1", "input_number.valve_2"], 5)
+
+    assert valve.calls(36) == [
+        ("number", "set_value", {ATTR_ENTITY_ID: ["number.valve_1"], "value": 36}),
+        (
+            "input_number",
+            "set_value",
+            {ATTR_ENTITY_ID: ["input_number.valve_2"], "value": 36},
+        ),
+    ]
+    assert valve.calls(0, ["number.valve_1"])[0][2][ATTR_ENTITY_ID] == [
+        "number.valve_1"
+    ]
+
+
+def test_climate_command():
+    """The setpoint is the target while heating, the off setpoint otherwise."""
+    climate = ClimateActuator(["climate.study_trv"], 0.5, 7)
+
+    assert climate.command(1, 20) == 20
+    assert climate.command(0.3, 20.9) == 20.9
+    assert climate.command(0, 20) == 7
+    assert climate.command(1, None) == 7
+    # A target below the off setpoint does not go under it
+    assert climate.command(1, 5) == 7
+
+
+@pytest.mark.parametrize(
+    "value, sent, redundant",
+    [
+        (20, None, False),
+        (20.3, 20, True),
+        (20.9, 20, False),
+        (7, 7.2, False),
+    ],
+)
+def test_climate_step(value, sent, redundant):
+    """A setpoint less than a step away is dropped, unless it is the off one."""
+    climate = ClimateActuator(["climate.study_trv"], 0.5, 7)
+
+    assert climate.redundant(value, sent) is redundant
+
+
+@pytest.fixture
+def valve_calls(hass):
+    """Set the openings of the valves and return them, in order."""
+    calls = []
+
+    @callback
+    def async_set_value(call):
+        for entity_id in call.data[ATTR_ENTITY_ID]:
+            calls.append(call.data["value"])
+            hass.states.async_set(entity_id, call.data["value"])
+
+    hass.services.async_register("number", "set_value", async_set_value)
+    return calls
+
+
+@callback
+def async_capture_setpoints(hass):
+    """Set the setpoints of the climate entities and return them, in order.
+
+    The service replaces the one of the climate integration, so it is
+    registered once the thermostat is set up.
+    """
+    calls = []
+
+    @callback
+    def async_set_temperature(call):
+        entity_ids = call.data[ATTR_ENTITY_ID]
+        if isinstance(entity_ids, str):
+            entity_ids = [entity_ids]
+        for entity_id in entity_ids:
+            calls.append(call.data[ATTR_TEMPERATURE])
+            hass.states.async_set(
+                entity_id, "heat", {ATTR_TEMPERATURE: call.data[ATTR_TEMPERATURE]}
+            )
+
+    hass.services.async_register(
+        CLIMATE_DOMAIN, SERVICE_SET_TEMPERATURE, async_set_temperature
+    )
+    return calls
+
+
+async def async_setup_thermostat(hass, heater, **config):
+    """Set up the thermostat of the study at 19.2° for a target of 20°."""
+    hass.states.async_set(SENSOR, "19.2")
+    assert await async_setup_component(
+        hass,
+        CLIMATE_DOMAIN,
+        {
+            CLIMATE_DOMAIN: {
+                "platform": DOMAIN,
+                "name": "Study",
+                "heater": heater,
+                "target_sensor": SENSOR,
+                "initial_hvac_mode": "heat",
+                **config,
+            }
+        },
+    )
+    await hass.async_block_till_done()
+
+
+async def async_set_temperature(hass, temperature):
+    """Set the target of the thermostat."""
+    await hass.services.async_call(
+        CLIMATE_DOMAIN,
+        SERVICE_SET_TEMPERATURE,
+        {ATTR_ENTITY_ID: THERMOSTAT, ATTR_TEMPERATURE: temperature},
+        blocking=True,
+    )
+    await hass.async_block_till_done()
+
+
+async def async_turn_off(hass):
+    """Turn the thermostat off."""
+    await hass.services.async_call(
+        CLIMATE_DOMAIN,
+        SERVICE_SET_HVAC_MODE,
+        {ATTR_ENTITY_ID: THERMOSTAT, "hvac_mode": "off"},
+        blocking=True,
+    )
+    await hass.async_block_till_done()
+
+
+async def test_valve_follows_the_cycles(hass, freezer, valve_calls):
+    """The valve opens by the on ratio of each cycle and closes when off."""
+    hass.states.async_set("number.study_valve", 0)
+    await async_setup_thermostat(
+        hass,
+        "number.study_valve",
+        heater_type="valve",
+        control_mode="proportional",
+        proportional_gain=0.6,
+        proportional_bias=0,
+        cycle_duration={"minutes": 10},
+    )
+    await async_set_temperature(hass, 20)
+
+    for temperature in ("18.8", "19.05", "19.4", "19.9"):
+        hass.states.async_set(SENSOR, temperature)
+        await hass.async_block_till_done()
+        freezer.tick(timedelta(minutes=10))
+        async_fire_time_changed(hass, dt_util.utcnow())
+        await hass.async_block_till_done()
+
+    await async_turn_off(hass)
+
+    assert valve_calls == [48, 72, 57, 36, 6, 0]
+
+
+async def test_climate_follows_the_target(hass):
+    """The setpoint follows the target while heating, then goes to 7°."""
+    hass.states.async_set("climate.study_trv", "heat", {ATTR_TEMPERATURE: 7})
+    await async_setup_thermostat(hass, "climate.study_trv", heater_type="climate")
+    thermostat = hass.data[CLIMATE_DOMAIN].get_entity(THERMOSTAT)
+    setpoint_calls = async_capture_setpoints(hass)
+
+    for temperature in (20, 20.2, 20.9):
+        await thermostat.async_set_temperature(temperature=temperature)
+        await hass.async_block_till_done()
+    await thermostat.async_set_hvac_mode("off")
+    await hass.async_block_till_done()
+
+    # 20.2 is less than the step of 0.5° away from 20
+    assert setpoint_calls == [20, 20.9, 7]
@@ -0,0 +1,340 @@
+"""Tests of the behaviour of the awesome thermostat entity."""
+from datetime import timedelta
+
+from homeassistant.components.climate import (
+    ATTR_PRESET_MODE,
+    DOMAIN as CLIMATE_DOMAIN,
+    SERVICE_SET_PRESET_MODE,
+)
+from homeassistant.const import (
+    ATTR_ENTITY_ID,
+    ATTR_TEMPERATURE,
+    STATE_OFF,
+    STATE_ON,
+)
+from homeassistant.setup import async_setup_component
+import homeassistant.util.dt as dt_util
+import pytest
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.awesome_thermostat import DOMAIN
+from custom_components.awesome_thermostat.coordinator import async_get_coordinator
+
+HEATER = "switch.study_heater"
+SENSOR = "sensor.study_temperature"
+MOTION = "input_boolean.study_motion"
+THERMOSTAT = "climate.study"
+
+
+async def async_setup_thermostat(hass, temperature="19", domain_config=None, **config):
+    """Set up the thermostat of the study, heating."""
+    hass.states.async_set(SENSOR, temperature)
+    hass.states.async_set(HEATER, STATE_OFF)
+    if domain_config is not None:
+        assert await async_setup_component(hass, DOMAIN, {DOMAIN: domain_config})
+    assert await async_setup_component(
+        hass,
+        CLIMATE_DOMAIN,
+        {
+            CLIMATE_DOMAIN: {
+                "platform": DOMAIN,
+                "name": "Study",
+                "heater": HEATER,
+                "target_sensor": SENSOR,
+                "initial_hvac_mode": "heat",
+                **config,
+            }
+        },
+    )
+    await hass.async_block_till_done()
+
+
+async def async_wait(hass, freezer, delay):
+    """Let `delay` pass and fire the timers due meanwhile."""
+    freezer.tick(delay)
+    async_fire_time_changed(hass, dt_util.utcnow())
+    await hass.async_block_till_done()
+
+
+async def test_motion_setback(hass, freezer, heater_calls):
+    """The target follows the motion, back to eco after the motion delay."""
+    hass.states.async_set(MOTION, STATE_OFF)
+    await async_setup_thermostat(
+        hass,
+        eco_temp=18.5,
+        comfort_temp=21.5,
+        motion_sensor=MOTION,
+        motion_mode="comfort",
+        no_motion_mode="eco",
+        motion_delay={"minutes": 5},
+    )
+    await hass.services.async_call(
+        CLIMATE_DOMAIN,
+        SERVICE_SET_PRESET_MODE,
+        {ATTR_ENTITY_ID: THERMOSTAT, ATTR_PRESET_MODE: "activity"},
+        blocking=True,
+    )
+    await hass.async_block_till_done()
+    attributes = hass.states.get(THERMOSTAT).attributes
+    assert attributes[ATTR_TEMPERATURE] == 18.5
+    assert attributes["motion_state"] == "no_motion"
+    assert heater_calls == []
+
+    hass.states.async_set(MOTION, STATE_ON)
+    await hass.async_block_till_done()
+    attributes = hass.states.get(THERMOSTAT).attributes
+    assert attributes[ATTR_TEMPERATURE] == 21.5
+    assert attributes["motion_state"] == "motion"
+    assert heater_calls == [(HEATER, STATE_ON)]
+
+    # A flapping sensor moves the single deadline instead of adding timers
+    hass.states.async_set(MOTION, STATE_OFF)
+    await async_wait(hass, freezer, timedelta(minutes=3))
+    hass.states.async_set(MOTION, STATE_ON)
+    await hass.async_block_till_done()
+    hass.states.async_set(MOTION, STATE_OFF)
+    await async_wait(hass, freezer, timedelta(minutes=3))
+    attributes = hass.states.get(THERMOSTAT).attributes
+    assert attributes[ATTR_TEMPERATURE] == 21.5
+    assert attributes["motion_state"] == "waiting"
+
+    await async_wait(hass, freezer, timedelta(minutes=2))
+    attributes = hass.states.get(THERMOSTAT).attributes
+    assert attributes[ATTR_TEMPERATURE] == 18.5
+    assert attributes["motion_state"] == "no_motion"
+    assert attributes["motion_timers_scheduled"] == 2
+    assert attributes["motion_timers_cancelled"] == 1
+    assert heater_calls == [(HEATER, STATE_ON), (HEATER, STATE_OFF)]
+
+
+async def test_sensor_burst_is_coalesced(hass, freezer, heater_calls):
+    """A burst of readings is evaluated once, with its last reading."""
+    await async_setup_thermostat(
+        hass, "21", target_temp=20, sensor_debounce={"seconds": 30}
+    )
+
+    for temperature in ("19.5", "19", "19.2"):
+        hass.states.async_set(SENSOR, temperature)
+        await async_wait(hass, freezer, timedelta(seconds=5))
+
+    assert heater_calls == []
+    assert hass.states.get(THERMOSTAT).attributes["current_temperature"] == 21
+
+    await async_wait(hass, freezer, timedelta(seconds=30))
+
+    attributes = hass.states.get(THERMOSTAT).attributes
+    assert attributes["current_temperature"] == 19.2
+    assert attributes["sensor_events_coalesced"] == 2
+    assert heater_calls == [(HEATER, STATE_ON)]
+
+
+async def test_small_changes_are_ignored(hass, heater_calls):
+    """A reading closer than the minimal delta runs no control."""
+    await async_setup_thermostat(hass, "21", target_temp=20, sensor_min_delta=0.5)
+
+    hass.states.async_set(SENSOR, "20.6")
+    await hass.async_block_till_done()
+
+    assert hass.states.get(THERMOSTAT).attributes["current_temperature"] == 21
+
+    hass.states.async_set(SENSOR, "19.5")
+    await hass.async_block_till_done()
+
+    attributes = hass.states.get(THERMOSTAT).attributes
+    assert attributes["current_temperature"] == 19.5
+    assert attributes["sensor_events_dropped"] == 1
+    assert heater_calls == [(HEATER, STATE_ON)]
+
+
+async def test_window_detected_from_the_slope(hass, freezer, heater_calls):
+    """A fast fall of the temperature turns the heating off until it stops."""
+    await async_setup_thermostat(hass, target_temp=20, window_slope_threshold=6)
+
+    # 12° per hour
+    for temperature in ("18.9", "18.8", "18.7", "18.6"):
+        hass.states.async_set(SENSOR, temperature)
+        await async_wait(hass, freezer, timedelta(seconds=30))
+
+    assert hass.states.get(THERMOSTAT).state == "heat"
+    assert heater_calls == [(HEATER, STATE_ON)]
+
+    # The slope only counts once the samples span 2 minutes
+    hass.states.async_set(SENSOR, "18.5")
+    await hass.async_block_till_done()
+
+    state = hass.states.get(THERMOSTAT)
+    assert state.state == STATE_OFF
+    assert state.attributes["window_open_detected"] is True
+    assert heater_calls == [(HEATER, STATE_ON), (HEATER, STATE_OFF)]
+
+    for temperature in ("18.6", "18.7", "18.8"):
+        await async_wait(hass, freezer, timedelta(seconds=30))
+        hass.states.async_set(SENSOR, temperature)
+        await hass.async_block_till_done()
+
+    state = hass.states.get(THERMOSTAT)
+    assert state.state == "heat"
+    assert state.attributes["window_open_detected"] is False
+    assert heater_calls[-1] == (HEATER, STATE_ON)
+
+
+async def test_instrumentation(hass, heater_calls):
+    """The counters of the control path are published when enabled."""
+    await async_setup_thermostat(
+        hass, target_temp=20, domain_config={"instrumentation": True}
+    )
+
+    for temperature in ("19.5", "20.5", "21"):
+        hass.states.async_set(SENSOR, temperature)
+        await hass.async_block_till_done()
+
+    assert heater_calls == [(HEATER, STATE_ON), (HEATER, STATE_OFF)]
+    performance = hass.states.get(THERMOSTAT).attributes["performance"]
+    assert performance["events"] == {"temperature": 3, "switch": 2}
+    assert performance["decision"]["count"] == 3
+    assert performance["switch_call"]["count"] == 2
+    assert performance["switch_cycles"] == 1
+
+
+async def test_no_instrumentation_by_default(hass, heater_calls):
+    """Nothing is measured unless the instrumentation is enabled."""
+    await async_setup_thermostat(hass, target_temp=20)
+
+    hass.states.async_set(SENSOR, "19.5")
+    await hass.async_block_till_done()
+
+    assert heater_calls == [(HEATER, STATE_ON)]
+    assert "performance" not in hass.states.get(THERMOSTAT).attributes
+
+
+async def test_feed_forward(hass, heater_calls):
+    """The heater starts earlier when it is cold outside."""
+    hass.states.async_set("sensor.outdoor_temperature", "0")
+    await async_setup_thermostat(
+        hass,
+        "21",
+        domain_config={"outdoor_sensor": "sensor.outdoor_temperature"},
+        target_temp=20,
+        outdoor_gain=0.02,
+    )
+
+    # The cold tolerance of 0.3 is reduced by 40%
+    hass.states.async_set(SENSOR, "19.8")
+    await hass.async_block_till_done()
+
+    assert hass.states.get(THERMOSTAT).attributes["feed_forward"] == 0.4
+    assert heater_calls == [(HEATER, STATE_ON)]
+
+    hass.states.async_set("sensor.outdoor_temperature", "unavailable")
+    await hass.async_block_till_done()
+    hass.states.async_set(SENSOR, "20.2")
+    await hass.async_block_till_done()
+
+    assert hass.states.get(THERMOSTAT).attributes["feed_forward"] == 0.0
+
+
+async def test_feed_forward_replaces_the_bias(hass, heater_calls):
+    """In proportional mode, the feed-forward is the share at the target."""
+    hass.states.async_set("sensor.outdoor_temperature", "0")
+    await async_setup_thermostat(
+        hass,
+        "20",
+        domain_config={"outdoor_sensor": "sensor.outdoor_temperature"},
+        target_temp=20,
+        control_mode="proportional",
+        outdoor_gain=0.02,
+    )
+
+    hass.states.async_set(SENSOR, "19.9")
+    await hass.async_block_till_done()
+
+    # 0.4 of feed-forward plus 2 per degree below the target
+    assert hass.states.get(THERMOSTAT).attributes["on_ratio"] == pytest.approx(0.6)
+    assert heater_calls == [(HEATER, STATE_ON)]
+
+
+async def test_zones_in_one_block(hass, heater_calls):
+    """The zones of a block share its settings and override them."""
+    for zone in ("study", "bedroom"):
+        hass.states.async_set(f"sensor.{zone}_temperature", "19")
+    hass.states.async_set("switch.study_heater", STATE_OFF)
+    hass.states.async_set("switch.bedroom_heater", STATE_ON)
+    assert await async_setup_component(
+        hass,
+        CLIMATE_DOMAIN,
+        {
+            CLIMATE_DOMAIN: {
+                "platform": DOMAIN,
+                "initial_hvac_mode": "heat",
+                "target_temp": 20,
+                "zones": [
+                    {
+                        "name": "Study",
+                        "heater": "switch.study_heater",
+                        "target_sensor": "sensor.study_temperature",
+                    },
+                    {
+                        "name": "Bedroom",
+                        "heater": "switch.bedroom_heater",
+                        "target_sensor": "sensor.bedroom_temperature",
+                        "initial_hvac_mode": "off",
+                        "target_temp": 17,
+                    },
+                ],
+            }
+        },
+    )
+    await hass.async_block_till_done()
+
+    study = hass.states.get("climate.study")
+    bedroom = hass.states.get("climate.bedroom")
+    assert (study.state, study.attributes[ATTR_TEMPERATURE]) == ("heat", 20)
+    assert (bedroom.state, bedroom.attributes[ATTR_TEMPERATURE]) == ("off", 17)
+    # The heater found on while its thermostat is off is turned off at startup
+    assert heater_calls == [("switch.bedroom_heater", STATE_OFF)]
+
+
+async def test_shared_timer_and_subscription(hass, freezer, heater_calls):
+    """The thermostats share one state subscription and one timer."""
+    hass.states.async_set(SENSOR, "21")
+    for zone in ("study", "bedroom"):
+        hass.states.async_set(f"switch.{zone}_heater", STATE_OFF)
+    assert await async_setup_component(
+        hass,
+        CLIMATE_DOMAIN,
+        {
+            CLIMATE_DOMAIN: {
+                "platform": DOMAIN,
+                "initial_hvac_mode": "heat",
+                "target_temp": 20,
+                "target_sensor": SENSOR,
+                "keep_alive": {"minutes": 3},
+                "zones": [
+                    {"name": "Study", "heater": "switch.study_heater"},
+                    {"name": "Bedroom", "heater": "switch.bedroom_heater"},
+                ],
+            }
+        },
+    )
+    await hass.async_block_till_done()
+    coordinator = async_get_coordinator(hass)
+    assert len(coordinator._state_jobs[SENSOR]) == 2
+    (group,) = coordinator._keep_alive_groups.values()
+    assert len(group["thermostats"]) == 2
+
+    hass.states.async_set(SENSOR, "19")
+    await hass.async_block_till_done()
+
+    assert sorted(heater_calls) == [
+        ("switch.bedroom_heater", STATE_ON),
+        ("switch.study_heater", STATE_ON),
+    ]
+
+    # Both keep-alives run in one job on the single timer of the coordinator
+    assert len(coordinator._interval_groups[timedelta(minutes=3)]["jobs"]) == 1
+    await async_wait(hass, freezer, timedelta(minutes=3))
+
+    assert sorted(heater_calls[2:]) == [
+        ("switch.bedroom_heater", STATE_ON),
+        ("switch.study_heater", STATE_ON),
+    ]
@@ -0,0 +1,84 @@
+"""Tests of the awesome thermostats set up from config entries."""
+from homeassistant.config_entries import ConfigEntryState
+from homeassistant.const import STATE_OFF
+from homeassistant.helpers import entity_registry as er
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.awesome_thermostat import DOMAIN
+
+HEATER = "switch.study_heater"
+SENSOR = "sensor.study_temperature"
+
+
+async def async_setup_entry(hass, **options):
+    """Add and set up the entry of the zone Study."""
+    hass.states.async_set(SENSOR, "19")
+    hass.states.async_set(HEATER, STATE_OFF)
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        title="Study",
+        data={"name": "Study", "heater": [HEATER], "target_sensor": [SENSOR]},
+        options=options,
+    )
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+    return entry
+
+
+def accounting_sensors(hass):
+    """Return the entity ids of the accounting sensors."""
+    return sorted(
+        state.entity_id
+        for state in hass.states.async_all("sensor")
+        if state.entity_id.startswith("sensor.study_heating_")
+    )
+
+
+async def test_entry_sets_up_and_unloads_its_sensors(hass):
+    """The sensors of an entry belong to it and go away with it."""
+    entry = await async_setup_entry(hass, accounting=True, heater_power=1500)
+
+    assert hass.states.get("climate.study") is not None
+    assert accounting_sensors(hass) == [
+        "sensor.study_heating_cycles",
+        "sensor.study_heating_energy",
+        "sensor.study_heating_runtime",
+    ]
+
+    assert await hass.config_entries.async_unload(entry.entry_id)
+    await hass.async_block_till_done()
+
+    assert entry.state is ConfigEntryState.NOT_LOADED
+    assert all(
+        hass.states.get(entity_id).state == "unavailable"
+        for entity_id in ["climate.study", *accounting_sensors(hass)]
+    )
+
+
+async def test_reload_keeps_one_set_of_sensors(hass):
+    """Changing the options reloads the entry without duplicating its sensors."""
+    entry = await async_setup_entry(hass, accounting=True)
+    registry = er.async_get(hass)
+    assert accounting_sensors(hass) == [
+        "sensor.study_heating_cycles",
+        "sensor.study_heating_runtime",
+    ]
+
+    hass.config_entries.async_update_entry(
+        entry, options={**entry.options, "heater_power": 1500}
+    )
+    await hass.async_block_till_done()
+    assert await hass.config_entries.async_reload(entry.entry_id)
+    await hass.async_block_till_done()
+
+    assert accounting_sensors(hass) == [
+        "sensor.study_heating_cycles",
+        "sensor.study_heating_energy",
+        "sensor.study_heating_runtime",
+    ]
+    assert len(er.async_entries_for_config_entry(registry, entry.entry_id)) == 4
+    assert all(
+        hass.states.get(entity_id).state != "unavailable"
+        for entity_id in ["climate.study", *accounting_sensors(hass)]
+    )
@@ -0,0 +1,264 @@
+"""Tests of the control core of the awesome thermostat."""
+import pytest
+
+from custom_components.awesome_thermostat.control import (
+    ACTION_NONE,
+    ACTION_TURN_OFF,
+    ACTION_TURN_ON,
+    AGGREGATION_MEAN,
+    AGGREGATION_MEDIAN,
+    AGGREGATION_WEIGHTED,
+    PIDController,
+    SensorAggregator,
+    SlopeEstimator,
+    ThermalModel,
+    allocate_power,
+    compute_action,
+)
+
+
+def learn_room(model, hours, heat_rate=2.0, loss=0.05, outdoor=5.0, heater=True):
+    """Feed `model` with a simulated room under a hysteresis around 20°."""
+    temperature, heating = 18.0, False
+    for minute in range(int(hours * 60)):
+        if heater and temperature < 19.7:
+            heating = True
+        elif temperature > 20.3:
+            heating = False
+        model.set_heating(heating, minute * 60.0)
+        temperature += (heat_rate * heating - loss * (temperature - outdoor)) / 60
+        model.add_sample(round(temperature, 1), (minute + 1) * 60.0)
+
+
+def test_thermal_model_learns_a_room():
+    """The model predicts the heating time of a simulated room."""
+    model = ThermalModel()
+    learn_room(model, 12)
+
+    assert model.ready
+    assert model.coefficients[0] == pytest.approx(2.0, abs=0.1)
+    # 17° to 20° at about 1.4° per hour
+    assert model.time_to_reach(17.0, 20.0) == pytest.approx(7900, rel=0.1)
+    assert model.time_to_reach(21.0, 20.0) == 0.0
+
+
+def test_thermal_model_waits_for_the_heater():
+    """Without the heater running, the heat rate is unknown."""
+    model = ThermalModel()
+    learn_room(model, 12, heater=False)
+
+    assert model.samples >= model.min_samples
+    assert not model.ready
+    assert model.time_to_reach(17.0, 20.0) is None
+
+
+def test_thermal_model_bounds_its_coefficients():
+    """A loss of the wrong sign does not predict a runaway temperature."""
+    model = ThermalModel([1.0, 0.5, -10.0], samples=100)
+
+    # The slope at 20° is kept: 0.5 * 20 - 10 = 0
+    assert model.predict(20.0, 3600.0, 0.0) == pytest.approx(20.0, abs=0.01)
+    # The slope of 0.25° per hour at 20.5° does not run away exponentially
+    assert model.predict(20.5, 48 * 3600.0, 0.0) == pytest.approx(32.5, abs=0.5)
+    assert model.time_to_reach(20.0, 21.0) == pytest.approx(3530, rel=0.05)
+
+
+def test_thermal_model_round_trip():
+    """The learned state is restored with its covariance."""
+    model = ThermalModel()
+    learn_room(model, 12)
+
+    restored = ThermalModel(**model.as_dict())
+
+    assert restored.ready
+    assert restored.as_dict() == model.as_dict()
+
+
+def test_aggregator_rejects_a_glitch():
+    """A reading far from the last ones of its sensor is ignored."""
+    aggregator = SensorAggregator(window=5, outlier_threshold=1.0)
+    for value in (20.0, 20.1, 20.0):
+        assert aggregator.update("a", value)
+
+    assert not aggregator.update("a", 35.0)
+    assert aggregator.value == 20.0
+
+
+def test_aggregator_accepts_a_confirmed_step():
+    """A real change is accepted once most of the window confirms it."""
+    aggregator = SensorAggregator(window=5, outlier_threshold=1.0)
+    for value in (20.0, 20.0, 20.0):
+        aggregator.update("a", value)
+
+    accepted = [aggregator.update("a", 23.0) for _ in range(4)]
+
+    assert accepted == [False, False, False, True]
+    assert aggregator.value == 23.0
+
+
+def test_aggregator_leaves_out_a_drifting_sensor():
+    """With three sensors, the one far from the others is left out."""
+    aggregator = SensorAggregator(AGGREGATION_MEAN, outlier_threshold=1.0)
+    for sensor, value in (("a", 20.0), ("b", 20.4), ("c", 26.0)):
+        aggregator.update(sensor, value)
+
+    assert aggregator.value == pytest.approx(20.2)
+
+    aggregator.discard("c")
+    aggregator.update("b", 21.0)
+    assert aggregator.value == pytest.approx(20.5)
+
+
+@pytest.mark.parametrize(
+    "method, expected, expected_after_drift",
+    [(AGGREGATION_MEAN, 20.25, 59.5 / 3), (AGGREGATION_MEDIAN, 20.25, 19.0)],
+)
+def test_aggregator_keeps_the_readings_closest_to_the_median(
+    method, expected, expected_after_drift
+):
+    """When no reading is close to the median, the closest ones are kept."""
+    aggregator = SensorAggregator(method, outlier_threshold=1.0)
+    for sensor, value in (("a", 19.0), ("b", 19.0), ("c", 21.5), ("d", 21.5)):
+        aggregator.update(sensor, value)
+
+    assert aggregator.value == pytest.approx(expected)
+
+    aggregator.update("d", 23.0)
+    # 19, 19 and 21.5 are the closest to the median of 20.25
+    assert aggregator.value == pytest.approx(expected_after_drift)
+
+
+@pytest.mark.parametrize(
+    "method, expected",
+    [
+        (AGGREGATION_MEAN, 20.0),
+        (AGGREGATION_MEDIAN, 19.0),
+        (AGGREGATION_WEIGHTED, 21.2),
+    ],
+)
+def test_aggregator_methods(method, expected):
+    """The sensors are aggregated with the configured method."""
+    aggregator = SensorAggregator(method)
+    aggregator.weights = {"a": 1.0, "b": 1.0, "c": 3.0}
+    for sensor, value in (("a", 18.0), ("b", 19.0), ("c", 23.0)):
+        aggregator.update(sensor, value)
+
+    assert aggregator.value == pytest.approx(expected)
+
+
+@pytest.mark.parametrize(
+    "cur_temp, device_active, ac_mode, expected",
+    [
+        (19.5, False, False, ACTION_TURN_ON),
+        (19.8, False, False, ACTION_NONE),
+        (20.5, True, False, ACTION_TURN_OFF),
+        (20.2, True, False, ACTION_NONE),
+        (20.5, False, True, ACTION_TURN_ON),
+        (19.5, True, True, ACTION_TURN_OFF),
+        (None, True, False, ACTION_NONE),
+    ],
+)
+def test_compute_action_hysteresis(cur_temp, device_active, ac_mode, expected):
+    """The heater switches outside of the tolerances around the target."""
+    action = compute_action(cur_temp, 20.0, 0.3, 0.3, ac_mode, device_active)
+
+    assert action == expected
+
+
+def test_compute_action_min_cycle_duration():
+    """The minimal cycle holds the switches, unless forced."""
+
+    def action(since_last_switch, force=False):
+        return compute_action(
+            19.0,
+            20.0,
+            0.3,
+            0.3,
+            False,
+            False,
+            force=force,
+            since_last_switch=since_last_switch,
+            min_cycle_duration=300,
+        )
+
+    assert action(60) == ACTION_NONE
+    assert action(None) == ACTION_NONE
+    assert action(400) == ACTION_TURN_ON
+    assert action(60, force=True) == ACTION_TURN_ON
+
+
+def test_compute_action_keep_alive():
+    """Keep-alive resends the state of the device within the tolerances."""
+    for device_active, expected in ((True, ACTION_TURN_ON), (False, ACTION_TURN_OFF)):
+        action = compute_action(
+            20.0, 20.0, 0.3, 0.3, False, device_active, keep_alive=True
+        )
+        assert action == expected
+
+
+def test_pid_reaches_the_target():
+    """The integral removes the offset a proportional control leaves."""
+    pid = PIDController(0.6, 0.0005, 0.0)
+    temperature = 15.0
+    for minute in range(48 * 60):
+        on_ratio = pid.update(temperature, 20.0, minute * 60.0)
+        # Heats 2° per hour at full power and loses 0.1 per hour to 5°
+        temperature += (2.0 * on_ratio - 0.1 * (temperature - 5.0)) / 60
+
+    assert temperature == pytest.approx(20.0, abs=0.05)
+    # 75% of the power compensates the losses at 20°
+    assert pid.output == pytest.approx(0.75, abs=0.02)
+
+
+def test_pid_anti_windup():
+    """The integral does not grow while the output is saturated."""
+    pid = PIDController(0.6, 0.0005, 0.0)
+    for minute in range(120):
+        assert pid.update(10.0, 20.0, minute * 60.0) == 1.0
+
+    assert pid.integral == 0.0
+
+
+def test_pid_clamps_the_integral():
+    """The integral alone never asks more than full power."""
+    pid = PIDController(0.0, 0.001, 0.0, integral=5000.0)
+
+    assert pid.update(20.0, 20.0, 0.0) == 1.0
+    assert pid.integral == 1000.0
+
+
+def test_pid_cooling():
+    """In ac mode, the output grows above the target."""
+    pid = PIDController(0.5, 0.0, 0.0)
+
+    assert pid.update(22.0, 20.0, 0.0, ac_mode=True) == 1.0
+    assert pid.update(19.0, 20.0, 60.0, ac_mode=True) == 0.0
+
+
+def test_slope_estimator():
+    """The slope of the window follows the samples entering and leaving."""
+    estimator = SlopeEstimator(3)
+    assert estimator.slope is None
+
+    for time, value in ((0, 20.0), (60, 20.5), (120, 21.0)):
+        estimator.add(time, value)
+    assert estimator.slope == pytest.approx(0.5 / 60)
+    assert estimator.span == 120
+
+    for time, value in ((180, 20.5), (240, 20.0), (300, 19.5)):
+        estimator.add(time, value)
+    assert estimator.slope == pytest.approx(-0.5 / 60)
+    assert estimator.span == 120
+
+    estimator.reset()
+    assert estimator.slope is None
+    assert estimator.span == 0
+
+
+def test_allocate_power():
+    """The requests are granted by priority, within the budget."""
+    requests = [("a", 1500, 1.0), ("b", 2000, 3.0), ("c", 1000, 2.0), ("d", 500, 0)]
+
+    assert allocate_power(requests, 3500) == ["b", "c", "d"]
+    assert allocate_power(requests, 1000) == ["c"]
+    assert allocate_power([], 1000) == []
@@ -0,0 +1,102 @@
+"""Tests of the keep-alive of the awesome thermostats."""
+from datetime import timedelta
+
+from homeassistant.components.climate import (
+    DOMAIN as CLIMATE_DOMAIN,
+    SERVICE_SET_TEMPERATURE,
+)
+from homeassistant.const import (
+    ATTR_ENTITY_ID,
+    ATTR_TEMPERATURE,
+    SERVICE_TURN_ON,
+    STATE_OFF,
+    STATE_ON,
+)
+from homeassistant.core import DOMAIN as HA_DOMAIN, callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.setup import async_setup_component
+import homeassistant.util.dt as dt_util
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.awesome_thermostat import DOMAIN
+
+HEATER = "switch.study_heater"
+SENSOR = "sensor.study_temperature"
+THERMOSTAT = "climate.study"
+
+
+async def async_setup_batch(hass, **config):
+    """Set up a batched thermostat heating with a keep-alive of 3 minutes."""
+    hass.states.async_set(SENSOR, "18")
+    hass.states.async_set(HEATER, STATE_OFF)
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {"batch_mode": True}})
+    assert await async_setup_component(
+        hass,
+        CLIMATE_DOMAIN,
+        {
+            CLIMATE_DOMAIN: {
+                "platform": DOMAIN,
+                "name": "Study",
+                "heater": HEATER,
+                "target_sensor": SENSOR,
+                "initial_hvac_mode": "heat",
+                "keep_alive": {"minutes": 3},
+                **config,
+            }
+        },
+    )
+    await hass.async_block_till_done()
+    await hass.services.async_call(
+        CLIMATE_DOMAIN,
+        SERVICE_SET_TEMPERATURE,
+        {ATTR_ENTITY_ID: THERMOSTAT, ATTR_TEMPERATURE: 20},
+        blocking=True,
+    )
+    await hass.async_block_till_done()
+
+
+async def async_wait(hass, freezer, minutes):
+    """Let `minutes` pass."""
+    for _ in range(minutes):
+        freezer.tick(timedelta(minutes=1))
+        async_fire_time_changed(hass, dt_util.utcnow())
+        await hass.async_block_till_done()
+
+
+async def test_batch_keep_alive_resends_the_state(hass, freezer, heater_calls):
+    """The batch keep-alive turns the heater on again."""
+    await async_setup_batch(hass)
+    assert heater_calls == [(HEATER, STATE_ON)]
+
+    await async_wait(hass, freezer, 3)
+
+    assert heater_calls == [(HEATER, STATE_ON), (HEATER, STATE_ON)]
+
+
+async def test_batch_keep_alive_goes_through_the_queue(hass, freezer, heater_calls):
+    """The failures of the batch keep-alive open the breaker of the heater."""
+    await async_setup_batch(hass)
+
+    @callback
+    def fail(call):
+        raise HomeAssistantError("unreachable")
+
+    hass.services.async_register(HA_DOMAIN, SERVICE_TURN_ON, fail)
+    await async_wait(hass, freezer, 3)
+
+    assert hass.states.get(THERMOSTAT).attributes["heater_failures"] == 1
+
+
+async def test_batch_keep_alive_in_safe_mode(hass, freezer, heater_calls):
+    """A batched thermostat with stale sensors resends its safe mode."""
+    await async_setup_batch(hass, sensor_timeout={"minutes": 5})
+
+    await async_wait(hass, freezer, 7)
+
+    assert hass.states.get(THERMOSTAT).attributes["sensor_stale"] is True
+    assert heater_calls[-1] == (HEATER, STATE_OFF)
+    calls = len(heater_calls)
+
+    await async_wait(hass, freezer, 6)
+
+    assert heater_calls[calls:] == [(HEATER, STATE_OFF), (HEATER, STATE_OFF)]
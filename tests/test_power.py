@@ -0,0 +1,59 @@
+"""Tests of the power budget shared by the awesome thermostats."""
+from homeassistant.components.climate import (
+    DOMAIN as CLIMATE_DOMAIN,
+    SERVICE_SET_TEMPERATURE,
+)
+from homeassistant.const import ATTR_ENTITY_ID, ATTR_TEMPERATURE, STATE_OFF, STATE_ON
+from homeassistant.setup import async_setup_component
+
+from custom_components.awesome_thermostat import DOMAIN
+
+ZONES = ("study", "bedroom")
+
+
+def zone_config(zone):
+    """Return the configuration of a zone with a heater of 1000 W."""
+    return {
+        "platform": DOMAIN,
+        "name": zone,
+        "heater": f"switch.{zone}_heater",
+        "target_sensor": f"sensor.{zone}_temperature",
+        "initial_hvac_mode": "heat",
+        "heater_power": 1000,
+    }
+
+
+async def test_waiting_zone_gets_the_freed_power(hass, heater_calls):
+    """The zone waiting for power heats once the other one stops."""
+    hass.states.async_set("sensor.study_temperature", "18")
+    hass.states.async_set("sensor.bedroom_temperature", "19")
+    for zone in ZONES:
+        hass.states.async_set(f"switch.{zone}_heater", STATE_OFF)
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {"power_budget": 1500}})
+    assert await async_setup_component(
+        hass, CLIMATE_DOMAIN, {CLIMATE_DOMAIN: [zone_config(zone) for zone in ZONES]}
+    )
+    await hass.async_block_till_done()
+
+    await hass.services.async_call(
+        CLIMATE_DOMAIN,
+        SERVICE_SET_TEMPERATURE,
+        {ATTR_ENTITY_ID: ["climate.study", "climate.bedroom"], ATTR_TEMPERATURE: 20},
+        blocking=True,
+    )
+    await hass.async_block_till_done()
+
+    # Only one heater fits in the budget: the coldest zone goes first
+    assert heater_calls == [("switch.study_heater", STATE_ON)]
+    assert hass.states.get("climate.study").attributes["power_waiting"] is False
+    assert hass.states.get("climate.bedroom").attributes["power_waiting"] is True
+
+    hass.states.async_set("sensor.study_temperature", "20.5")
+    await hass.async_block_till_done()
+
+    assert heater_calls[1:] == [
+        ("switch.study_heater", STATE_OFF),
+        ("switch.bedroom_heater", STATE_ON),
+    ]
+    assert hass.states.get("climate.study").attributes["power_waiting"] is False
+    assert hass.states.get("climate.bedroom").attributes["power_waiting"] is False
@@ -0,0 +1,146 @@
+"""Tests of the pre-heating of the awesome thermostats."""
+from datetime import timedelta
+
+from homeassistant.components.climate import (
+    ATTR_PRESET_MODE,
+    DOMAIN as CLIMATE_DOMAIN,
+    SERVICE_SET_PRESET_MODE,
+)
+from homeassistant.const import ATTR_ENTITY_ID, STATE_OFF, STATE_ON
+from homeassistant.core import State
+from homeassistant.setup import async_setup_component
+import homeassistant.util.dt as dt_util
+from pytest_homeassistant_custom_component.common import (
+    async_fire_time_changed,
+    mock_restore_cache_with_extra_data,
+)
+
+from custom_components.awesome_thermostat import DOMAIN
+from custom_components.awesome_thermostat.climate import SERVICE_REACH_TEMPERATURE
+
+HEATER = "switch.study_heater"
+SENSOR = "sensor.study_temperature"
+THERMOSTAT = "climate.study"
+
+# Heats at 1.4° per hour at 17°
+THERMAL_MODEL = {
+    "coefficients": [2.0, -0.05, 0.25],
+    "samples": 50,
+    "covariance": [[0.05, 0.0, 0.0], [0.0, 0.01, 0.0], [0.0, 0.0, 1.0]],
+}
+
+
+async def async_setup_thermostat(hass, domain_config=None, **config):
+    """Set up the study at 17° with a learned thermal model."""
+    hass.states.async_set(SENSOR, "17")
+    hass.states.async_set(HEATER, STATE_OFF)
+    mock_restore_cache_with_extra_data(
+        hass,
+        [
+            (
+                State(THERMOSTAT, "heat", {"temperature": 17}),
+                {"thermal_model": THERMAL_MODEL},
+            )
+        ],
+    )
+    if domain_config is not None:
+        assert await async_setup_component(hass, DOMAIN, {DOMAIN: domain_config})
+    assert await async_setup_component(
+        hass,
+        CLIMATE_DOMAIN,
+        {
+            CLIMATE_DOMAIN: {
+                "platform": DOMAIN,
+                "name": "Study",
+                "heater": HEATER,
+                "target_sensor": SENSOR,
+                "eco_temp": 17,
+                "comfort_temp": 20,
+                **config,
+            }
+        },
+    )
+    await hass.async_block_till_done()
+
+
+async def async_set_preset_mode(hass, preset_mode):
+    """Set the preset of the study."""
+    await hass.services.async_call(
+        CLIMATE_DOMAIN,
+        SERVICE_SET_PRESET_MODE,
+        {ATTR_ENTITY_ID: THERMOSTAT, ATTR_PRESET_MODE: preset_mode},
+        blocking=True,
+    )
+    await hass.async_block_till_done()
+
+
+async def test_preset_change_cancels_the_preheating(hass):
+    """A change of preset cancels the planned pre-heating."""
+    await async_setup_thermostat(hass)
+    time = dt_util.utcnow() + timedelta(hours=6)
+    await hass.services.async_call(
+        DOMAIN,
+        SERVICE_REACH_TEMPERATURE,
+        {ATTR_ENTITY_ID: THERMOSTAT, "time": time, ATTR_PRESET_MODE: "comfort"},
+        blocking=True,
+    )
+    await hass.async_block_till_done()
+    start = hass.states.get(THERMOSTAT).attributes["preheat_start"]
+    # 3° at 1.4° per hour, with a 10% margin
+    assert abs(
+        dt_util.parse_datetime(start) - (time - timedelta(hours=2.35))
+    ) < timedelta(minutes=15)
+
+    await async_set_preset_mode(hass, "eco")
+    assert "preheat_start" not in hass.states.get(THERMOSTAT).attributes
+
+
+async def test_preheating_survives_a_schedule_transition(hass, freezer, heater_calls):
+    """A scheduled transition to the same preset keeps the planned start."""
+    midnight = dt_util.start_of_local_day() + timedelta(days=1)
+    freezer.move_to(midnight + timedelta(hours=2))
+    await async_setup_thermostat(
+        hass,
+        domain_config={
+            "schedules": {
+                "night": [
+                    {"time": "00:00", "preset": "eco"},
+                    {"time": "03:00", "preset": "eco"},
+                    {"time": "07:00", "preset": "comfort"},
+                ]
+            }
+        },
+        schedule="night",
+        initial_hvac_mode="heat",
+    )
+    await hass.services.async_call(
+        DOMAIN,
+        SERVICE_REACH_TEMPERATURE,
+        {
+            ATTR_ENTITY_ID: THERMOSTAT,
+            "time": midnight + timedelta(hours=7),
+            ATTR_PRESET_MODE: "comfort",
+        },
+        blocking=True,
+    )
+    await hass.async_block_till_done()
+
+    await async_wait_until(hass, freezer, midnight + timedelta(hours=4, minutes=30))
+    attributes = hass.states.get(THERMOSTAT).attributes
+    assert attributes[ATTR_PRESET_MODE] == "eco"
+    assert "preheat_start" in attributes
+    assert heater_calls == []
+
+    await async_wait_until(hass, freezer, midnight + timedelta(hours=5))
+    attributes = hass.states.get(THERMOSTAT).attributes
+    assert attributes[ATTR_PRESET_MODE] == "comfort"
+    assert "preheat_start" not in attributes
+    assert heater_calls == [(HEATER, STATE_ON)]
+
+
+async def async_wait_until(hass, freezer, when):
+    """Let the time pass by steps of 5 minutes until `when`."""
+    while dt_util.utcnow() < when:
+        freezer.tick(timedelta(minutes=5))
+        async_fire_time_changed(hass, dt_util.utcnow())
+        await hass.async_block_till_done()
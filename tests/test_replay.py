@@ -0,0 +1,65 @@
+"""Tests of the replay of recorded sensor traces."""
+import csv
+
+import pytest
+
+from benchmarks import replay
+
+ZONES = """
+homeassistant:
+  time_zone: Europe/Paris
+awesome_thermostat:
+  schedules:
+    day:
+      - time: "07:30"
+        preset: comfort
+      - time: "08:00"
+        preset: eco
+climate:
+  - platform: awesome_thermostat
+    name: Study
+    heater: switch.study_heater
+    target_sensor: sensor.study_temperature
+    eco_temp: 17
+    comfort_temp: 21
+    control_mode: proportional
+    schedule: day
+    initial_hvac_mode: heat
+"""
+
+
+def write_trace(path, rows):
+    """Write a CSV history export."""
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["entity_id", "state", "last_changed"])
+        writer.writerows(rows)
+
+
+@pytest.mark.timeout(60)
+def test_replay_csv(tmp_path, capsys):
+    """The replay ends and follows the schedule in the configured time zone."""
+    config = tmp_path / "zones.yaml"
+    config.write_text(ZONES, encoding="utf-8")
+    trace = tmp_path / "history.csv"
+    write_trace(
+        trace,
+        [
+            # Naive times are local
+            ("sensor.study_temperature", "19.0", "2024-01-10T07:00:00"),
+            ("sensor.study_temperature", "19.2", "2024-01-10T07:45:00"),
+            ("sensor.study_temperature", "19.4", "2024-01-10T08:30:00"),
+        ],
+    )
+    output = tmp_path / "schedule.csv"
+
+    replay.main(["--config", str(config), "--csv", str(trace), "--output", str(output)])
+
+    assert "3 states replayed for 1 zones" in capsys.readouterr().err
+    with open(output, newline="", encoding="utf-8") as file:
+        rows = list(csv.DictReader(file))
+    # Comfort from 07:30 to 08:00 in Paris, eco before and after
+    assert [(row["time"], row["state"], row["target"]) for row in rows] == [
+        ("2024-01-10T06:30:00+00:00", "on", "21.0"),
+        ("2024-01-10T07:00:00+00:00", "off", "17.0"),
+    ]
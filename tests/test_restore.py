@@ -0,0 +1,124 @@
+"""Tests of the state of the awesome thermostats restored after a restart."""
+from homeassistant.components.climate import DOMAIN as CLIMATE_DOMAIN
+from homeassistant.const import STATE_OFF
+from homeassistant.core import State
+from homeassistant.setup import async_setup_component
+from pytest_homeassistant_custom_component.common import (
+    mock_restore_cache_with_extra_data,
+)
+
+from custom_components.awesome_thermostat import DOMAIN
+
+HEATER = "switch.study_heater"
+SENSOR = "sensor.study_temperature"
+THERMOSTAT = "climate.study"
+
+
+async def async_setup_thermostat(hass, **config):
+    """Set up the thermostat of the study."""
+    hass.states.async_set(SENSOR, "19")
+    hass.states.async_set(HEATER, STATE_OFF)
+    assert await async_setup_component(
+        hass,
+        CLIMATE_DOMAIN,
+        {
+            CLIMATE_DOMAIN: {
+                "platform": DOMAIN,
+                "name": "Study",
+                "heater": HEATER,
+                "target_sensor": SENSOR,
+                **config,
+            }
+        },
+    )
+    await hass.async_block_till_done()
+    return hass.states.get(THERMOSTAT).attributes
+
+
+async def test_pid_integral_is_restored_from_the_extra_data(hass):
+    """The integral saved at the stop wins over the last written attribute."""
+    mock_restore_cache_with_extra_data(
+        hass,
+        [
+            (
+                State(THERMOSTAT, "heat", {"temperature": 20, "pid_integral": 0.1}),
+                {"pid_integral": 0.3},
+            )
+        ],
+    )
+
+    attributes = await async_setup_thermostat(hass, control_mode="pid")
+
+    assert attributes["pid_integral"] == 0.3
+
+
+async def test_pid_integral_is_restored_from_the_attributes(hass):
+    """A state saved without extra data restores its attribute."""
+    mock_restore_cache_with_extra_data(
+        hass,
+        [(State(THERMOSTAT, "heat", {"temperature": 20, "pid_integral": 0.1}), {})],
+    )
+
+    attributes = await async_setup_thermostat(hass, control_mode="pid")
+
+    assert attributes["pid_integral"] == 0.1
+
+
+async def test_accounting_saved_alone_is_restored(hass):
+    """The extra data saved when it only held the accounting is still read."""
+    mock_restore_cache_with_extra_data(
+        hass,
+        [
+            (
+                State(THERMOSTAT, "heat", {"temperature": 20}),
+                {"runtime": 7200.0, "cycles": 4, "on_since": None},
+            )
+        ],
+    )
+
+    attributes = await async_setup_thermostat(hass, accounting=True)
+
+    assert attributes["heater_runtime"] == 2.0
+    assert attributes["heater_cycles"] == 4
+
+
+async def test_extra_data_holds_the_accounting_and_the_integral(hass):
+    """The extra data saved at the stop holds what the attributes may miss."""
+    await async_setup_thermostat(hass, control_mode="pid", accounting=True)
+    thermostat = hass.data[CLIMATE_DOMAIN].get_entity(THERMOSTAT)
+    thermostat._pid.integral = 0.2
+
+    extra_data = thermostat.extra_restore_state_data.as_dict()
+
+    assert extra_data["pid_integral"] == 0.2
+    assert extra_data["accounting"] == {"runtime": 0.0, "cycles": 0, "on_since": None}
+
+
+async def test_thermal_model_is_restored_from_the_extra_data(hass):
+    """The model is restored with its covariance."""
+    covariance = [[0.5, 0.0, 0.0], [0.0, 0.1, 0.0], [0.0, 0.0, 2.0]]
+    mock_restore_cache_with_extra_data(
+        hass,
+        [
+            (
+                State(THERMOSTAT, "heat", {"temperature": 20}),
+                {
+                    "thermal_model": {
+                        "coefficients": [2.0, -0.05, 0.25],
+                        "samples": 50,
+                        "covariance": covariance,
+                    }
+                },
+            )
+        ],
+    )
+
+    attributes = await async_setup_thermostat(hass)
+    thermostat = hass.data[CLIMATE_DOMAIN].get_entity(THERMOSTAT)
+
+    assert attributes["thermal_model"]["samples"] == 50
+    assert thermostat.extra_restore_state_data.as_dict()["thermal_model"] == {
+        "coefficients": [2.0, -0.05, 0.25],
+        "samples": 50,
+        "covariance": covariance,
+    }
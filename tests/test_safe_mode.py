@@ -0,0 +1,110 @@
+"""Tests of the safe mode of the awesome thermostat."""
+from datetime import timedelta
+
+from homeassistant.components.climate import DOMAIN as CLIMATE_DOMAIN
+from homeassistant.components.climate import SERVICE_SET_TEMPERATURE
+from homeassistant.const import ATTR_ENTITY_ID, ATTR_TEMPERATURE, STATE_OFF, STATE_ON
+from homeassistant.setup import async_setup_component
+import homeassistant.util.dt as dt_util
+from pytest_homeassistant_custom_component.common import (
+    async_capture_events,
+    async_fire_time_changed,
+)
+
+from custom_components.awesome_thermostat import DOMAIN
+from custom_components.awesome_thermostat.climate import EVENT_SENSOR_STALE
+
+HEATER = "switch.study_heater"
+SENSOR = "sensor.study_temperature"
+THERMOSTAT = "climate.study"
+
+
+async def async_setup_thermostat(hass, temperature, target, **config):
+    """Set up a thermostat whose sensor must report every 5 minutes."""
+    hass.states.async_set(SENSOR, temperature)
+    hass.states.async_set(HEATER, STATE_OFF)
+    assert await async_setup_component(
+        hass,
+        CLIMATE_DOMAIN,
+        {
+            CLIMATE_DOMAIN: {
+                "platform": DOMAIN,
+                "name": "Study",
+                "heater": HEATER,
+                "target_sensor": SENSOR,
+                "sensor_timeout": {"minutes": 5},
+                **config,
+            }
+        },
+    )
+    await hass.async_block_till_done()
+    await hass.services.async_call(
+        CLIMATE_DOMAIN,
+        SERVICE_SET_TEMPERATURE,
+        {ATTR_ENTITY_ID: THERMOSTAT, ATTR_TEMPERATURE: target},
+        blocking=True,
+    )
+    await hass.async_block_till_done()
+
+
+async def async_wait(hass, freezer, minutes, report=None):
+    """Let `minutes` pass, the sensor reporting `report` each minute."""
+    for _ in range(minutes):
+        freezer.tick(timedelta(minutes=1))
+        if report is not None:
+            hass.states.async_set(SENSOR, report, force_update=True)
+        async_fire_time_changed(hass, dt_util.utcnow())
+        await hass.async_block_till_done()
+
+
+async def test_steady_sensor_is_not_stale(hass, freezer, heater_calls):
+    """A sensor reporting the same temperature keeps the heater running."""
+    await async_setup_thermostat(hass, "18", 20, initial_hvac_mode="heat")
+    assert heater_calls == [(HEATER, STATE_ON)]
+
+    await async_wait(hass, freezer, 15, report="18")
+
+    assert hass.states.get(THERMOSTAT).attributes["sensor_stale"] is False
+    assert hass.states.is_state(HEATER, STATE_ON)
+
+    await async_wait(hass, freezer, 10)
+
+    assert hass.states.get(THERMOSTAT).attributes["sensor_stale"] is True
+    assert hass.states.is_state(HEATER, STATE_OFF)
+
+
+async def test_frost_protection_keeps_a_cooler_off(hass, freezer, heater_calls):
+    """Frost protection does not run a cooler on a duty cycle."""
+    await async_setup_thermostat(
+        hass,
+        "26",
+        22,
+        initial_hvac_mode="cool",
+        ac_mode=True,
+        safe_mode="frost_protection",
+    )
+    assert heater_calls == [(HEATER, STATE_ON)]
+
+    await async_wait(hass, freezer, 40)
+
+    assert hass.states.get(THERMOSTAT).attributes["sensor_stale"] is True
+    assert heater_calls == [(HEATER, STATE_ON), (HEATER, STATE_OFF)]
+
+
+async def test_reading_back_before_the_safe_mode(hass, freezer, heater_calls):
+    """A reading accepted before the safe mode starts cancels it."""
+    await async_setup_thermostat(hass, "18", 20, initial_hvac_mode="heat")
+    thermostat = hass.data[CLIMATE_DOMAIN].get_entity(THERMOSTAT)
+    events = async_capture_events(hass, EVENT_SENSOR_STALE)
+
+    freezer.tick(timedelta(minutes=6))
+    thermostat._async_check_sensor(dt_util.utcnow())
+    assert thermostat._sensor_stale
+    # A reading is accepted before the task entering the safe mode runs
+    thermostat._sensor_last_update = dt_util.utcnow()
+    thermostat._async_leave_safe_mode()
+    await hass.async_block_till_done()
+
+    assert [event.data["sensor_stale"] for event in events] == [False]
+    assert hass.states.get(THERMOSTAT).attributes["sensor_stale"] is False
+    assert heater_calls == [(HEATER, STATE_ON)]
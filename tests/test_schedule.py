@@ -0,0 +1,72 @@
+"""Tests of the weekly schedules of the presets."""
+from datetime import datetime, time
+from zoneinfo import ZoneInfo
+
+from custom_components.awesome_thermostat.coordinator import async_get_coordinator
+from custom_components.awesome_thermostat.schedule import WEEKDAYS, WeeklySchedule
+
+PARIS = ZoneInfo("Europe/Paris")
+
+SCHEDULE = WeeklySchedule(
+    [
+        (WEEKDAYS, time(6, 30), "comfort"),
+        (WEEKDAYS, time(22, 0), "eco"),
+        (("sat", "sun"), time(8, 0), "comfort"),
+        (("sat", "sun"), time(6, 30), "eco"),
+    ]
+)
+
+
+def test_preset_at():
+    """The preset of the last transition is in force."""
+    # Monday 2024-01-01
+    assert SCHEDULE.preset_at(datetime(2024, 1, 1, 7, 0)) == "comfort"
+    assert SCHEDULE.preset_at(datetime(2024, 1, 1, 6, 30)) == "comfort"
+    assert SCHEDULE.preset_at(datetime(2024, 1, 1, 23, 0)) == "eco"
+    # Before the first transition of the week, Sunday evening is in force
+    assert SCHEDULE.preset_at(datetime(2024, 1, 1, 1, 0)) == "eco"
+    # The later slot of the weekend overrides the daily one at 6:30
+    assert SCHEDULE.preset_at(datetime(2024, 1, 6, 7, 0)) == "eco"
+    assert SCHEDULE.preset_at(datetime(2024, 1, 6, 9, 0)) == "comfort"
+
+
+def test_next_transition():
+    """The next transition is strictly after now, wrapping the week."""
+    assert SCHEDULE.next_transition(datetime(2024, 1, 1, 6, 30)) == (
+        datetime(2024, 1, 1, 22, 0),
+        "eco",
+    )
+    # Sunday night goes on with Monday morning
+    assert SCHEDULE.next_transition(datetime(2024, 1, 7, 23, 0)) == (
+        datetime(2024, 1, 8, 6, 30),
+        "comfort",
+    )
+
+
+def test_next_transition_across_daylight_saving_time():
+    """The transitions stay at the same wall time when the offset changes."""
+    # The clocks go forward on Sunday 2024-03-31 in Paris
+    when, preset = SCHEDULE.next_transition(datetime(2024, 3, 31, 1, 0, tzinfo=PARIS))
+
+    assert (when.hour, when.minute, preset) == (6, 30, "eco")
+    assert when.utcoffset().total_seconds() == 7200
+
+
+def test_empty_schedule():
+    """A schedule without slots has no preset."""
+    schedule = WeeklySchedule([])
+
+    assert schedule.preset_at(datetime(2024, 1, 1)) is None
+    assert schedule.next_transition(datetime(2024, 1, 1)) is None
+
+
+async def test_track_an_empty_schedule(hass):
+    """A schedule without transition arms no timer."""
+    coordinator = async_get_coordinator(hass)
+    schedule = WeeklySchedule([])
+
+    remove = coordinator.async_track_schedule(schedule, object())
+    assert coordinator._schedule_groups[schedule]["cancel"] is None
+
+    remove()
+    assert schedule not in coordinator._schedule_groups
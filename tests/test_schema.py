@@ -0,0 +1,52 @@
+"""Tests of the validation of the zones of the awesome thermostat."""
+import pytest
+import voluptuous as vol
+
+from custom_components.awesome_thermostat import DOMAIN, SCHEDULE_SCHEMA
+from custom_components.awesome_thermostat.climate import ZONE_SCHEMA
+
+ZONE = {
+    "platform": DOMAIN,
+    "name": "Living room",
+    "heater": "switch.living_room_heater",
+    "target_sensor": ["sensor.living_room_north", "sensor.living_room_south"],
+}
+
+
+def test_valid_aggregation():
+    """Weights matching the sensors and a window of 3 are accepted."""
+    config = ZONE_SCHEMA(
+        {
+            **ZONE,
+            "sensor_aggregation": "weighted",
+            "sensor_weights": [1, 2],
+            "sensor_window": 3,
+            "sensor_outlier_threshold": 1.5,
+        }
+    )
+
+    assert config["sensor_weights"] == [1.0, 2.0]
+
+
+def test_window_too_short_to_reject_outliers():
+    """The outliers can only be found in a window of 3 readings or more."""
+    with pytest.raises(vol.Invalid, match="sensor_window"):
+        ZONE_SCHEMA({**ZONE, "sensor_window": 2, "sensor_outlier_threshold": 1.5})
+
+    assert ZONE_SCHEMA({**ZONE, "sensor_window": 2})["sensor_window"] == 2
+
+
+@pytest.mark.parametrize("weights", [[1], [1, 2, 3]])
+def test_one_weight_per_sensor(weights):
+    """The weights must match the sensors one to one."""
+    with pytest.raises(vol.Invalid, match="sensor_weights"):
+        ZONE_SCHEMA({**ZONE, "sensor_weights": weights})
+
+
+def test_schedule_slot_without_days():
+    """A slot of a schedule applies to at least one day."""
+    with pytest.raises(vol.Invalid, match="days"):
+        SCHEDULE_SCHEMA([{"days": [], "time": "07:00", "preset": "comfort"}])
+
+    slots = SCHEDULE_SCHEMA([{"days": "sat", "time": "07:00", "preset": "comfort"}])
+    assert slots[0]["days"] == ["sat"]
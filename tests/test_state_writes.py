@@ -0,0 +1,114 @@
+"""Tests of the writes of the state of the awesome thermostats."""
+from datetime import timedelta
+
+from homeassistant.components.climate import DOMAIN as CLIMATE_DOMAIN
+from homeassistant.const import EVENT_STATE_CHANGED, STATE_OFF
+from homeassistant.setup import async_setup_component
+import homeassistant.util.dt as dt_util
+from pytest_homeassistant_custom_component.common import (
+    async_capture_events,
+    async_fire_time_changed,
+)
+
+from custom_components.awesome_thermostat import DOMAIN
+
+HEATER = "switch.study_heater"
+SENSOR = "sensor.study_temperature"
+THERMOSTAT = "climate.study"
+
+
+async def async_setup_thermostat(hass, **config):
+    """Set up a thermostat of the study whose heater stays off.
+
+    Return the state changes captured from then on.
+    """
+    hass.states.async_set(SENSOR, "19")
+    hass.states.async_set(HEATER, STATE_OFF)
+    assert await async_setup_component(
+        hass,
+        CLIMATE_DOMAIN,
+        {
+            CLIMATE_DOMAIN: {
+                "platform": DOMAIN,
+                "name": "Study",
+                "heater": HEATER,
+                "target_sensor": SENSOR,
+                "initial_hvac_mode": "heat",
+                "target_temp": 15,
+                **config,
+            }
+        },
+    )
+    await hass.async_block_till_done()
+    return async_capture_events(hass, EVENT_STATE_CHANGED)
+
+
+def written_states(events):
+    """Return the states written by the thermostat."""
+    return [
+        event.data["new_state"]
+        for event in events
+        if event.data["entity_id"] == THERMOSTAT
+    ]
+
+
+async def test_unchanged_state_is_not_written(hass):
+    """A state without visible change is not written again."""
+    events = await async_setup_thermostat(hass)
+    thermostat = hass.data[CLIMATE_DOMAIN].get_entity(THERMOSTAT)
+    skipped = thermostat._state_writes_skipped
+
+    thermostat._async_write_state()
+    # Only the attributes of the sensor change
+    hass.states.async_set(SENSOR, "19", {"battery": 80})
+    await hass.async_block_till_done()
+
+    assert written_states(events) == []
+    assert thermostat._state_writes_skipped == skipped + 1
+
+    hass.states.async_set(SENSOR, "19.5")
+    await hass.async_block_till_done()
+
+    states = written_states(events)
+    assert [state.attributes["current_temperature"] for state in states] == [19.5]
+    assert states[0].attributes["state_writes_skipped"] == skipped + 1
+
+
+async def test_temperature_writes_are_coalesced(hass, freezer):
+    """The temperature alone is written at most once per interval."""
+    events = await async_setup_thermostat(
+        hass, temperature_write_interval={"minutes": 1}
+    )
+
+    freezer.tick(timedelta(minutes=1))
+    for temperature in ("19.1", "19.2", "19.3"):
+        freezer.tick(timedelta(seconds=10))
+        hass.states.async_set(SENSOR, temperature)
+        await hass.async_block_till_done()
+
+    # The first change is written right away, the others are held back
+    assert [
+        state.attributes["current_temperature"] for state in written_states(events)
+    ] == [19.1]
+
+    freezer.tick(timedelta(minutes=1))
+    async_fire_time_changed(hass, dt_util.utcnow())
+    await hass.async_block_till_done()
+
+    # The last one is written at the end of the interval
+    assert [
+        state.attributes["current_temperature"] for state in written_states(events)
+    ] == [19.1, 19.3]
+
+    # A visible change other than the temperature is written at once
+    hass.states.async_set(SENSOR, "19.4")
+    await hass.async_block_till_done()
+    await hass.services.async_call(
+        CLIMATE_DOMAIN,
+        "set_temperature",
+        {"entity_id": THERMOSTAT, "temperature": 16},
+        blocking=True,
+    )
+
+    states = written_states(events)
+    assert [state.attributes["temperature"] for state in states[2:]] == [16]
@@ -0,0 +1,183 @@
+"""Tests of the commands sent to the heaters."""
+import asyncio
+from datetime import timedelta
+
+from homeassistant.const import SERVICE_TURN_OFF, SERVICE_TURN_ON, STATE_OFF, STATE_ON
+from homeassistant.core import DOMAIN as HA_DOMAIN, callback
+from homeassistant.exceptions import HomeAssistantError
+import homeassistant.util.dt as dt_util
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.awesome_thermostat.actuator import SwitchActuator
+from custom_components.awesome_thermostat.coordinator import async_get_coordinator
+from custom_components.awesome_thermostat.switching import (
+    BREAKER_CLOSED,
+    BREAKER_HALF_OPEN,
+    BREAKER_OPEN,
+    HeaterCommandQueue,
+    HeaterCommands,
+)
+
+TIMEOUT = timedelta(seconds=10)
+
+
+async def async_wait(hass, freezer, seconds):
+    """Let `seconds` pass."""
+    freezer.tick(timedelta(seconds=seconds))
+    async_fire_time_changed(hass, dt_util.utcnow())
+    await hass.async_block_till_done()
+
+
+async def test_dead_heater_does_not_hold_back_the_others(hass, freezer, heater_calls):
+    """Each heater has its own retries and breaker."""
+
+    @callback
+    def async_fail_dead(call):
+        if "switch.dead" in call.data["entity_id"]:
+            raise HomeAssistantError("unreachable")
+        hass.states.async_set("switch.alive", STATE_ON)
+
+    hass.services.async_register(HA_DOMAIN, SERVICE_TURN_ON, async_fail_dead)
+    commands = HeaterCommands(
+        hass,
+        async_get_coordinator(hass),
+        SwitchActuator(["switch.alive", "switch.dead"]),
+        TIMEOUT,
+        lambda: None,
+    )
+
+    commands.async_set(True)
+    await hass.async_block_till_done()
+    assert hass.states.is_state("switch.alive", STATE_ON)
+    assert commands.failures == 1
+    assert commands.breaker == BREAKER_CLOSED
+
+    # Retries after 5 and 10 seconds
+    await async_wait(hass, freezer, 5)
+    await async_wait(hass, freezer, 10)
+    assert commands.failures == 3
+    assert commands.breaker == BREAKER_OPEN
+
+    commands.async_set(False)
+    await hass.async_block_till_done()
+    assert heater_calls == [("switch.alive", STATE_OFF)]
+    commands.async_cancel()
+
+
+def switch_queue(hass, entity_id="switch.heater"):
+    """Return the command queue of a switch."""
+    return HeaterCommandQueue(
+        hass,
+        async_get_coordinator(hass),
+        SwitchActuator([entity_id]),
+        TIMEOUT,
+        lambda: None,
+        entity_id=entity_id,
+    )
+
+
+async def test_retries_back_off(hass, freezer):
+    """A failed command is retried after a backoff doubling up to 5 minutes."""
+    calls = []
+
+    @callback
+    def async_fail(call):
+        calls.append(dt_util.utcnow())
+        raise HomeAssistantError("unreachable")
+
+    hass.services.async_register(HA_DOMAIN, SERVICE_TURN_ON, async_fail)
+    queue = switch_queue(hass)
+    queue.async_set(True)
+    await hass.async_block_till_done()
+
+    for _ in range(1000):
+        await async_wait(hass, freezer, 1)
+
+    delays = [
+        (later - earlier).total_seconds() for earlier, later in zip(calls, calls[1:])
+    ]
+    assert delays == [5, 10, 20, 40, 80, 160, 300, 300]
+    queue.async_cancel()
+
+
+async def test_breaker(hass, freezer):
+    """The breaker opens after 3 failures and closes on the next success."""
+    release = asyncio.Event()
+    failing = True
+
+    async def async_turn_on(call):
+        await release.wait()
+        if failing:
+            raise HomeAssistantError("unreachable")
+        hass.states.async_set("switch.heater", STATE_ON)
+
+    hass.services.async_register(HA_DOMAIN, SERVICE_TURN_ON, async_turn_on)
+    queue = switch_queue(hass)
+    release.set()
+    queue.async_set(True)
+    await hass.async_block_till_done()
+    await async_wait(hass, freezer, 5)
+    assert queue.breaker == BREAKER_CLOSED
+    await async_wait(hass, freezer, 10)
+    assert (queue.failures, queue.breaker) == (3, BREAKER_OPEN)
+
+    # The next retry is in flight
+    release.clear()
+    failing = False
+    freezer.tick(timedelta(seconds=20))
+    async_fire_time_changed(hass, dt_util.utcnow())
+    await asyncio.sleep(0)
+    assert queue.breaker == BREAKER_HALF_OPEN
+
+    release.set()
+    await hass.async_block_till_done()
+    assert (queue.failures, queue.breaker) == (0, BREAKER_CLOSED)
+    assert hass.states.is_state("switch.heater", STATE_ON)
+
+
+async def test_latest_command_wins(hass):
+    """The commands given while one is in flight are merged into the latest."""
+    release = asyncio.Event()
+    calls = []
+
+    async def async_switch(call):
+        calls.append(call.service)
+        await release.wait()
+
+    hass.services.async_register(HA_DOMAIN, SERVICE_TURN_ON, async_switch)
+    hass.services.async_register(HA_DOMAIN, SERVICE_TURN_OFF, async_switch)
+    queue = switch_queue(hass)
+    queue.async_set(True)
+    while not calls:
+        await asyncio.sleep(0)
+
+    queue.async_set(False)
+    queue.async_set(True)
+    queue.async_set(False)
+    release.set()
+    await hass.async_block_till_done()
+
+    assert calls == [SERVICE_TURN_ON, SERVICE_TURN_OFF]
+    assert queue.superseded == 2
+
+
+async def test_timeout_counts_as_a_failure(hass):
+    """A heater not answering in time fails the command."""
+
+    async def async_hang(call):
+        await asyncio.sleep(3600)
+
+    hass.services.async_register(HA_DOMAIN, SERVICE_TURN_ON, async_hang)
+    queue = HeaterCommandQueue(
+        hass,
+        async_get_coordinator(hass),
+        SwitchActuator(["switch.heater"]),
+        timedelta(seconds=0.01),
+        lambda: None,
+    )
+
+    queue.async_set(True)
+    await asyncio.sleep(0.1)
+
+    assert queue.failures == 1
+    queue.async_cancel()